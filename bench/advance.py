@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+import sys
+import time
+from sys import argv
+import lib.sequencer as seq
+from bench.common import *
+
+CALLS = 1000000
+# milliseconds to advance per call, about what one audio callback would at
+# 48000Hz with 480 sample fragments, and enough to reach a new line every call
+STEPS = (10, 100000)
+
+def run(sequencer, calls, step):
+    """
+    Advance sequencer calls times, starting over whenever it ends.
+    """
+    for i in range(calls):
+        try:
+            sequencer.advance(step)
+        except seq.SequenceEnded:
+            sequencer.reset()
+
+def main():
+    try:
+        seqname = argv[1]
+    except IndexError:
+        seqname = DEFAULT_SEQ
+
+    aud = make_audio_system()
+    buffers = make_buffers(aud)
+    sequencer = load_sequence(seqname, buffers)._seq
+
+    for step in STEPS:
+        # warm up so one-time allocations aren't counted
+        run(sequencer, 10000, step)
+        blocks = sys.getallocatedblocks()
+        run(sequencer, 10000, step)
+        blocks = sys.getallocatedblocks() - blocks
+
+        start = time.perf_counter()
+        run(sequencer, CALLS, step)
+        elapsed = time.perf_counter() - start
+        print("{}  step {}  {} calls  {:.3f} s  {:.0f} calls/s  {:.2f} us/call  {} blocks allocated per 10000".format(
+              seqname, step, CALLS, elapsed, CALLS / elapsed,
+              elapsed / CALLS * 1000000, blocks))
+
+if __name__ == "__main__":
+    main()
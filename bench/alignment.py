@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+import os
+import sys
+import tempfile
+import time
+from sys import argv
+from bench.common import *
+
+SEQ = "seq/pmtest.crustysequence"
+# a rate where most line lengths aren't a whole number of samples
+ALIGN_RATE = 44100
+SECONDS = 3600
+# the second copy splits each pattern differently, so only the pattern
+# boundaries are shared
+RETIME = (("1 950 |", "1 957 |"), ("1 50  |", "1 43  |"))
+
+def write_seq(filename, patterns, retime=()):
+    """
+    Write a copy of the sequence which plays its second pattern patterns
+    times, with its lines' times optionally changed.
+    """
+    with open(SEQ, "r") as infile:
+        lines = infile.read().rstrip().split('\n')
+    for old, new in retime:
+        lines = [line.replace(old, new) for line in lines]
+    lines[-1] = " ".join(["0"] + ["1"] * patterns)
+    with open(filename, "w") as outfile:
+        outfile.write("\n".join(lines) + "\n")
+
+def record_lines(sequencer, base):
+    """
+    Record the sample each line starts on, counting from the first frame.
+    """
+    starts = list()
+    run_channels = sequencer._run_channels
+    def recorded(reqtime, line, needed):
+        if line != None:
+            starts.append(base[0] + sequencer._outpos)
+        run_channels(reqtime, line, needed)
+    sequencer._run_channels = recorded
+    return starts
+
+def exact_starts(sequencer, rate):
+    """
+    Where each line should start, from the milliseconds in the sequence.
+    """
+    starts = list()
+    ms = 0
+    for divTime in sequencer._seq._divTimes:
+        starts.append(ms * rate // 1000)
+        ms += divTime
+    return starts, ms
+
+def main():
+    seconds = SECONDS
+    if len(argv) > 1:
+        seconds = int(argv[1])
+
+    aud = make_audio_system(rate=ALIGN_RATE)
+    buffers = make_buffers(aud)
+    base = [0]
+    sequencers = list()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for num, retime in enumerate(((), RETIME)):
+            filename = os.path.join(tmpdir, "align{}.crustysequence".format(num))
+            write_seq(filename, seconds, retime)
+            sequencer = load_sequence(filename, buffers)
+            aud.add_sequence(sequencer, enabled=True)
+            sequencers.append((sequencer, record_lines(sequencer, base)))
+
+    start = time.perf_counter()
+    while not all(sequencer.ended for sequencer, starts in sequencers):
+        base[0] += aud.frame()
+        # nothing consumes the output, so throw it away
+        aud._s.invalidate_buffers()
+    elapsed = time.perf_counter() - start
+    print("{} seconds at {} Hz rendered in {:.1f} s  {:.0f}x realtime".format(
+          seconds, ALIGN_RATE, elapsed, base[0] / ALIGN_RATE / elapsed))
+
+    failed = False
+    boundaries = list()
+    for num, (sequencer, starts) in enumerate(sequencers):
+        exact, ms = exact_starts(sequencer, ALIGN_RATE)
+        wrong = sum(1 for got, want in zip(starts, exact) if got != want)
+        drift = max(abs(got - want) for got, want in zip(starts, exact))
+        print("sequence {}  {} lines over {} ms  {} started off by up to {} samples".format(
+              num, len(starts), ms, wrong, drift))
+        if len(starts) != len(exact):
+            print("WARNING: Sequence {} played {} lines, expected {}.".format(
+                  num, len(starts), len(exact)))
+            failed = True
+        if wrong > 0:
+            print("WARNING: Sequence {} lines didn't start on the exact sample.".format(num))
+            failed = True
+        boundaries.append(set(starts))
+    shared = boundaries[0] & boundaries[1]
+    print("{} line starts shared between the sequences".format(len(shared)))
+    if len(shared) < seconds:
+        print("WARNING: Sequences drifted apart.")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
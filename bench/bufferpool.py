@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+import glob
+from sys import argv
+from render import make_renderer
+from bench.common import load_sequence
+from bench.throughput import SEQ_GLOBS
+
+def main():
+    seqnames = argv[1:]
+    if len(seqnames) == 0:
+        for pattern in SEQ_GLOBS:
+            seqnames.extend(sorted(glob.glob(pattern)))
+
+    aud, buffers = make_renderer()
+    sequencers = list()
+    for seqname in seqnames:
+        try:
+            sequencer = load_sequence(seqname, buffers)
+            aud.add_sequence(sequencer)
+        except Exception as e:
+            print("{}  failed: {}".format(seqname, e))
+            continue
+        sequencers.append(sequencer)
+        stats = aud.buffer_stats()
+        print("{}  {} file buffers for {} sequence buffers  {} bytes  {} bytes saved".format(
+              seqname, stats['buffers'], stats['references'],
+              stats['bytes'], stats['saved']))
+
+    for sequencer in sequencers:
+        aud.del_sequence(sequencer)
+    stats = aud.buffer_stats()
+    if stats['buffers'] != 0:
+        print("WARNING: {} file buffers still loaded after removing every sequence.".format(stats['buffers']))
+
+if __name__ == "__main__":
+    main()
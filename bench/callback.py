@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+import time
+from sys import argv
+import lib.audio as audio
+from bench.common import *
+
+REPEAT = 5
+
+def run(aud, sequencer):
+    """
+    Play a sequence through to the end, returning how long each audio callback
+    took in seconds.
+    """
+    times = list()
+    aud.add_sequence(sequencer, enabled=True)
+    while not sequencer.ended:
+        start = time.perf_counter()
+        aud.frame()
+        times.append(time.perf_counter() - start)
+        # nothing consumes the output, so throw it away
+        aud._s.invalidate_buffers()
+    aud.del_sequence(sequencer)
+    sequencer.fast_reset()
+    return times
+
+def apply_rows(sequencer):
+    """
+    Apply every line of the sequence to its channels in order, without running
+    anything, returning the number of rows applied.
+    """
+    applied = 0
+    seq = sequencer._seq
+    seq.reset()
+    try:
+        while True:
+            time, line = seq.advance(100000)
+            for num, channel in enumerate(sequencer._localChannels):
+                if line[num] == None:
+                    continue
+                if isinstance(channel, audio.PlayerState):
+                    sequencer._update_player(channel, line[num])
+                elif isinstance(channel, audio.FilterState):
+                    sequencer._update_filter(channel, line[num])
+                else:
+                    continue
+                applied += 1
+    except audio.seq.SequenceEnded:
+        pass
+    return applied
+
+def main():
+    try:
+        seqname = argv[1]
+    except IndexError:
+        seqname = DEFAULT_SEQ
+
+    aud = make_audio_system()
+    buffers = make_buffers(aud)
+    sequencer = load_sequence(seqname, buffers)
+
+    # warm up
+    run(aud, sequencer)
+    times = list()
+    for i in range(REPEAT):
+        times.extend(run(aud, sequencer))
+    times.sort()
+
+    print("{}  {} callbacks  mean {:.1f} us  median {:.1f} us  99% {:.1f} us  max {:.1f} us".format(
+          seqname, len(times),
+          sum(times) / len(times) * 1000000,
+          times[len(times) // 2] * 1000000,
+          times[int(len(times) * 0.99)] * 1000000,
+          times[-1] * 1000000))
+
+    # once more with profiling on, to show where the time goes and what
+    # profiling costs
+    aud.profile(True, window=len(times))
+    aud.add_sequence(sequencer, enabled=True)
+    while not sequencer.ended:
+        aud.frame()
+        aud._s.invalidate_buffers()
+    stats = aud.stats()
+    aud.del_sequence(sequencer)
+    sequencer.fast_reset()
+    aud.profile(False)
+    seqstats = stats['sequences'][0]
+    print("{}  profiled  median total {:.1f} us  advance {:.1f} us  rows {:.1f} us  synth {:.1f} us  gc {:.1f} us".format(
+          seqname, stats['total']['p50'], seqstats['advance']['p50'],
+          seqstats['rows']['p50'], seqstats['synth']['p50'],
+          stats['gc']['p50']))
+
+    aud.add_sequence(sequencer, enabled=True)
+    applied = apply_rows(sequencer)
+    best, mean = timeit(lambda: apply_rows(sequencer), REPEAT)
+    aud.del_sequence(sequencer)
+    sequencer.fast_reset()
+    print("{}  {} rows applied  best {:.3f} ms  {:.2f} us/row".format(
+          seqname, applied, best * 1000, best / applied * 1000000))
+
+if __name__ == "__main__":
+    main()
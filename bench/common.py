@@ -0,0 +1,72 @@
+import array
+import time
+import crustygame as cg
+import lib.audio as audio
+import lib.waves as waves
+
+DEFAULT_SEQ = "seq/test3.crustysequence"
+RATE = 48000
+
+MACROS = {"FILTER_SIZE": ((), str(waves.FILTER_TAPS)),
+          "FILTER_SLICES": ((), str(waves.SLICES))}
+
+def log_cb_return(priv, string):
+    print(string, end='')
+
+def make_audio_system(rate=RATE, filename=None):
+    """
+    Make an AudioSystem which doesn't open an audio device.
+    """
+    return audio.AudioSystem(log_cb_return, None, rate, 2,
+                             filename=filename, opendev=False)
+
+def load_sequence(seqname, buffers, macros=MACROS, cachedir=None):
+    """
+    Load a sequence file with the macros test2.py provides to sequences, unless
+    others are given.
+    """
+    with open(seqname, "r") as seqfile:
+        return audio.AudioSequencer(seqfile, buffers, macros,
+                                    cachedir=cachedir)
+
+def make_buffers(aud, harmonics=8):
+    """
+    Make the same external buffers test2.py provides to sequences, but with
+    empty filter banks because generating them is very slow.
+    """
+    rate = aud.rate
+    envslope = aud.buffer(cg.SYNTH_TYPE_F32,
+                          waves.create_sqrt_slope(0.0, 1.0, rate),
+                          rate, "EnvSlope")
+    benddownslope = aud.buffer(cg.SYNTH_TYPE_F32,
+                               waves.create_sqrt_slope(1.0, 0.5, rate),
+                               rate, "BendDownSlope")
+    bendupslope = aud.buffer(cg.SYNTH_TYPE_F32,
+                             waves.create_sqrt_slope(1.0, 2.0, rate),
+                             rate, "BendUpSlope")
+    noise = aud.buffer(cg.SYNTH_TYPE_F32,
+                       waves.create_random_noise(-1.0, 1.0, rate),
+                       rate, "Noise")
+    filtsize = waves.FILTER_TAPS * waves.SLICES
+    filt = array.array('f', [1.0 / waves.FILTER_TAPS]) * filtsize
+    lpfilt = aud.buffer(cg.SYNTH_TYPE_F32, filt, filtsize, "Lowpass Filters")
+    hpfilt = aud.buffer(cg.SYNTH_TYPE_F32, filt, filtsize, "Highpass Filters")
+
+    wave = waves.WaveGen(rate)
+    sine = aud.buffer(cg.SYNTH_TYPE_F32, wave.sine(440), rate, "Sine")
+    square = aud.buffer(cg.SYNTH_TYPE_F32, wave.square(harmonics, 440), rate, "Square")
+    triangle = aud.buffer(cg.SYNTH_TYPE_F32, wave.triangle(harmonics, 440), rate, "Triangle")
+    saw = aud.buffer(cg.SYNTH_TYPE_F32, wave.sawtooth(harmonics, 440), rate, "Saw")
+
+    return envslope, benddownslope, bendupslope, noise, lpfilt, hpfilt, sine, square, triangle, saw
+
+def timeit(func, repeat):
+    """
+    Call func repeat times and return the best and mean time in seconds.
+    """
+    times = list()
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times)
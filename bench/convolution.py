@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+import array
+import numpy
+import crustygame as cg
+import lib.audio as audio
+from bench.common import *
+
+TAPS = (64, 256, 1024)
+FRAGSIZES = (512, 4096)
+SLICES = 64
+SECONDS = 1.0
+REPEAT = 3
+
+def make_synth(fragsize):
+    return audio.AudioSystem(log_cb_return, None, RATE, 2,
+                             fragsize=fragsize, opendev=False)
+
+def slice_source(kind, samples):
+    """
+    Slice positions for a filter: one slice the whole time, a slow sweep
+    across all of them, or a different one every sample.
+    """
+    if kind == "constant":
+        return numpy.full(samples, 0.5, dtype=numpy.float32)
+    elif kind == "sweep":
+        return numpy.linspace(0.0, 0.999, samples, dtype=numpy.float32)
+    return numpy.random.default_rng(1).uniform(0.0, 1.0, samples).astype(numpy.float32)
+
+def convolve(aud, taps, kernels, inbuf, slicebuf, fragsize, fft):
+    """
+    Filter the whole input fragsize samples at a time.
+
+    returns the output
+    """
+    samples = inbuf.size()
+    outbuf = aud.buffer(cg.SYNTH_TYPE_F32, None, samples, "Output")
+    flt = kernels.filter(taps, "Filter")
+    flt.fft(fft)
+    flt.input(inbuf)
+    flt.slices(SLICES)
+    flt.mode(cg.SYNTH_AUTO_SOURCE)
+    flt.slice_source(slicebuf)
+    flt.output(outbuf)
+    flt.output_mode(cg.SYNTH_OUTPUT_REPLACE)
+    done = 0
+    while done < samples:
+        done += flt.run(fragsize)
+    return numpy.array(outbuf.internal(), dtype=numpy.float32)
+
+def main():
+    samples = int(RATE * SECONDS)
+    rng = numpy.random.default_rng(0)
+    for fragsize in FRAGSIZES:
+        aud = make_synth(fragsize)
+        inbuf = aud.buffer(cg.SYNTH_TYPE_F32,
+                           array.array('f', rng.uniform(-1.0, 1.0, samples).astype(numpy.float32)),
+                           samples, "Input")
+        for taps in TAPS:
+            kernels = aud.buffer(cg.SYNTH_TYPE_F32,
+                                 array.array('f', (rng.uniform(-1.0, 1.0, taps * SLICES) / taps).astype(numpy.float32)),
+                                 taps * SLICES, "Kernels")
+            for kind in ("constant", "sweep", "modulated"):
+                slicebuf = aud.buffer(cg.SYNTH_TYPE_F32,
+                                      array.array('f', slice_source(kind, samples)),
+                                      samples, "Slices")
+                direct = timeit(lambda: convolve(aud, taps, kernels, inbuf, slicebuf, fragsize, False), REPEAT)
+                fft = timeit(lambda: convolve(aud, taps, kernels, inbuf, slicebuf, fragsize, True), REPEAT)
+                diff = numpy.max(numpy.abs(convolve(aud, taps, kernels, inbuf, slicebuf, fragsize, False) -
+                                           convolve(aud, taps, kernels, inbuf, slicebuf, fragsize, True)))
+                print("fragsize {:4}  {:4} taps  {:9}  direct {:10.0f} samples/s  fft {:10.0f} samples/s  {:5.1f}x  max difference {:.1e}".format(
+                      fragsize, taps, kind, samples / direct[0], samples / fft[0],
+                      direct[0] / fft[0], diff))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import contextlib
+import io
+import os
+import tempfile
+import numpy
+import lib.waves as waves
+import test2
+from bench.common import *
+
+REPEAT = 3
+WORKERS = (2, 4, None)
+
+def quietly(func):
+    """
+    Call func with its printed progress thrown away.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func()
+
+def main():
+    aud = make_audio_system()
+
+    for lowpass in (True, False):
+        name = "highpass"
+        if lowpass:
+            name = "lowpass"
+        uncached = timeit(lambda: quietly(lambda: waves.make_filter(RATE, lowpass)), REPEAT)
+        with tempfile.TemporaryDirectory() as cachedir:
+            # every cold design gets a fresh cache so it has to design and write
+            def cold():
+                with tempfile.TemporaryDirectory(dir=cachedir) as d:
+                    quietly(lambda: waves.make_filter(RATE, lowpass, d))
+            coldtime = timeit(cold, REPEAT)
+            quietly(lambda: waves.make_filter(RATE, lowpass, cachedir))
+            warmtime = timeit(lambda: waves.make_filter(RATE, lowpass, cachedir), REPEAT)
+        print("make_filter {}  uncached {:.1f} ms  cold {:.1f} ms  warm {:.2f} ms  (best)".format(
+              name, uncached[0] * 1000, coldtime[0] * 1000, warmtime[0] * 1000))
+
+        serial = quietly(lambda: waves.make_filter(RATE, lowpass))
+        for workers in WORKERS:
+            partime = timeit(lambda: quietly(lambda: waves.make_filter(RATE, lowpass, workers=workers)), REPEAT)
+            same = numpy.array_equal(serial, quietly(lambda: waves.make_filter(RATE, lowpass, workers=workers)))
+            print("make_filter {}  {} workers  {:.1f} ms  (best)  {}".format(
+                  name, workers if workers != None else "{} (all)".format(os.cpu_count()),
+                  partime[0] * 1000, "identical" if same else "DIFFERENT FROM SERIAL"))
+
+    # all of the buffers test2 loads at startup
+    origcachedir = test2.FILTER_CACHE_DIR
+    with tempfile.TemporaryDirectory() as cachedir:
+        test2.FILTER_CACHE_DIR = cachedir
+        cold = timeit(lambda: quietly(lambda: test2.load_audio(aud, test2.WAVEFORM_HARMONICS)), 1)
+        warm = timeit(lambda: quietly(lambda: test2.load_audio(aud, test2.WAVEFORM_HARMONICS)), REPEAT)
+    test2.FILTER_CACHE_DIR = origcachedir
+    print("load_audio  cold {:.1f} ms  warm {:.1f} ms".format(cold[0] * 1000, warm[0] * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import random
+from sys import argv
+import lib.latency as latency
+from bench.common import *
+
+FRAGSIZE = 512
+# seconds of each made up trace
+DURATION = 120.0
+
+def steady(rng):
+    """
+    A game running at a steady 60 frames per second, with a little jitter.
+    """
+    trace = list()
+    t = 0.0
+    while t < DURATION:
+        interval = rng.gauss(1.0 / 60.0, 0.001)
+        trace.append((interval, rng.uniform(0.0004, 0.0008)))
+        t += interval
+    return trace
+
+def bursty(rng):
+    """
+    Mostly 60 frames per second, but every few seconds a run of long frames,
+    like loading a level or a scene with a lot going on.
+    """
+    trace = list()
+    t = 0.0
+    burst = 0
+    while t < DURATION:
+        if burst == 0 and rng.random() < 0.005:
+            burst = rng.randint(5, 60)
+        if burst > 0:
+            burst -= 1
+            interval = rng.uniform(0.025, 0.045)
+        else:
+            interval = rng.gauss(1.0 / 60.0, 0.001)
+        trace.append((interval, rng.uniform(0.0004, 0.0008)))
+        t += interval
+    return trace
+
+def spikes(rng):
+    """
+    Steady, but with an occasional single very long frame, like a garbage
+    collection.
+    """
+    trace = list()
+    t = 0.0
+    while t < DURATION:
+        interval = rng.gauss(1.0 / 60.0, 0.001)
+        if rng.random() < 0.002:
+            interval += rng.uniform(0.03, 0.1)
+        trace.append((interval, rng.uniform(0.0004, 0.0008)))
+        t += interval
+    return trace
+
+CONTROLLERS = (("fixed 1", lambda: latency.FixedLatency(1)),
+               ("fixed 8", lambda: latency.FixedLatency(8)),
+               ("histogram", latency.HistogramLatency),
+               ("predictive", latency.PredictiveLatency))
+
+def main():
+    traces = list()
+    if len(argv) > 1:
+        for filename in argv[1:]:
+            traces.append((filename, latency.load_trace(filename)))
+    else:
+        rng = random.Random(1)
+        for func in (steady, bursty, spikes):
+            traces.append((func.__name__, func(rng)))
+
+    for name, trace in traces:
+        for cname, controller in CONTROLLERS:
+            result = latency.simulate(controller(), trace, RATE, FRAGSIZE)
+            print("{}  {:10}  {:5} underruns  {:4} changes  mean {:.1f} ms  max {:.1f} ms".format(
+                  name, cname, result['underruns'], result['changes'],
+                  result['mean'], result['max']))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+import os
+from sys import argv
+from bench.common import *
+
+REPEAT = 5
+TABLE_SIZES = (0, 10, 100, 1000)
+SEQUENCES = ("seq/test3.crustysequence",
+             "seq/kstest.crustysequence",
+             "seq/pmtest.crustysequence")
+
+def make_macros(count):
+    """
+    Make a table of macros which won't be found in the sequences, so they only
+    add to the work of searching for macros, and a few take arguments.
+    """
+    macros = dict(MACROS)
+    for i in range(count):
+        if i % 4 == 0:
+            macros["GEN_MACRO_{:04d}".format(i)] = (("_A", "_B"), "_A {} _B".format(i))
+        else:
+            macros["GEN_MACRO_{:04d}".format(i)] = ((), str(i))
+    return macros
+
+def main():
+    seqnames = argv[1:]
+    if len(seqnames) == 0:
+        seqnames = SEQUENCES
+
+    aud = make_audio_system()
+    buffers = make_buffers(aud)
+
+    print("sequence  macros  best ms  mean ms")
+    for seqname in seqnames:
+        for size in TABLE_SIZES:
+            macros = make_macros(size)
+            best, mean = timeit(lambda: load_sequence(seqname, buffers, macros), REPEAT)
+            print("{}  {}  {:.2f}  {:.2f}".format(seqname, size,
+                                                  best * 1000, mean * 1000))
+
+if __name__ == "__main__":
+    main()
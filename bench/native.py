@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+import array
+import os
+import tempfile
+import wave
+import numpy
+import crustygame as cg
+from bench.common import *
+
+SECONDS = 60
+FRAGSIZE = 4096
+REPEAT = 5
+MODES = ("once", "resampled", "loop", "phase")
+
+def write_wav(filename, samples, width):
+    """
+    Write a mono 8 or 16 bit WAV of noise.
+    """
+    rng = numpy.random.default_rng(0)
+    if width == 1:
+        data = rng.integers(0, 255, samples, dtype=numpy.uint8)
+    else:
+        data = rng.integers(-32768, 32767, samples, dtype=numpy.int16)
+    with wave.open(filename, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(width)
+        wav.setframerate(RATE)
+        wav.writeframes(data.tobytes())
+
+def play(aud, buf, mode, phase):
+    """
+    Play a buffer for as many samples as it has, a fragment at a time.
+
+    returns the whole output
+    """
+    samples = buf.size()
+    out = aud.buffer(cg.SYNTH_TYPE_F32, None, samples, "Output")
+    player = buf.player("Player")
+    player.output(out)
+    player.output_mode(cg.SYNTH_OUTPUT_REPLACE)
+    if mode == "resampled":
+        player.speed(0.73)
+    elif mode == "loop":
+        player.mode(cg.SYNTH_MODE_LOOP)
+        player.loop_length(samples // 7)
+        player.loop_start(samples // 3)
+    elif mode == "phase":
+        player.phase_source(phase)
+        player.mode(cg.SYNTH_MODE_PHASE_SOURCE)
+    done = 0
+    while done < samples:
+        got = player.run(min(FRAGSIZE, samples - done))
+        done += got
+        if got == 0:
+            break
+    return numpy.array(out.internal(), dtype=numpy.float32)
+
+def main():
+    samples = RATE * SECONDS
+    aud = make_audio_system()
+    rng = numpy.random.default_rng(1)
+    phase = aud.buffer(cg.SYNTH_TYPE_F32,
+                       array.array('f', rng.uniform(0.0, 1.0, samples).astype(numpy.float32)),
+                       samples, "Phase")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for width in (1, 2):
+            filename = os.path.join(tmpdir, "noise{}.wav".format(width * 8))
+            write_wav(filename, samples, width)
+            bufs = list()
+            for native in (False, True):
+                aud._s.native_buffers(native)
+                bufs.append(aud._s.buffer(filename, None))
+            aud._s.native_buffers(False)
+            print("{} bit, {} seconds  float {:.1f} MB  native {:.1f} MB".format(
+                  width * 8, SECONDS, bufs[0].memory() / 1000000,
+                  bufs[1].memory() / 1000000))
+            for mode in MODES:
+                rates = list()
+                outputs = list()
+                for buf in bufs:
+                    elapsed = timeit(lambda: play(aud, buf, mode, phase), REPEAT)
+                    rates.append(samples / elapsed[0])
+                    outputs.append(play(aud, buf, mode, phase))
+                print("  {:9}  float {:10.0f} samples/s  native {:10.0f} samples/s  {:+.1f}%".format(
+                      mode, rates[0], rates[1], (rates[1] / rates[0] - 1.0) * 100.0))
+                if not numpy.array_equal(outputs[0], outputs[1]):
+                    print("WARNING: Native format output differs from float output.")
+
+if __name__ == "__main__":
+    main()
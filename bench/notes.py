@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+import io
+import random
+import time
+import lib.audio as audio
+from bench.common import timeit
+
+LINES = 2000
+NOTES_PER_LINE = 16
+REPEAT = 5
+
+def make_sequence(lines, notes):
+    """
+    Make some note-dense lines like a player channel column in a sequence,
+    with a few detuned notes mixed in.
+    """
+    rand = random.Random(0)
+    out = io.StringIO()
+    for i in range(lines):
+        for j in range(notes):
+            note = rand.choice("CDEFGAB") + rand.choice(('', '#', 'b')) + str(rand.randint(1, 7))
+            if rand.random() < 0.1:
+                note += "*{}".format(rand.choice((0.5, -0.25, 0.1)))
+            print("800000 ${}".format(note), end=' | ', file=out)
+        print(file=out)
+    return out.getvalue()
+
+def main():
+    tunes = audio.AudioSequencer._rearrange_tunings([2 ** (x / 12) for x in range(12)])
+    data = make_sequence(LINES, NOTES_PER_LINE)
+    speeds = [word[1:] for word in data.split() if word[0] == '$']
+
+    best, mean = timeit(lambda: audio.get_note_table(tunes), 1)
+    print("first table build  {:.2f} ms".format(best * 1000))
+
+    for name, notes in (("parsed", None), ("table", audio.get_note_table(tunes))):
+        def run():
+            for speed in speeds:
+                audio.get_speed(speed, tunes, notes)
+        best, mean = timeit(run, REPEAT)
+        print("get_speed {}  {} notes  {:.2f} ms  {:.0f} notes/s".format(
+              name, len(speeds), best * 1000, len(speeds) / best))
+
+    def read():
+        reader = audio.MacroReader(io.StringIO(data))
+        reader.set_tunes(tunes)
+        for line in reader:
+            pass
+    best, mean = timeit(read, REPEAT)
+    print("MacroReader  {} lines  {:.2f} ms".format(LINES, best * 1000))
+
+if __name__ == "__main__":
+    main()
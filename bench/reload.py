@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import time
+from sys import argv
+from bench.common import *
+
+REPEAT = 5
+# audio played before each reload, so it happens partway through
+PLAY_SECONDS = 1.0
+# audio compared after reloading, long enough to get to the next pattern
+SECONDS = 8.0
+
+def frame(aud):
+    start = time.perf_counter()
+    got = aud.frame()
+    elapsed = time.perf_counter() - start
+    # nothing consumes the output, so throw it away
+    aud._s.invalidate_buffers()
+    return got, elapsed
+
+def play(aud, filename, samples):
+    """
+    Render enabled sequences from wherever they are for at least samples.
+
+    returns the rendered WAV file's contents
+    """
+    aud.render(filename, samples)
+    with open(filename, "rb") as wav:
+        return wav.read()
+
+def compare(aud, sequencer, filename):
+    """
+    Play a sequence partway from the beginning, then reload it unchanged and
+    check it sounds the same as it does when it's not reloaded.
+    """
+    lead = int(PLAY_SECONDS * aud.rate)
+    samples = int(SECONDS * aud.rate)
+    aud.restart_sequence(sequencer)
+    play(aud, filename, lead)
+    unreloaded = play(aud, filename, samples)
+    aud.restart_sequence(sequencer)
+    play(aud, filename, lead)
+    aud.reload_sequence(sequencer)
+    # make sure it's parsed before playing on, so it's switched to in time
+    while len(aud._reparsed) == 0:
+        time.sleep(0.001)
+    reloaded = play(aud, filename, samples)
+    if sequencer in aud._reloading:
+        print("WARNING: Unchanged reload wasn't switched to in {} seconds.".format(SECONDS))
+    elif reloaded != unreloaded:
+        print("WARNING: Output after an unchanged reload differs from not reloading.")
+
+def reload(aud, sequencer):
+    """
+    Reload a playing sequence and keep playing until it's switched over and
+    the old version is unloaded.
+
+    returns the longest frame() call, the longest time frame() spent loading
+    and unloading, the time the switch took in the audio callback, the
+    position in the order it switched at, and the position it carried on
+    from
+    """
+    switched = list()
+    switch = sequencer._switch_reload
+    def timed_switch(order):
+        start = time.perf_counter()
+        switch(order)
+        switched.append((time.perf_counter() - start, order,
+                         sequencer._seq.order_start()))
+    sequencer._switch_reload = timed_switch
+    serviced = [0.0]
+    service = aud._service_reloads
+    def timed_service():
+        start = time.perf_counter()
+        service()
+        serviced[0] = max(serviced[0], time.perf_counter() - start)
+    aud._service_reloads = timed_service
+
+    longest = 0.0
+    aud.reload_sequence(sequencer)
+    try:
+        while sequencer in aud._reloading and not sequencer.ended:
+            longest = max(longest, frame(aud)[1])
+    finally:
+        del sequencer._switch_reload
+        del aud._service_reloads
+    if len(switched) == 0:
+        return longest, serviced[0], None, None, None
+    return (longest, serviced[0]) + switched[0]
+
+def main():
+    seqname = DEFAULT_SEQ
+    if len(argv) > 1:
+        seqname = argv[1]
+
+    aud = make_audio_system()
+    buffers = make_buffers(aud)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, os.path.basename(seqname))
+        shutil.copy(seqname, filename)
+        sequencer = load_sequence(filename, buffers)
+        aud.add_sequence(sequencer, enabled=True)
+
+        reparse = timeit(sequencer._reparse, REPEAT)
+        played = 0
+        normal = 0.0
+        while played < PLAY_SECONDS * aud.rate:
+            got, elapsed = frame(aud)
+            played += got
+            normal = max(normal, elapsed)
+        print("{}  reparse {:.2f}/{:.2f} ms (best/mean)  longest frame {:.2f} ms".format(
+              seqname, reparse[0] * 1000, reparse[1] * 1000, normal * 1000))
+
+        # the same order keeps its place, a different one starts over
+        for name, change in (("unchanged", None),
+                             ("new order", lambda order: order[:-1])):
+            if change != None:
+                with open(filename, "r") as infile:
+                    lines = infile.read().rstrip().split('\n')
+                order = change(lines[-1].split())
+                lines[-1] = " ".join(order)
+                with open(filename, "w") as outfile:
+                    outfile.write("\n".join(lines) + "\n")
+            longest, loading, swap, before, after = reload(aud, sequencer)
+            if swap == None:
+                print("WARNING: {} reload never switched over.".format(name))
+                continue
+            print("{:9}  switched at order {} and carried on from {}  switch {:.1f} us  load {:.2f} ms  longest frame {:.2f} ms".format(
+                  name, before, after, swap * 1000000, loading * 1000,
+                  longest * 1000))
+
+        # rendering has to come last, since frame() can't be used after
+        compare(aud, sequencer, os.path.join(tmpdir, "reload.wav"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import time
+from sys import argv
+from sdl2 import SDL_Init, SDL_INIT_AUDIO
+import lib.audio as audio
+from bench.common import *
+
+SECONDS = 5.0
+# a game running at 60 frames per second where every so often a frame takes
+# much longer
+FRAME = 1.0 / 60.0
+SLOW_FRAME = 0.1
+SLOW_EVERY = 30
+LOOKAHEADS = (None, 50, 150)
+
+def busy(seconds):
+    """
+    Spin in python for a while, like a game doing a lot of work in a frame.
+    """
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def play(aud, sequencer, lookahead):
+    """
+    Play a sequence on a real audio device for a while, with some slow frames,
+    returning the number of underruns and the lowest fill seen in ms.
+    """
+    aud.profile(True)
+    aud.render_ahead(lookahead)
+    aud.add_sequence(sequencer, enabled=True)
+    aud.enabled(True)
+    lowest = None
+    frame = 0
+    end = time.monotonic() + SECONDS
+    while time.monotonic() < end and not sequencer.ended:
+        # how much was left after the last frame, before filling up again
+        fill = aud.fill
+        if frame > SLOW_EVERY and (lowest == None or fill < lowest):
+            lowest = fill
+        aud.frame()
+        frame += 1
+        if frame % SLOW_EVERY == 0:
+            busy(SLOW_FRAME)
+        else:
+            busy(FRAME)
+    aud.render_ahead(None)
+    aud.del_sequence(sequencer)
+    sequencer.fast_reset()
+    stats = aud.stats()
+    aud.profile(False)
+    return len(stats['underruns']), lowest
+
+def main():
+    try:
+        seqname = argv[1]
+    except IndexError:
+        seqname = DEFAULT_SEQ
+
+    SDL_Init(SDL_INIT_AUDIO)
+    # a fixed latency so the results show what rendering ahead does alone
+    aud = audio.AudioSystem(log_cb_return, None, RATE, 2,
+                            controller=audio.latency.FixedLatency(4))
+    buffers = make_buffers(aud)
+    sequencer = load_sequence(seqname, buffers)
+
+    for lookahead in LOOKAHEADS:
+        underruns, lowest = play(aud, sequencer, lookahead)
+        name = "off"
+        if lookahead != None:
+            name = "{} ms".format(lookahead)
+        print("{}  render ahead {:6}  {} underruns  lowest fill {:.1f} ms".format(
+              seqname, name, underruns, lowest))
+
+if __name__ == "__main__":
+    main()
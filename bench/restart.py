@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+import os
+import tempfile
+from sys import argv
+from bench.common import *
+
+REPEAT = 20
+# audio compared after each kind of restart
+SECONDS = 2.0
+
+def play(aud, filename, samples):
+    """
+    Render enabled sequences from wherever they are for at least samples.
+
+    returns the rendered WAV file's contents
+    """
+    aud.render(filename, samples)
+    with open(filename, "rb") as wav:
+        return wav.read()
+
+def main():
+    seqname = DEFAULT_SEQ
+    if len(argv) > 1:
+        seqname = argv[1]
+
+    aud = make_audio_system()
+    buffers = make_buffers(aud)
+    samples = int(SECONDS * aud.rate)
+
+    sequencer = load_sequence(seqname, buffers)
+    aud.add_sequence(sequencer, enabled=True)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "restart.wav")
+        fresh = play(aud, filename, samples)
+
+        def readd():
+            aud.del_sequence(sequencer)
+            sequencer.fast_reset()
+            aud.add_sequence(sequencer, enabled=True)
+        # readding is what had to be done before, and reset() frees and
+        # reloads everything too
+        restarts = (("readd", readd),
+                    ("cold", sequencer.reset),
+                    ("warm", lambda: aud.restart_sequence(sequencer)))
+        print("{}  restart latency (best/mean ms)".format(seqname))
+        for name, restart in restarts:
+            play(aud, filename, samples)
+            restart()
+            if play(aud, filename, samples) != fresh:
+                print("WARNING: Output after {} restart differs from a fresh load.".format(name))
+            best, mean = timeit(restart, REPEAT)
+            print("{:5}  {:.3f}/{:.3f}".format(name, best * 1000, mean * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+import io
+import time
+import lib.sequencer as seq
+
+ROW_COUNTS = (1000, 10000, 100000)
+COLUMNS = 4
+
+def make_description():
+    desc = seq.SequenceDescription()
+    rowDesc = desc.add_row_description()
+    desc.add_field(rowDesc, seq.FIELD_TYPE_INT)
+    desc.add_field(rowDesc, seq.FIELD_TYPE_FLOAT)
+    desc.add_field(rowDesc, seq.FIELD_TYPE_STR)
+    for i in range(COLUMNS):
+        desc.add_column(rowDesc)
+    return desc
+
+def make_sequence(rows):
+    """
+    Make a sequence with one pattern where every line has one new distinct
+    row in the first column and repeats of earlier rows in the others.
+    """
+    out = io.StringIO()
+    print("10 | 0 0.0 x | 0 0.0 x | 0 0.0 x | 0 0.0 x", file=out)
+    print("1", file=out)
+    print(rows, file=out)
+    for i in range(rows):
+        print("0 | 7 {} {:.1f} C4".format(i, i % 100), end='', file=out)
+        for j in range(1, COLUMNS):
+            print(" | 7 {} 0.0 D4".format(i // 10), end='', file=out)
+        print(file=out)
+    print("0", file=out)
+    return out.getvalue()
+
+def main():
+    desc = make_description()
+    print("lines  distinct rows  load s  rows/s")
+    for rows in ROW_COUNTS:
+        data = make_sequence(rows)
+        start = time.perf_counter()
+        s = seq.Sequencer(desc, io.StringIO(data))
+        elapsed = time.perf_counter() - start
+        stored = len(s.compiled[0])
+        print("{}  {}  {:.3f}  {:.0f}".format(rows, stored, elapsed,
+                                             stored / elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+import tempfile
+from sys import argv
+from bench.common import *
+
+REPEAT = 20
+
+def main():
+    seqnames = argv[1:]
+    if len(seqnames) == 0:
+        seqnames = (DEFAULT_SEQ,)
+
+    aud = make_audio_system()
+    buffers = make_buffers(aud)
+
+    print("sequence  uncached  cold  warm  speedup (best/mean ms)")
+    for seqname in seqnames:
+        uncached = timeit(lambda: load_sequence(seqname, buffers), REPEAT)
+        with tempfile.TemporaryDirectory() as cachedir:
+            # every cold load gets a fresh cache so it has to parse and write
+            def cold():
+                with tempfile.TemporaryDirectory(dir=cachedir) as d:
+                    load_sequence(seqname, buffers, cachedir=d)
+            coldtime = timeit(cold, REPEAT)
+            load_sequence(seqname, buffers, cachedir=cachedir)
+            warmtime = timeit(lambda: load_sequence(seqname, buffers, cachedir=cachedir), REPEAT)
+        print("{}  {:.2f}/{:.2f}  {:.2f}/{:.2f}  {:.2f}/{:.2f}  {:.1f}x".format(
+              seqname,
+              uncached[0] * 1000, uncached[1] * 1000,
+              coldtime[0] * 1000, coldtime[1] * 1000,
+              warmtime[0] * 1000, warmtime[1] * 1000,
+              uncached[0] / warmtime[0]))
+
+if __name__ == "__main__":
+    main()
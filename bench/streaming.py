@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import os
+import tempfile
+import wave
+import numpy
+import crustygame as cg
+from bench.common import *
+
+# long enough to be like an ambience bed, but player positions are floats so
+# they stop advancing at 2**24 samples, a bit under 6 minutes
+MINUTES = 5
+FRAGSIZE = 4096
+REPEAT = 3
+
+def write_wav(filename, samples):
+    """
+    Write a mono 16 bit WAV of noise.
+    """
+    rng = numpy.random.default_rng(0)
+    with wave.open(filename, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(rng.integers(-32768, 32767, samples, dtype=numpy.int16).tobytes())
+
+def play(aud, buf):
+    """
+    Play a buffer through once, a fragment at a time.
+
+    returns the output of the last fragment
+    """
+    out = aud.buffer(cg.SYNTH_TYPE_F32, None, FRAGSIZE, "Output")
+    player = buf.player("Player")
+    player.output(out)
+    player.output_mode(cg.SYNTH_OUTPUT_REPLACE)
+    while True:
+        player.output_pos(0)
+        if player.run(FRAGSIZE) < FRAGSIZE:
+            break
+    return numpy.array(out.internal(), dtype=numpy.float32)
+
+def main():
+    samples = RATE * 60 * MINUTES
+    aud = make_audio_system()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "ambience.wav")
+        write_wav(filename, samples)
+        print("{} minutes, {:.1f} MB file".format(MINUTES, os.path.getsize(filename) / 1000000))
+        results = list()
+        for stream in (False, True):
+            load = timeit(lambda: aud._s.buffer(filename, None, stream), REPEAT)
+            buf = aud._s.buffer(filename, None, stream)
+            playtime = timeit(lambda: play(aud, buf), REPEAT)
+            # what stays in memory, a window per player when streamed
+            if buf.streamed():
+                held = 16384 * 4
+            else:
+                held = buf.size() * 4
+            results.append(play(aud, buf))
+            print("{:8}  load {:8.1f} ms  play {:6.0f} ms  {:9.0f} samples/s  {:7.1f} MB held".format(
+                  "streamed" if stream else "full", load[0] * 1000, playtime[0] * 1000,
+                  samples / playtime[0], held / 1000000))
+        if not numpy.array_equal(results[0], results[1]):
+            print("WARNING: Streamed output differs from fully loaded output.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+import argparse
+import glob
+import json
+import sys
+import time
+import lib.audio as audio
+from render import make_renderer, DEFAULT_RATE, DEFAULT_FRAGSIZE
+from bench.common import load_sequence
+
+RESULTS_VERSION = 1
+SEQ_GLOBS = ("seq/*.crustysequence", "scraps/*.crustysequence")
+REPEAT = 3
+# stop sequences which go on forever
+MAX_SECONDS = 60.0
+# how much slower than the baseline counts as a regression
+THRESHOLD = 0.1
+
+class _TimedRun():
+    """
+    Stands in for a Player or Filter to add up the samples generated and time
+    taken by its run() calls, passing everything else through.
+    """
+    def __init__(self, obj, totals):
+        self._obj = obj
+        self._totals = totals
+
+    def run(self, samples):
+        start = time.perf_counter()
+        got = self._obj.run(samples)
+        self._totals[1] += time.perf_counter() - start
+        self._totals[0] += got
+        return got
+
+    def __getattr__(self, name):
+        return getattr(self._obj, name)
+
+def play(aud, sequencer, maxsamples, timed=False):
+    """
+    Play a sequence through without an audio device, throwing away the
+    output.
+
+    returns the samples generated, the seconds taken, and if timed, the
+    samples and seconds spent in player and filter run() calls
+    """
+    aud.add_sequence(sequencer, enabled=True)
+    players = [0, 0.0]
+    filters = [0, 0.0]
+    if timed:
+        for channel in sequencer._localChannels:
+            if isinstance(channel, audio.PlayerState):
+                channel.player = _TimedRun(channel.player, players)
+            elif isinstance(channel, audio.FilterState):
+                channel.flt = _TimedRun(channel.flt, filters)
+    samples = 0
+    start = time.perf_counter()
+    try:
+        while not sequencer.ended and samples < maxsamples:
+            samples += aud.frame()
+            aud._s.invalidate_buffers()
+    finally:
+        elapsed = time.perf_counter() - start
+        aud.del_sequence(sequencer)
+        sequencer.fast_reset()
+    return samples, elapsed, players, filters
+
+def _rate(samples, seconds):
+    if seconds <= 0.0:
+        return None
+    return samples / seconds
+
+def measure(aud, buffers, seqname, repeat, maxsamples):
+    """
+    Measure how fast a sequence can be generated.
+
+    returns a dict of results
+    """
+    sequencer = load_sequence(seqname, buffers)
+    best = None
+    for i in range(repeat):
+        samples, elapsed, _, _ = play(aud, sequencer, maxsamples)
+        if best == None or elapsed < best:
+            best = elapsed
+    # a separate pass to split the time up, so the wrappers don't count
+    # against the total
+    _, _, players, filters = play(aud, sequencer, maxsamples, timed=True)
+
+    return {'samples': samples,
+            'seconds': best,
+            'samples_per_sec': _rate(samples, best),
+            'realtime': _rate(samples / aud.rate, best),
+            'player': {'samples': players[0],
+                       'seconds': players[1],
+                       'samples_per_sec': _rate(*players)},
+            'filter': {'samples': filters[0],
+                       'seconds': filters[1],
+                       'samples_per_sec': _rate(*filters)}}
+
+def compare(results, baseline, threshold):
+    """
+    Print how results compare to a baseline.
+
+    returns the number of regressions
+    """
+    regressions = 0
+    base = baseline['results']
+    for seqname, result in results['results'].items():
+        if seqname not in base:
+            print("{}  not in baseline".format(seqname))
+            continue
+        old = base[seqname]
+        if 'error' in result or 'error' in old:
+            if 'error' in result and 'error' not in old:
+                print("{}  REGRESSION  now fails: {}".format(seqname, result['error']))
+                regressions += 1
+            continue
+        for name, new, prev in (("total", result, old),
+                                ("player", result['player'], old['player']),
+                                ("filter", result['filter'], old['filter'])):
+            if new['samples_per_sec'] == None or prev['samples_per_sec'] == None:
+                continue
+            ratio = new['samples_per_sec'] / prev['samples_per_sec']
+            flag = ""
+            if ratio < 1.0 - threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print("{}  {:6}  {:.0f} -> {:.0f} samples/s  {:+.1f}%{}".format(
+                  seqname, name, prev['samples_per_sec'],
+                  new['samples_per_sec'], (ratio - 1.0) * 100.0, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure headless synth throughput.")
+    parser.add_argument('seqnames', nargs='*',
+                        help="sequence files to play, defaults to everything in {}".format(" and ".join(SEQ_GLOBS)))
+    parser.add_argument('-o', '--output',
+                        help="JSON file to write results to")
+    parser.add_argument('-c', '--compare',
+                        help="baseline JSON file to compare results against")
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help="fraction slower than the baseline which counts as a regression")
+    parser.add_argument('-n', '--repeat', type=int, default=REPEAT,
+                        help="times to play each sequence, keeping the best")
+    parser.add_argument('-m', '--max-seconds', type=float, default=MAX_SECONDS,
+                        help="stop each sequence after this many seconds of audio")
+    parser.add_argument('-r', '--rate', type=int, default=DEFAULT_RATE,
+                        help="sample rate")
+    parser.add_argument('-f', '--fragsize', type=int, default=DEFAULT_FRAGSIZE,
+                        help="samples generated per frame")
+    args = parser.parse_args()
+
+    seqnames = args.seqnames
+    if len(seqnames) == 0:
+        for pattern in SEQ_GLOBS:
+            seqnames.extend(sorted(glob.glob(pattern)))
+
+    aud, buffers = make_renderer(args.rate, args.fragsize)
+    maxsamples = int(args.max_seconds * aud.rate)
+    results = {'version': RESULTS_VERSION,
+               'rate': aud.rate,
+               'fragsize': args.fragsize,
+               'results': dict()}
+    for seqname in seqnames:
+        try:
+            result = measure(aud, buffers, seqname, args.repeat, maxsamples)
+        except Exception as e:
+            print("{}  failed: {}".format(seqname, e))
+            results['results'][seqname] = {'error': str(e)}
+            continue
+        results['results'][seqname] = result
+        print("{}  {:.2f}s  {:.0f} samples/s  {:.1f}x realtime  player {}  filter {}".format(
+              seqname, result['samples'] / aud.rate,
+              result['samples_per_sec'], result['realtime'],
+              "{:.0f} samples/s".format(result['player']['samples_per_sec'])
+              if result['player']['samples_per_sec'] != None else "none",
+              "{:.0f} samples/s".format(result['filter']['samples_per_sec'])
+              if result['filter']['samples_per_sec'] != None else "none"))
+
+    if args.output != None:
+        with open(args.output, "w") as outfile:
+            json.dump(results, outfile, indent=2)
+
+    if args.compare != None:
+        with open(args.compare, "r") as infile:
+            baseline = json.load(infile)
+        if baseline.get('version') != RESULTS_VERSION or \
+           baseline.get('rate') != results['rate'] or \
+           baseline.get('fragsize') != results['fragsize']:
+            print("WARNING: Baseline was made with different settings, comparison may be meaningless.")
+        if compare(results, baseline, args.threshold) > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -72,6 +72,10 @@ typedef struct {
     CrustyCallback log;
     int channels;
     BufferObject **outputBuffers;
+    /* snapshots of the tap which are still being looked at */
+    int tapExports;
+    /* tap count of the most recent snapshot */
+    unsigned int tapSnapCount;
 } SynthObject;
 
 typedef struct BufferObject_s {
@@ -2027,6 +2031,8 @@ static PyObject *Synth_new(PyTypeObject *type, PyObject *args, PyObject *kwds) {
     self->synth_frame.priv = NULL;
     self->channels = 0;
     self->outputBuffers = NULL;
+    self->tapExports = 0;
+    self->tapSnapCount = 0;
 
     return((PyObject *)self);
 }
@@ -2234,6 +2240,173 @@ static PyObject *Synth_close_wav(SynthObject *self,
     Py_RETURN_NONE;
 }
 
+static PyObject *Synth_write_wav(SynthObject *self,
+                                 PyTypeObject *defining_class,
+                                 PyObject *const *args,
+                                 Py_ssize_t nargs,
+                                 PyObject *kwnames) {
+    unsigned int samples;
+
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Synth is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    if(nargs < 1) {
+        PyErr_SetString(PyExc_TypeError, "function needs at least 1 argument");
+        return(NULL);
+    }
+    samples = PyLong_AsUnsignedLong(args[0]);
+    if(PyErr_Occurred() != NULL) {
+        return(NULL);
+    }
+
+    if(synth_write_wav(self->s, samples) < 0) {
+        PyErr_SetString(state->CrustyException, "synth_write_wav failed");
+        return(NULL);
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *Synth_tap(SynthObject *self,
+                           PyTypeObject *defining_class,
+                           PyObject *const *args,
+                           Py_ssize_t nargs,
+                           PyObject *kwnames) {
+    unsigned int samples;
+
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Synth is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    if(nargs < 1) {
+        PyErr_SetString(PyExc_TypeError, "function needs at least 1 argument");
+        return(NULL);
+    }
+    samples = PyLong_AsUnsignedLong(args[0]);
+    if(PyErr_Occurred() != NULL) {
+        return(NULL);
+    }
+
+    if(self->tapExports > 0) {
+        PyErr_SetString(PyExc_BufferError, "tap snapshots are still in use");
+        return(NULL);
+    }
+
+    if(synth_set_tap(self->s, samples) < 0) {
+        PyErr_SetString(state->CrustyException, "synth_set_tap failed");
+        return(NULL);
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *Synth_tap_snapshot(SynthObject *self,
+                                    PyTypeObject *defining_class,
+                                    PyObject *const *args,
+                                    Py_ssize_t nargs,
+                                    PyObject *kwnames) {
+    PyObject *view;
+
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Synth is not initialized");
+        return(NULL);
+    }
+
+    view = PyMemoryView_FromObject((PyObject *)self);
+    if(view == NULL) {
+        return(NULL);
+    }
+
+    return(Py_BuildValue("(IN)", self->tapSnapCount, view));
+}
+
+static PyObject *Synth_tap_count(SynthObject *self,
+                                 PyTypeObject *defining_class,
+                                 PyObject *const *args,
+                                 Py_ssize_t nargs,
+                                 PyObject *kwnames) {
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Synth is not initialized");
+        return(NULL);
+    }
+
+    return(PyLong_FromUnsignedLong(synth_get_tap_count(self->s)));
+}
+
+static int Synth_getbuffer(SynthObject *self, Py_buffer *view, int flags) {
+    float *buf;
+    unsigned int stride;
+    unsigned int count;
+    unsigned int samples;
+    Py_ssize_t *dims;
+
+    view->obj = NULL;
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_BufferError, "this Synth is not initialized");
+        return(-1);
+    }
+    if(flags & PyBUF_WRITABLE) {
+        PyErr_SetString(PyExc_BufferError, "the tap is read only");
+        return(-1);
+    }
+    /* channels aren't next to each other */
+    if((flags & PyBUF_STRIDES) != PyBUF_STRIDES) {
+        PyErr_SetString(PyExc_BufferError, "the tap needs strides");
+        return(-1);
+    }
+
+    samples = synth_get_tap(self->s, &buf, &stride, &count);
+    if(samples == 0) {
+        PyErr_SetString(PyExc_BufferError, "no tap has been set up");
+        return(-1);
+    }
+
+    /* shape and strides */
+    dims = PyMem_Malloc(sizeof(Py_ssize_t) * 4);
+    if(dims == NULL) {
+        PyErr_NoMemory();
+        return(-1);
+    }
+    dims[0] = self->channels;
+    dims[1] = samples;
+    dims[2] = stride * sizeof(float);
+    dims[3] = sizeof(float);
+
+    Py_INCREF(self);
+    view->obj = (PyObject *)self;
+    view->buf = buf;
+    view->len = self->channels * samples * sizeof(float);
+    view->readonly = 1;
+    view->itemsize = sizeof(float);
+    if(flags & PyBUF_FORMAT) {
+        view->format = "f";
+    } else {
+        view->format = NULL;
+    }
+    view->ndim = 2;
+    view->shape = dims;
+    view->strides = &(dims[2]);
+    view->suboffsets = NULL;
+    view->internal = dims;
+
+    self->tapExports++;
+    self->tapSnapCount = count;
+
+    return(0);
+}
+
+static void Synth_releasebuffer(SynthObject *self, Py_buffer *view) {
+    PyMem_Free(view->internal);
+    self->tapExports--;
+}
+
 static PyObject *Synth_print_full_stats(SynthObject *self,
                                         PyTypeObject *defining_class,
                                         PyObject *const *args,
@@ -2470,6 +2643,37 @@ static PyObject *Synth_set_fragments(SynthObject *self,
     Py_RETURN_NONE;
 }
 
+static PyObject *Synth_set_native_buffers(SynthObject *self,
+                                          PyTypeObject *defining_class,
+                                          PyObject *const *args,
+                                          Py_ssize_t nargs,
+                                          PyObject *kwnames) {
+    int enabled;
+
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Synth is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    if(nargs < 1) {
+        PyErr_SetString(PyExc_TypeError, "function needs at least 1 argument");
+        return(NULL);
+    }
+    enabled = PyObject_IsTrue(args[0]);
+    if(enabled < 0) {
+        return(NULL);
+    }
+
+    if(synth_set_native_buffers(self->s, enabled) < 0) {
+        PyErr_SetString(state->CrustyException, "synth_set_native_buffers failed");
+        return(NULL);
+    }
+
+    Py_RETURN_NONE;
+}
+
 static PyObject *Synth_buffer(SynthObject *self,
                               PyTypeObject *defining_class,
                               PyObject *const *args,
@@ -2487,10 +2691,12 @@ static PyObject *Synth_buffer(SynthObject *self,
 
     if(nargs == 2) {
         arglist = PyTuple_Pack(3, self, args[0], args[1]);
+    } else if(nargs == 3) {
+        arglist = PyTuple_Pack(4, self, args[0], args[1], args[2]);
     } else if(nargs == 4) {
         arglist = PyTuple_Pack(5, self, args[0], args[1], args[2], args[3]);
     } else {
-        PyErr_SetString(PyExc_TypeError, "this function needs 2 or 4 arguments");
+        PyErr_SetString(PyExc_TypeError, "this function needs 2, 3 or 4 arguments");
         return(NULL);
     }
     if(arglist == NULL) {
@@ -2525,6 +2731,42 @@ static PyMethodDef Synth_methods[] = {
         METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
         "Close an open WAV file.\n\n"
         "close_wav()"},
+    {
+        "write_wav",
+        (PyCMethod) Synth_write_wav,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Write buffered samples to the open WAV file, when there is no audio "
+        "device.\n\n"
+        "write_wav(samples)\n"
+        "samples  Number of samples to write, usually what frame() returned."},
+    {
+        "tap",
+        (PyCMethod) Synth_tap,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Start mirroring the most recently generated samples of every output "
+        "channel, for visualizing output without locking the audio device.  "
+        "Can't be changed while snapshots are still in use.\n\n"
+        "tap(samples)\n"
+        "samples  Number of samples of each channel to keep, or 0 to stop."},
+    {
+        "tap_snapshot",
+        (PyCMethod) Synth_tap_snapshot,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Get the tapped samples of all channels at once, without locking or "
+        "copying.  Samples keep being generated in to the tap, but the "
+        "snapshot won't be overwritten until tap_count() has advanced from "
+        "count by more than the number of samples tapped.  A memoryview of "
+        "the Synth is a snapshot too.\n\n"
+        "tap_snapshot() -> (count, view)\n"
+        "count  Number of samples tapped so far, wrapping around at 32 bits.\n"
+        "view   Read only memoryview of floats shaped (channels, samples)."},
+    {
+        "tap_count",
+        (PyCMethod) Synth_tap_count,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Get the number of samples tapped so far.\n\n"
+        "tap_count() -> count\n"
+        "count  Number of samples tapped, wrapping around at 32 bits."},
     {
         "enabled",
         (PyCMethod) Synth_set_enabled,
@@ -2587,6 +2829,15 @@ static PyMethodDef Synth_methods[] = {
         "Set the number of fragments that should be buffered internally.\n\n"
         "fragments(fragments)\n"
         "fragments  Number of fragments to buffer."},
+    {
+        "native_buffers",
+        (PyCMethod) Synth_set_native_buffers,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Choose whether buffers made from 8 or 16 bit data keep that format, "
+        "being converted as players read them, instead of being converted to "
+        "float up front.\n\n"
+        "native_buffers(enabled)\n"
+        "enabled  True to keep new buffers in their native format."},
     {
         "buffer",
         (PyCMethod) Synth_buffer,
@@ -2619,6 +2870,8 @@ static PyType_Slot SynthSlots[] = {
     {Py_tp_dealloc, (destructor)Synth_dealloc},
     {Py_tp_methods, Synth_methods},
     {Py_tp_traverse, heap_type_traverse},
+    {Py_bf_getbuffer, (getbufferproc)Synth_getbuffer},
+    {Py_bf_releasebuffer, (releasebufferproc)Synth_releasebuffer},
     {0, NULL}
 };
 
@@ -2654,6 +2907,7 @@ static int Buffer_init(BufferObject *self, PyObject *args, PyObject *kwds) {
     unsigned int size = 0;
     PyObject *name = NULL;
     const char *cname;
+    int stream = 0;
     PyObject *etype, *evalue, *etraceback;
 
     if(self->s != NULL) {
@@ -2677,10 +2931,11 @@ static int Buffer_init(BufferObject *self, PyObject *args, PyObject *kwds) {
         Py_XDECREF(evalue);
         Py_XDECREF(etraceback);
 
-        if(!PyArg_ParseTuple(args, "OsO",
+        if(!PyArg_ParseTuple(args, "OsO|p",
                             &(self->s),
                             &filename,
-                            &name)) {
+                            &name,
+                            &stream)) {
             self->s = NULL;
             return(-1);
         } else {
@@ -2696,10 +2951,18 @@ static int Buffer_init(BufferObject *self, PyObject *args, PyObject *kwds) {
                 }
             }
 
-            self->buffer = synth_buffer_from_wav(self->s->s, filename, &(self->rate), cname);
+            if(stream) {
+                self->buffer = synth_buffer_stream_wav(self->s->s, filename, &(self->rate), cname);
+            } else {
+                self->buffer = synth_buffer_from_wav(self->s->s, filename, &(self->rate), cname);
+            }
             Py_CLEAR(name);
             if(self->buffer < 0) {
-                PyErr_SetString(state->CrustyException, "synth_buffer_from_wav returned an error");
+                if(stream) {
+                    PyErr_SetString(state->CrustyException, "synth_buffer_stream_wav returned an error");
+                } else {
+                    PyErr_SetString(state->CrustyException, "synth_buffer_from_wav returned an error");
+                }
                 goto error;
             }
 
@@ -2852,6 +3115,79 @@ static PyObject *Synth_get_size(BufferObject *self,
     return(PyLong_FromLong(ret));
 }
 
+static PyObject *Synth_buffer_is_streamed(BufferObject *self,
+                                          PyTypeObject *defining_class,
+                                          PyObject *const *args,
+                                          Py_ssize_t nargs,
+                                          PyObject *kwnames) {
+    int ret;
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Buffer is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    ret = synth_buffer_is_streamed(self->s->s, self->buffer);
+    if(ret < 0) {
+        PyErr_SetString(state->CrustyException, "synth_buffer_is_streamed failed");
+        return(NULL);
+    }
+
+    return(PyBool_FromLong(ret));
+}
+
+static PyObject *Synth_buffer_load_fully(BufferObject *self,
+                                         PyTypeObject *defining_class,
+                                         PyObject *const *args,
+                                         Py_ssize_t nargs,
+                                         PyObject *kwnames) {
+    int playerOnly = 0;
+
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Buffer is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    if(nargs > 0) {
+        playerOnly = PyObject_IsTrue(args[0]);
+        if(playerOnly < 0) {
+            return(NULL);
+        }
+    }
+
+    if(synth_buffer_load_fully(self->s->s, self->buffer, playerOnly) < 0) {
+        PyErr_SetString(state->CrustyException, "synth_buffer_load_fully failed");
+        return(NULL);
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *Synth_buffer_get_memory(BufferObject *self,
+                                         PyTypeObject *defining_class,
+                                         PyObject *const *args,
+                                         Py_ssize_t nargs,
+                                         PyObject *kwnames) {
+    int ret;
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Buffer is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    ret = synth_buffer_get_memory(self->s->s, self->buffer);
+    if(ret < 0) {
+        PyErr_SetString(state->CrustyException, "synth_buffer_get_memory failed");
+        return(NULL);
+    }
+
+    return(PyLong_FromLong(ret));
+}
+
 static PyObject *Synth_buffer_get_rate(BufferObject *self,
                                        PyTypeObject *defining_class,
                                        PyObject *const *args,
@@ -3015,6 +3351,31 @@ static PyMethodDef Buffer_methods[] = {
         "Get the size in samples of a buffer.\n\n"
         "size() -> size\n"
         "size  The size of the buffer in samples."},
+    {
+        "streamed",
+        (PyCMethod) Synth_buffer_is_streamed,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Find out whether a buffer is still being streamed from its file.\n\n"
+        "streamed() -> streamed\n"
+        "streamed  True if the buffer is streamed, False if it's loaded in "
+        "full."},
+    {
+        "load_fully",
+        (PyCMethod) Synth_buffer_load_fully,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Load a streamed buffer in full and convert a native format buffer to "
+        "float ahead of time, instead of the first time it's used some way "
+        "which needs that, which would likely be in the audio callback.\n\n"
+        "load_fully([player_only])\n"
+        "player_only  True if the buffer will only be the input of players, "
+        "so it can stay in its native format."},
+    {
+        "memory",
+        (PyCMethod) Synth_buffer_get_memory,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Get how much memory the buffer's samples take up.\n\n"
+        "memory() -> memory\n"
+        "memory  Bytes held by the buffer, 0 for streamed buffers."},
     {
         "rate",
         (PyCMethod) Synth_buffer_get_rate,
@@ -3074,10 +3435,12 @@ static PyType_Slot BufferSlots[] = {
                 "Buffer(synth, None, channel, None, None)\n"
                 "synth    A Synth\n"
                 "channel  An output channel buffer number\n\n"
-                "Buffer(synth, filename, name)\n"
+                "Buffer(synth, filename, name, stream=False)\n"
                 "synth     A Synth\n"
                 "filename  A WAV file to load\n"
-                "name      Optional name or None to use the filename"},
+                "name      Optional name or None to use the filename\n"
+                "stream    True to convert the file as players read it instead "
+                "of all at once, see synth_buffer_stream_wav()"},
     {Py_tp_new, Buffer_new},
     {Py_tp_init, (initproc)Buffer_init},
     {Py_tp_dealloc, (destructor)Buffer_dealloc},
@@ -4149,6 +4512,213 @@ static PyObject *Synth_player_stopped_reason(PlayerObject *self,
     return(PyLong_FromLong(ret));
 }
 
+/* how the value of each parameter for update() is converted */
+typedef enum {
+    PARAM_INT,
+    PARAM_UINT,
+    PARAM_FLOAT,
+    PARAM_BUFFER
+} ParamType;
+
+static const ParamType PLAYER_PARAM_TYPES[] = {
+    PARAM_BUFFER, /* SYNTH_PLAYER_INPUT_BUFFER */
+    PARAM_FLOAT,  /* SYNTH_PLAYER_INPUT_BUFFER_POS */
+    PARAM_BUFFER, /* SYNTH_PLAYER_OUTPUT_BUFFER */
+    PARAM_INT,    /* SYNTH_PLAYER_OUTPUT_BUFFER_POS */
+    PARAM_INT,    /* SYNTH_PLAYER_OUTPUT_MODE */
+    PARAM_INT,    /* SYNTH_PLAYER_VOLUME_MODE */
+    PARAM_FLOAT,  /* SYNTH_PLAYER_VOLUME */
+    PARAM_BUFFER, /* SYNTH_PLAYER_VOLUME_SOURCE */
+    PARAM_INT,    /* SYNTH_PLAYER_MODE */
+    PARAM_INT,    /* SYNTH_PLAYER_LOOP_START */
+    PARAM_UINT,   /* SYNTH_PLAYER_LOOP_LENGTH */
+    PARAM_BUFFER, /* SYNTH_PLAYER_START_SOURCE */
+    PARAM_UINT,   /* SYNTH_PLAYER_START_VALUES */
+    PARAM_UINT,   /* SYNTH_PLAYER_START_GRANULARITY */
+    PARAM_INT,    /* SYNTH_PLAYER_START_MODE */
+    PARAM_BUFFER, /* SYNTH_PLAYER_LENGTH_SOURCE */
+    PARAM_UINT,   /* SYNTH_PLAYER_LENGTH_VALUES */
+    PARAM_UINT,   /* SYNTH_PLAYER_LENGTH_GRANULARITY */
+    PARAM_INT,    /* SYNTH_PLAYER_LENGTH_MODE */
+    PARAM_BUFFER, /* SYNTH_PLAYER_PHASE_SOURCE */
+    PARAM_INT,    /* SYNTH_PLAYER_SPEED_MODE */
+    PARAM_FLOAT,  /* SYNTH_PLAYER_SPEED */
+    PARAM_BUFFER  /* SYNTH_PLAYER_SPEED_SOURCE */
+};
+
+static const ParamType FILTER_PARAM_TYPES[] = {
+    PARAM_BUFFER, /* SYNTH_FILTER_INPUT_BUFFER */
+    PARAM_INT,    /* SYNTH_FILTER_INPUT_BUFFER_POS */
+    PARAM_BUFFER, /* SYNTH_FILTER_BUFFER */
+    PARAM_INT,    /* SYNTH_FILTER_BUFFER_START */
+    PARAM_UINT,   /* SYNTH_FILTER_SLICES */
+    PARAM_INT,    /* SYNTH_FILTER_MODE */
+    PARAM_INT,    /* SYNTH_FILTER_SLICE */
+    PARAM_BUFFER, /* SYNTH_FILTER_SLICE_SOURCE */
+    PARAM_BUFFER, /* SYNTH_FILTER_OUTPUT_BUFFER */
+    PARAM_INT,    /* SYNTH_FILTER_OUTPUT_BUFFER_POS */
+    PARAM_INT,    /* SYNTH_FILTER_OUTPUT_MODE */
+    PARAM_INT,    /* SYNTH_FILTER_VOLUME_MODE */
+    PARAM_FLOAT,  /* SYNTH_FILTER_VOLUME */
+    PARAM_BUFFER  /* SYNTH_FILTER_VOLUME_SOURCE */
+};
+
+/* Parse a sequence of (parameter, value) pairs in to an array of SynthParam
+ * and an array of the Buffer objects given for buffer parameters, NULL for
+ * others.  Both are allocated and must be freed with PyMem_Free.  Returns the
+ * number of parameters, or -1 with an exception set. */
+static Py_ssize_t parse_params(crustygame_state *state,
+                               PyObject *pairs,
+                               const ParamType *types,
+                               int ntypes,
+                               SynthParam **params,
+                               BufferObject ***bufs) {
+    PyObject *fast;
+    PyObject *pair;
+    PyObject *val;
+    Py_ssize_t count;
+    Py_ssize_t i;
+    long param;
+
+    fast = PySequence_Fast(pairs, "argument must be a sequence of (parameter, value) pairs");
+    if(fast == NULL) {
+        return(-1);
+    }
+    count = PySequence_Fast_GET_SIZE(fast);
+
+    *params = PyMem_Malloc(sizeof(SynthParam) * (count + 1));
+    *bufs = PyMem_Malloc(sizeof(BufferObject *) * (count + 1));
+    if(*params == NULL || *bufs == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+
+    for(i = 0; i < count; i++) {
+        pair = PySequence_Fast_GET_ITEM(fast, i);
+        if(!PyTuple_Check(pair) || PyTuple_GET_SIZE(pair) != 2) {
+            PyErr_SetString(PyExc_TypeError, "parameters must be (parameter, value) tuples");
+            goto error;
+        }
+        param = PyLong_AsLong(PyTuple_GET_ITEM(pair, 0));
+        if(PyErr_Occurred() != NULL) {
+            goto error;
+        }
+        if(param < 0 || param >= ntypes) {
+            PyErr_SetString(PyExc_ValueError, "invalid parameter");
+            goto error;
+        }
+        (*params)[i].param = param;
+        (*bufs)[i] = NULL;
+
+        val = PyTuple_GET_ITEM(pair, 1);
+        switch(types[param]) {
+            case PARAM_INT:
+                (*params)[i].val.i = PyLong_AsLong(val);
+                break;
+            case PARAM_UINT:
+                (*params)[i].val.u = PyLong_AsUnsignedLong(val);
+                break;
+            case PARAM_FLOAT:
+                (*params)[i].val.f = (float)PyFloat_AsDouble(val);
+                break;
+            case PARAM_BUFFER:
+                if(!PyObject_TypeCheck(val, state->BufferType)) {
+                    PyErr_SetString(PyExc_TypeError, "buffer parameter value must be a Buffer");
+                    goto error;
+                }
+                (*bufs)[i] = (BufferObject *)val;
+                (*params)[i].val.u = (*bufs)[i]->buffer;
+                break;
+        }
+        if(PyErr_Occurred() != NULL) {
+            goto error;
+        }
+    }
+
+    Py_DECREF(fast);
+    return(count);
+
+error:
+    PyMem_Free(*params);
+    PyMem_Free(*bufs);
+    Py_DECREF(fast);
+    return(-1);
+}
+
+/* hold a reference to a newly set buffer in place of the old one */
+static void replace_buffer_ref(BufferObject **ref, BufferObject *buffer) {
+    Py_DECREF(*ref);
+    *ref = buffer;
+    Py_INCREF(*ref);
+}
+
+static BufferObject **player_buffer_ref(PlayerObject *self, int param) {
+    switch(param) {
+        case SYNTH_PLAYER_INPUT_BUFFER:
+            return(&(self->inBuffer));
+        case SYNTH_PLAYER_OUTPUT_BUFFER:
+            return(&(self->outBuffer));
+        case SYNTH_PLAYER_VOLUME_SOURCE:
+            return(&(self->volBuffer));
+        case SYNTH_PLAYER_START_SOURCE:
+            return(&(self->startBuffer));
+        case SYNTH_PLAYER_LENGTH_SOURCE:
+            return(&(self->lengthBuffer));
+        case SYNTH_PLAYER_PHASE_SOURCE:
+            return(&(self->phaseBuffer));
+        default: /* SYNTH_PLAYER_SPEED_SOURCE */
+            return(&(self->speedBuffer));
+    }
+}
+
+static PyObject *Synth_set_player_params(PlayerObject *self,
+                                         PyTypeObject *defining_class,
+                                         PyObject *const *args,
+                                         Py_ssize_t nargs,
+                                         PyObject *kwnames) {
+    SynthParam *params;
+    BufferObject **bufs;
+    Py_ssize_t count;
+    Py_ssize_t i;
+    int ret;
+
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Synth is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    if(nargs < 1) {
+        PyErr_SetString(PyExc_TypeError, "function needs at least 1 argument");
+        return(NULL);
+    }
+    count = parse_params(state, args[0],
+                         PLAYER_PARAM_TYPES,
+                         sizeof(PLAYER_PARAM_TYPES) / sizeof(ParamType),
+                         &params, &bufs);
+    if(count < 0) {
+        return(NULL);
+    }
+
+    ret = synth_set_player_params(self->s->s, self->player, params, count);
+    /* whatever was set before any failure still holds its buffers */
+    for(i = 0; i < ret; i++) {
+        if(bufs[i] != NULL) {
+            replace_buffer_ref(player_buffer_ref(self, params[i].param), bufs[i]);
+        }
+    }
+    PyMem_Free(params);
+    PyMem_Free(bufs);
+
+    if(ret < count) {
+        PyErr_SetString(state->CrustyException, "synth_set_player_params failed");
+        return(NULL);
+    }
+
+    Py_RETURN_NONE;
+}
+
 static PyMethodDef Player_methods[] = {
     {
         "input",
@@ -4311,6 +4881,14 @@ static PyMethodDef Player_methods[] = {
         "Set the source for playback speed.\n\n"
         "speed_source(buffer)\n"
         "buffer  The buffer to modulate the player speed."},
+    {
+        "update",
+        (PyCMethod) Synth_set_player_params,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Set many player parameters at once, in order.\n\n"
+        "update(params)\n"
+        "params  Sequence of (parameter, value) tuples, parameter being one of "
+        "the SYNTH_PLAYER_* constants and value what its method would take."},
     {
         "run",
         (PyCMethod) Synth_run_player,
@@ -4934,6 +5512,37 @@ static PyObject *Synth_set_filter_volume_source(FilterObject *self,
     Py_RETURN_NONE;
 }
 
+static PyObject *Synth_set_filter_fft(FilterObject *self,
+                                      PyTypeObject *defining_class,
+                                      PyObject *const *args,
+                                      Py_ssize_t nargs,
+                                      PyObject *kwnames) {
+    int enabled;
+
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Synth is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    if(nargs < 1) {
+        PyErr_SetString(PyExc_TypeError, "function needs at least 1 argument");
+        return(NULL);
+    }
+    enabled = PyObject_RichCompareBool(args[0], Py_True, Py_EQ);
+    if(enabled < 0) {
+        return(NULL);
+    }
+
+    if(synth_set_filter_fft(self->s->s, self->filter, enabled) < 0) {
+        PyErr_SetString(state->CrustyException, "synth_set_filter_fft failed");
+        return(NULL);
+    }
+
+    Py_RETURN_NONE;
+}
+
 static PyObject *Synth_run_filter(FilterObject *self,
                                   PyTypeObject *defining_class,
                                   PyObject *const *args,
@@ -4989,6 +5598,69 @@ static PyObject *Synth_filter_stopped_reason(FilterObject *self,
     return(PyLong_FromLong(ret));
 }
 
+static BufferObject **filter_buffer_ref(FilterObject *self, int param) {
+    switch(param) {
+        case SYNTH_FILTER_INPUT_BUFFER:
+            return(&(self->inBuffer));
+        case SYNTH_FILTER_BUFFER:
+            return(&(self->filterBuffer));
+        case SYNTH_FILTER_SLICE_SOURCE:
+            return(&(self->sliceBuffer));
+        case SYNTH_FILTER_OUTPUT_BUFFER:
+            return(&(self->outBuffer));
+        default: /* SYNTH_FILTER_VOLUME_SOURCE */
+            return(&(self->volBuffer));
+    }
+}
+
+static PyObject *Synth_set_filter_params(FilterObject *self,
+                                         PyTypeObject *defining_class,
+                                         PyObject *const *args,
+                                         Py_ssize_t nargs,
+                                         PyObject *kwnames) {
+    SynthParam *params;
+    BufferObject **bufs;
+    Py_ssize_t count;
+    Py_ssize_t i;
+    int ret;
+
+    if(self->s == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "this Synth is not initialized");
+        return(NULL);
+    }
+
+    crustygame_state *state = PyType_GetModuleState(defining_class);
+
+    if(nargs < 1) {
+        PyErr_SetString(PyExc_TypeError, "function needs at least 1 argument");
+        return(NULL);
+    }
+    count = parse_params(state, args[0],
+                         FILTER_PARAM_TYPES,
+                         sizeof(FILTER_PARAM_TYPES) / sizeof(ParamType),
+                         &params, &bufs);
+    if(count < 0) {
+        return(NULL);
+    }
+
+    ret = synth_set_filter_params(self->s->s, self->filter, params, count);
+    /* whatever was set before any failure still holds its buffers */
+    for(i = 0; i < ret; i++) {
+        if(bufs[i] != NULL) {
+            replace_buffer_ref(filter_buffer_ref(self, params[i].param), bufs[i]);
+        }
+    }
+    PyMem_Free(params);
+    PyMem_Free(bufs);
+
+    if(ret < count) {
+        PyErr_SetString(state->CrustyException, "synth_set_filter_params failed");
+        return(NULL);
+    }
+
+    Py_RETURN_NONE;
+}
+
 static PyMethodDef Filter_methods[] = {
     {
         "reset",
@@ -5094,6 +5766,23 @@ static PyMethodDef Filter_methods[] = {
         "Set the filter's volume source.\n\n"
         "volume_source(buffer)\n"
         "buffer  Buffer to modulate output volume."},
+    {
+        "fft",
+        (PyCMethod) Synth_set_filter_fft,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Set whether runs of samples using the same slice may be convolved with FFTs, which is\n"
+        "much faster for long filters.  Enabled by default.  Results differ from direct\n"
+        "convolution only by rounding.\n\n"
+        "fft(enabled)\n"
+        "enabled  False to always convolve directly."},
+    {
+        "update",
+        (PyCMethod) Synth_set_filter_params,
+        METH_METHOD | METH_FASTCALL | METH_KEYWORDS,
+        "Set many filter parameters at once, in order.\n\n"
+        "update(params)\n"
+        "params  Sequence of (parameter, value) tuples, parameter being one of "
+        "the SYNTH_FILTER_* constants and value what its method would take."},
     {
         "run",
         (PyCMethod) Synth_run_filter,
@@ -5456,6 +6145,117 @@ static int crustygame_exec(PyObject* m) {
     if(PyModule_AddIntMacro(m, SYNTH_STOPPED_LENGTHBUFFER) < 0) {
         goto error;
     }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_INPUT_BUFFER) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_INPUT_BUFFER_POS) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_OUTPUT_BUFFER) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_OUTPUT_BUFFER_POS) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_OUTPUT_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_VOLUME_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_VOLUME) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_VOLUME_SOURCE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_LOOP_START) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_LOOP_LENGTH) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_START_SOURCE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_START_VALUES) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_START_GRANULARITY) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_START_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_LENGTH_SOURCE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_LENGTH_VALUES) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_LENGTH_GRANULARITY) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_LENGTH_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_PHASE_SOURCE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_SPEED_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_SPEED) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_PLAYER_SPEED_SOURCE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_INPUT_BUFFER) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_INPUT_BUFFER_POS) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_BUFFER) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_BUFFER_START) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_SLICES) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_SLICE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_SLICE_SOURCE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_OUTPUT_BUFFER) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_OUTPUT_BUFFER_POS) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_OUTPUT_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_VOLUME_MODE) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_VOLUME) < 0) {
+        goto error;
+    }
+    if(PyModule_AddIntMacro(m, SYNTH_FILTER_VOLUME_SOURCE) < 0) {
+        goto error;
+    }
 
     Py_DECREF(SDL_m);
     Py_DECREF(argtypes_tuple);
@@ -1,13 +1,34 @@
 import array
+from collections import deque
 import crustygame as cg
 from dataclasses import dataclass
+import functools
+import gc
+import hashlib
+import io
+import os
+import pickle
+import re
+import threading
+import time
 import lib.sequencer as seq
+import lib.latency as latency
 from py_expression_eval import Parser
 
 CHANNEL_TYPE_SILENCE = "silence"
 CHANNEL_TYPE_PLAYER = "player"
 CHANNEL_TYPE_FILTER = "filter"
 
+# row descriptions, in the order _make_description() adds them after the
+# sequencer's own global row description
+_ROW_DESC_SILENCE = 1
+_ROW_DESC_PLAYER = 2
+_ROW_DESC_FILTER = 3
+
+# bump this whenever the parsed representation of a sequence changes so stale
+# cache files are ignored
+SEQUENCE_CACHE_VERSION = 3
+
 def _create_float_array(iterable):
     aType = c_float * len(iterable)
     a = aType()
@@ -20,8 +41,13 @@ def _create_float_array(iterable):
 _parser = Parser()
 
 _NOTES = "c d ef g a b"
+# octave forms which get put in to note tables, anything else is parsed
+_OCTAVES = [''] + \
+           [str(o) for o in range(11)] + \
+           ["+{}".format(o) for o in range(11)] + \
+           ["-{}".format(o) for o in range(11)]
 
-def get_speed(speed, tunes):
+def _parse_speed(speed, tunes):
     tune = 0.0
     try:
         # frequency
@@ -86,49 +112,106 @@ def get_speed(speed, tunes):
 
     return tune
 
+@functools.lru_cache(maxsize=16)
+def _note_table(tunes):
+    notes = dict()
+    for name in "cdefgab":
+        for letter in (name, name.upper()):
+            for accidental in ('', '#', 'b'):
+                for octave in _OCTAVES:
+                    note = letter + accidental + octave
+                    notes[note] = _parse_speed(note, tunes)
+    return notes
+
+def get_note_table(tunes):
+    """
+    Get a dict of all note names with the common octave forms to their
+    frequencies for a tuning, for passing to get_speed.  Tables are cached so
+    the same tuning gets the same table.
+    """
+    return _note_table(tuple(tunes))
+
+def get_speed(speed, tunes, notes=None):
+    """
+    Get a frequency from a number or note name with optional octave and
+    *detune, like C#4*0.5.
+
+    speed  The string to get the frequency from
+    tunes  The 12 note frequencies of the tuning, starting at C
+    notes  An optional note table from get_note_table for tunes
+    """
+    if notes is not None:
+        try:
+            return notes[speed]
+        except KeyError:
+            pass
+        note, star, detune = speed.partition('*')
+        if len(star) > 0 and len(detune) > 0:
+            try:
+                return notes[note] * (2 ** (float(detune) / 12))
+            except (KeyError, ValueError):
+                pass
+    return _parse_speed(speed, tunes)
+
+# distinct expressions in a sequence are few but they are repeated a lot by
+# macros, so keep a limited number of them around already evaluated
+EXPR_CACHE_SIZE = 1024
+
+@functools.lru_cache(maxsize=EXPR_CACHE_SIZE)
+def _compile_expr(expr):
+    """
+    Parse an expression and return the result string if it's constant, or the
+    parsed expression if it must be evaluated each time it's used.
+    """
+    parsed = _parser.parse(expr)
+    if 'random' in parsed.symbols():
+        return parsed
+    return str(float(parsed.evaluate({})))
+
+def _eval_expr(expr):
+    """
+    returns the result string and whether it could be different each time
+    """
+    compiled = _compile_expr(expr)
+    if isinstance(compiled, str):
+        return compiled, False
+    return str(float(compiled.evaluate({}))), True
+
+_PARENS = re.compile("[()]")
+
 def eval_exprs(line):
+    """
+    Replace all outermost parenthesized expressions in line with their
+    results.
+    """
+    return _eval_exprs(line)[0]
+
+def _eval_exprs(line):
+    # returns the line and whether any of its expressions weren't constant
+    if '(' not in line:
+        return line, False
+    live = False
     parens = 0
     pos = 0
-    newline = ""
-    while pos < len(line):
-        if parens > 0:
-            lidx = None
-            ridx = None
-            try:
-                lidx = line[pos:].index('(')
-            except ValueError:
-                pass
-            try:
-                ridx = line[pos:].index(')')
-            except ValueError:
-                pass
-            if lidx is None and ridx is None:
-                break
-            if lidx is not None:
-                if ridx is None or lidx < ridx:
-                    pos += lidx+1
-                    parens += 1
-            if ridx is not None:
-                if lidx is None or ridx < lidx:
-                    pos += ridx+1
-                    parens -= 1
-                    if parens == 0:
-                        expr = line[sindex:pos]
-                        result = str(float(_parser.parse(expr).evaluate({})))
-                        newline += result
-        else:
-            try:
-                sindex = line[pos:].index('(')
-                sindex += pos
-                newline += line[pos:sindex]
-                pos = sindex+1
-                parens = 1
-            except ValueError as e:
-                newline += line[pos:]
-                break
+    sindex = 0
+    newline = list()
+    for match in _PARENS.finditer(line):
+        if match.group() == '(':
+            if parens == 0:
+                newline.append(line[pos:match.start()])
+                sindex = match.start()
+            parens += 1
+        elif parens > 0:
+            parens -= 1
+            if parens == 0:
+                pos = match.end()
+                result, changes = _eval_expr(line[sindex:pos])
+                newline.append(result)
+                live = live or changes
     if parens > 0:
         raise ValueError("Unclosed parenthesis: {}".format(line[sindex:]))
-    return newline
+    newline.append(line[pos:])
+    return ''.join(newline), live
 
 class _MacroReaderIterator():
     def __init__(self, reader):
@@ -142,8 +225,7 @@ class _MacroReaderIterator():
 
 class MacroReader():
     """
-    Gross probably slow crappy class for reading a file line by line with macro
-    replacements, but it won't be dealing with large files.
+    Class for reading a file line by line with macro replacements.
     """
 
     def __init__(self, file, startLine=0, trace=False, macros=None, macrofile=False):
@@ -157,16 +239,23 @@ class MacroReader():
         self._trace = trace
         self._file = file
         self._macros = dict()
+        # trie of macro names, each node is a dict of characters to nodes and
+        # the key None holds a tuple of the macro's priority and name
+        self._trie = dict()
+        self._starts = None
         self._line = None
         self._lines = startLine
         self._tunes = None
+        self._notes = None
         self._macrofile = macrofile
+        self._live = False
 
         if macros != None:
             self.add_macros(macros)
 
     def set_tunes(self, tunes):
         self._tunes = tunes
+        self._notes = get_note_table(tunes)
 
     @property
     def curline(self):
@@ -182,6 +271,14 @@ class MacroReader():
         """
         return self._file.name
 
+    @property
+    def live(self):
+        """
+        Return whether any line read had expressions which aren't constant,
+        like random(), so reading the file again would give different lines.
+        """
+        return self._live
+
     @property
     def macros(self):
         """
@@ -206,8 +303,93 @@ class MacroReader():
                     macros[macro][1].index(arg)
                 except ValueError:
                     raise ValueError("Macro {} has arg {} not found in body.".format(macro, arg))
+            if macro not in self._macros:
+                self._add_trie(macro)
             self._macros[macro] = macros[macro]
 
+    def _add_trie(self, macro):
+        # macros are applied in the order they were first defined, so the
+        # priority is just that order
+        node = self._trie
+        for char in macro:
+            try:
+                node = node[char]
+            except KeyError:
+                node[char] = dict()
+                node = node[char]
+        node[None] = (len(self._macros), macro)
+        # rebuild the pattern of macro name starting characters
+        self._starts = None
+
+    def _present_macros(self, line, after):
+        """
+        Find which macro names appear anywhere in line, even inside other
+        names, out of those defined after priority after.  returns tuples of
+        their priority and name in the order they were defined.
+        """
+        if self._starts is None:
+            if len(self._trie) == 0:
+                return []
+            self._starts = re.compile("[{}]".format(''.join([re.escape(c) for c in self._trie.keys()])))
+        found = set()
+        for match in self._starts.finditer(line):
+            node = self._trie
+            for char in range(match.start(), len(line)):
+                try:
+                    node = node[line[char]]
+                except KeyError:
+                    break
+                if None in node and node[None][0] > after:
+                    found.add(node[None])
+        return sorted(found)
+
+    def _replace_macro(self, line, macro):
+        newLine = ""
+        args = self._macros[macro][0]
+        while True:
+            # search for instance of macro name
+            index = line.find(macro)
+            if index < 0:
+                # no macro found, just append the rest
+                newLine += line
+                break
+            # append everything up to the macro name to be replaced
+            newLine += line[:index]
+            # results in args, remainder
+            values = line[index+len(macro):].split(maxsplit=len(args))
+            # make a copy of the replacement string
+            replacement = str(self._macros[macro][1])
+            # replace all instances of argument names with the provided
+            # values
+            for num, macroarg in enumerate(args):
+                try:
+                    replacement = replacement.replace(macroarg, values[num])
+                except IndexError:
+                    raise ValueError("Invalid arguments used for macro {} ({} != {})".format(macro, len(args), len(values)))
+            # append the replacement string
+            newLine += replacement + ' '
+            # if there's nothing left, break
+            if len(values) <= len(args):
+                break
+            # continue with the remainder
+            line = values[-1]
+        return newLine
+
+    def _replace_macros(self, line):
+        # Each pass applies every macro in the line in the order they were
+        # defined, and passes repeat until nothing is left to replace.  The
+        # trie finds which macros are in the line so the rest are skipped,
+        # but it's searched again after each one is applied because its
+        # replacement may have brought in more.
+        while True:
+            present = self._present_macros(line, -1)
+            if len(present) == 0:
+                return line
+            while len(present) > 0:
+                priority, macro = present[0]
+                line = self._replace_macro(line, macro)
+                present = self._present_macros(line, priority)
+
     def _replace_note_vals(self, line):
         if self._tunes is None:
             return line
@@ -227,7 +409,7 @@ class MacroReader():
                     sidx += pos+idx
                 except ValueError:
                     pass
-                speed = get_speed(line[pos+idx+1:sidx], self._tunes)
+                speed = get_speed(line[pos+idx+1:sidx], self._tunes, self._notes)
                 newline += str(float(speed))
                 if sidx is None:
                     break
@@ -259,43 +441,7 @@ class MacroReader():
                 if len(line) > 0:
                     break
 
-            while True:
-                changed = False
-                for macro in self._macros:
-                    newLine = ""
-                    while True:
-                        index = 0
-                        try:
-                            # search for instance of macro name
-                            index = line[index:].index(macro)
-                        except ValueError:
-                            # no macro found, just append the rest
-                            newLine += line
-                            break
-                        changed = True
-                        # append everything up to the macro name to be replaced
-                        newLine += line[:index]
-                        # results in args, remainder
-                        args = line[index+len(macro):].split(maxsplit=len(self._macros[macro][0]))
-                        # make a copy of the replacement string
-                        replacement = str(self._macros[macro][1])
-                        # replace all instances of argument names with the provided
-                        # values
-                        for num, macroarg in enumerate(self._macros[macro][0]):
-                            try:
-                                replacement = replacement.replace(macroarg, args[num])
-                            except IndexError:
-                                raise ValueError("Invalid arguments used for macro {} ({} != {})".format(macro, len(self._macros[macro][0]), len(args)))
-                        # append the replacement string
-                        newLine += replacement + ' '
-                        # if there's nothing left, break
-                        if len(args) <= len(self._macros[macro][0]):
-                            break
-                        # continue with the remainder
-                        line = args[-1]
-                    line = newLine
-                if not changed:
-                    break
+            line = self._replace_macros(line)
             self._line = line.splitlines()
         line = self._line[0]
         if len(self._line) == 1:
@@ -306,7 +452,8 @@ class MacroReader():
         # don't evaluate expressions in macro definitions
         if not self._macrofile and \
            not line.lower().startswith("macro "):
-            line = eval_exprs(line)
+            line, live = _eval_exprs(line)
+            self._live = self._live or live
         if self._trace:
             print("-> {}".format(line))
         return line
@@ -342,6 +489,10 @@ def read_macros(infile):
 
     return macros
 
+def _hash_file(name):
+    with open(name, 'rb') as infile:
+        return hashlib.sha256(infile.read()).hexdigest()
+
 _BUILTIN_MACROS = {
     "SYNTH_OUTPUT_REPLACE": ((), str(cg.SYNTH_OUTPUT_REPLACE)),
     "SYNTH_OUTPUT_ADD": ((), str(cg.SYNTH_OUTPUT_ADD)),
@@ -352,12 +503,19 @@ _BUILTIN_MACROS = {
     "SYNTH_MODE_PHASE_SOURCE": ((), str(cg.SYNTH_MODE_PHASE_SOURCE))
 }
 
+# a file to stream rather than load in full
+@dataclass
+class StreamDesc():
+    filename : str
+
 @dataclass
 class BufferDesc():
     desc : object
     rate : int = 0
     buffer : object = None
     samplesms : float = 0.0
+    # set if the buffer came from an AudioSystem's buffer pool
+    poolKey : object = None
 
 @dataclass
 class SilenceState():
@@ -394,8 +552,52 @@ class FilterState():
     inBuf : cg.Buffer = None
     outBuf : cg.Buffer = None
 
+# state attributes set by the stopped event fields at the end of rows
+_PLAYER_EVENTS = ('reqTimeEvent', 'outBufEvent', 'inBufEvent', 'volBufEvent',
+                  'speedBufEvent', 'phaseBufEvent', 'startBufEvent',
+                  'lengthBufEvent')
+_FILTER_EVENTS = ('reqTimeEvent', 'outBufEvent', 'inBufEvent', 'volBufEvent',
+                  'sliceBufEvent')
+
+def _scale_pos(pos, samplesms):
+    # make -1.0 be the real last sample
+    if pos < 0.0:
+        return (pos * samplesms) + (samplesms - 1.0)
+    return pos * samplesms
+
+def _scale_int_pos(pos, samplesms):
+    if pos < 0:
+        return int((pos * samplesms) + (samplesms - 1))
+    return int(pos * samplesms)
+
+def _player_input_pos(player, pos):
+    # input buffer position is natively float, so don't convert to int
+    player.player.input_pos(_scale_pos(pos, player.inBuf.samplesms))
+
+def _player_output_pos(player, pos):
+    player.player.output_pos(_scale_int_pos(pos, player.outBuf.samplesms))
+
+def _player_speed(player, speed):
+    player.player.speed((player.outBuf.rate / player.inBuf.rate) * speed)
+
+def _filter_input_pos(flt, pos):
+    flt.flt.input_pos(_scale_int_pos(pos, flt.inBuf.samplesms))
+
+def _filter_output_pos(flt, pos):
+    flt.flt.output_pos(_scale_int_pos(pos, flt.outBuf.samplesms))
+
+def _req_time(state, time):
+    state.reqTime = int(time * state.outBuf.samplesms)
+
+# everything which comes from parsing and loading a sequence, traded between
+# the playing and reloaded versions
+_RELOAD_ATTRS = ('_version', '_seqChannels', '_tag', '_buffer', '_channel',
+                 '_include', '_tunes', '_notes', '_maxreq', '_seq', '_rowOps',
+                 '_localChannels')
+
 class AudioSequencer():
-    def __init__(self, infile, buffer=None, extMacros=None, trace=False):
+    def __init__(self, infile, buffer=None, extMacros=None, trace=False,
+                 cachedir=None):
         """
         Create an audio sequence from a file.
 
@@ -403,8 +605,35 @@ class AudioSequencer():
         buffer     an iterator of external Buffer objects.
         extMacros  an iterator of some sort containing tuples of name, a tuple or argument names, and the macro 
         trace      output a lot of status data
+        cachedir   optional directory to store the parsed sequence in, so
+                   later loads of the same unchanged sequence can skip parsing
         """
         self._trace = trace
+        self._loaded = False
+        self._ended = False
+        self._include = list()
+        # what's needed to parse the file again for reloading
+        self._source = (getattr(infile, 'name', None), buffer, extMacros,
+                        cachedir)
+        # a loaded new version to switch to, and the old state switched out
+        # for AudioSystem to unload
+        self._reload = None
+        self._keepPosition = False
+        self._reloadReady = False
+        self._reloadOrder = None
+        self._reloadTime = 0
+        self._reloadOutputs = None
+        self._retired = None
+        self._prof = None
+        cachename = None
+        if cachedir != None:
+            name = infile.name
+            data = infile.read()
+            cachename = AudioSequencer._cache_name(cachedir, data, extMacros)
+            if self._read_cache(cachename, buffer):
+                return
+            infile = io.StringIO(data)
+            infile.name = name
         infile = MacroReader(infile, trace=trace)
         if infile.readline().strip() != "CrustyTracker":
             raise Exception("File isn't a CrustyTracker sequence.")
@@ -456,6 +685,9 @@ class AudioSequencer():
                         except ValueError:
                             # add the string to use as a filename later
                             item = bufferline[0].strip()
+                            if len(bufferline) > 1 and \
+                               bufferline[1].split()[0].lower() == 'stream':
+                                item = StreamDesc(item)
                         self._buffer.append(BufferDesc(item))
                 elif linetype == 'channel':
                     line = line.strip().lower()
@@ -468,6 +700,7 @@ class AudioSequencer():
                     else:
                         raise Exception("Invalid channel type: {}".format(channel))
                 elif linetype == 'include':
+                    self._include.append(line)
                     with open(line, 'r') as macrofile:
                         macrofile = MacroReader(macrofile, trace=trace, macros=infile.macros, macrofile=True)
                         try:
@@ -478,151 +711,236 @@ class AudioSequencer():
                         infile.add_macros(macros)
                 else:
                     raise Exception("Invalid line type {}".format(linetype))
-            self._tune()
+            self._read_tags()
             infile.set_tunes(self._tunes)
             if self._trace:
                 print(infile.macros)
                 print(self._tag)
                 print(self._buffer)
                 print(self._channel)
-            self._maxreq = 2 ** 31
-            try:
-                self._maxreq = int(self._tag['max-request'])
-            except KeyError:
-                pass
-            seqDesc = seq.SequenceDescription()
-            silenceDesc = seqDesc.add_row_description()
-            # 0  output buffer     0x10
-            seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_INT)
-            # 1  start pos         0x08
-            seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_FLOAT)
-            # 2  run length        0x04
-            seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_FLOAT)
-            # 3  stopped requested 0x02
-            seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_ROW, rowDesc=silenceDesc)
-            # 4  stopped outbuffer 0x01
-            seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_ROW, rowDesc=silenceDesc)
-            playerDesc = seqDesc.add_row_description()
-            # 0   input buffer                     0x80000000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 1   input buffer pos                 0x40000000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_FLOAT)
-            # 2   output buffer                    0x20000000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 3   output buffer pos                0x10000000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_FLOAT)
-            # 4   output mode                      0x08000000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 5   volume                           0x04000000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_FLOAT)
-            # 6   volume source                    0x02000000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 7   volume mode                      0x01000000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 8   speed (frequency, /speed, note)  0x00800000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_STR)
-            # 9   speed source                     0x00400000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 10  speed mode                       0x00200000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 11  phase source                     0x00100000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 12  loop length                      0x00080000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 13  loop start                       0x00040000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 14  player mode                      0x00020000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 15  start source                     0x00010000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 16  start values                     0x00008000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 17  start granularity                0x00004000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 18  start mode                       0x00002000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 19  length source                    0x00001000
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 20  length values                    0x00000800
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 21  length granularity               0x00000400
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 22  length mode                      0x00000200
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
-            # 23  run length                       0x00000100
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_FLOAT)
-            # 24  stopped requested                0x00000080 (reason 0)
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
-            # 25  stopped outbuffer                0x00000040 (reason 01)
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
-            # 26  stopped inbuffer                 0x00000020 (reason 02)
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
-            # 27  stopped volbuffer                0x00000010 (reason 04)
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
-            # 28  stopped speedbuffer              0x00000008 (reason 08)
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
-            # 29  stopped phasebuffer              0x00000004 (reason 10)
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
-            # 30  stopped startbuffer              0x00000002 (reason 40)
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
-            # 31  stopped lengthbuffer             0x00000001 (reason 80)
-            seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
-            filterDesc = seqDesc.add_row_description()
-            # 0   input buffer         0x100000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 1   input buffer pos     0x080000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_FLOAT)
-            # 2   output buffer        0x040000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 3   output buffer pos    0x020000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_FLOAT)
-            # 4   filter buffer        0x010000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 5   filter buffer start  0x008000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 6   filter buffer slices 0x004000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 7   slice                0x002000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 8   slice source         0x001000
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 9   filter mode          0x000800
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 10  output mode          0x000400
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 11  volume               0x000200
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_FLOAT)
-            # 12  volume source        0x000100
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 13  volume mode          0x000080
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            # 14  run length           0x000040
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_FLOAT)
-            # 15  stopped requested    0x000020 (reason 0)
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
-            # 16  stopped outbuffer    0x000010 (reason 01)
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
-            # 17  stopped inbuffer     0x000008 (reason 02)
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
-            # 18  stopped volbuffer    0x000004 (reason 04)
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
-            # 19  stopped slicebuffer  0x000002 (reason 20)
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
-            # 20  initial size         0x000001 (only used for initialization)
-            seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
-            for channel in self._channel:
-                if channel == CHANNEL_TYPE_SILENCE:
-                    seqDesc.add_column(silenceDesc)
-                elif channel == CHANNEL_TYPE_PLAYER:
-                    seqDesc.add_column(playerDesc)
-                elif channel == CHANNEL_TYPE_FILTER:
-                    seqDesc.add_column(filterDesc)
-            self._seq = seq.Sequencer(seqDesc, infile, trace=trace)
+            self._seq = seq.Sequencer(self._make_description(), infile, trace=trace)
         except Exception as e:
             print("Exception on line {} in {}.".format(infile.curline, infile.name))
             raise e
-        self._loaded = False
-        self._ended = False
+        # values like random() are rolled again each time the sequence is
+        # parsed, caching them would play the same ones every time
+        if cachename != None and not infile.live:
+            self._write_cache(cachename)
+
+    def _read_tags(self):
+        self._tune()
+        self._maxreq = 2 ** 31
+        try:
+            self._maxreq = int(self._tag['max-request'])
+        except KeyError:
+            pass
+
+    def _make_description(self):
+        seqDesc = seq.SequenceDescription()
+        silenceDesc = seqDesc.add_row_description()
+        # 0  output buffer     0x10
+        seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_INT)
+        # 1  start pos         0x08
+        seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_FLOAT)
+        # 2  run length        0x04
+        seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_FLOAT)
+        # 3  stopped requested 0x02
+        seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_ROW, rowDesc=silenceDesc)
+        # 4  stopped outbuffer 0x01
+        seqDesc.add_field(silenceDesc, seq.FIELD_TYPE_ROW, rowDesc=silenceDesc)
+        playerDesc = seqDesc.add_row_description()
+        # 0   input buffer                     0x80000000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 1   input buffer pos                 0x40000000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_FLOAT)
+        # 2   output buffer                    0x20000000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 3   output buffer pos                0x10000000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_FLOAT)
+        # 4   output mode                      0x08000000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 5   volume                           0x04000000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_FLOAT)
+        # 6   volume source                    0x02000000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 7   volume mode                      0x01000000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 8   speed (frequency, /speed, note)  0x00800000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_STR)
+        # 9   speed source                     0x00400000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 10  speed mode                       0x00200000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 11  phase source                     0x00100000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 12  loop length                      0x00080000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 13  loop start                       0x00040000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 14  player mode                      0x00020000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 15  start source                     0x00010000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 16  start values                     0x00008000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 17  start granularity                0x00004000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 18  start mode                       0x00002000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 19  length source                    0x00001000
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 20  length values                    0x00000800
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 21  length granularity               0x00000400
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 22  length mode                      0x00000200
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_INT)
+        # 23  run length                       0x00000100
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_FLOAT)
+        # 24  stopped requested                0x00000080 (reason 0)
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
+        # 25  stopped outbuffer                0x00000040 (reason 01)
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
+        # 26  stopped inbuffer                 0x00000020 (reason 02)
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
+        # 27  stopped volbuffer                0x00000010 (reason 04)
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
+        # 28  stopped speedbuffer              0x00000008 (reason 08)
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
+        # 29  stopped phasebuffer              0x00000004 (reason 10)
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
+        # 30  stopped startbuffer              0x00000002 (reason 40)
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
+        # 31  stopped lengthbuffer             0x00000001 (reason 80)
+        seqDesc.add_field(playerDesc, seq.FIELD_TYPE_ROW, rowDesc=playerDesc)
+        filterDesc = seqDesc.add_row_description()
+        # 0   input buffer         0x100000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 1   input buffer pos     0x080000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_FLOAT)
+        # 2   output buffer        0x040000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 3   output buffer pos    0x020000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_FLOAT)
+        # 4   filter buffer        0x010000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 5   filter buffer start  0x008000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 6   filter buffer slices 0x004000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 7   slice                0x002000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 8   slice source         0x001000
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 9   filter mode          0x000800
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 10  output mode          0x000400
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 11  volume               0x000200
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_FLOAT)
+        # 12  volume source        0x000100
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 13  volume mode          0x000080
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        # 14  run length           0x000040
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_FLOAT)
+        # 15  stopped requested    0x000020 (reason 0)
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
+        # 16  stopped outbuffer    0x000010 (reason 01)
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
+        # 17  stopped inbuffer     0x000008 (reason 02)
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
+        # 18  stopped volbuffer    0x000004 (reason 04)
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
+        # 19  stopped slicebuffer  0x000002 (reason 20)
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_ROW, rowDesc=filterDesc)
+        # 20  initial size         0x000001 (only used for initialization)
+        seqDesc.add_field(filterDesc, seq.FIELD_TYPE_INT)
+        for channel in self._channel:
+            if channel == CHANNEL_TYPE_SILENCE:
+                seqDesc.add_column(silenceDesc)
+            elif channel == CHANNEL_TYPE_PLAYER:
+                seqDesc.add_column(playerDesc)
+            elif channel == CHANNEL_TYPE_FILTER:
+                seqDesc.add_column(filterDesc)
+        return seqDesc
+
+    def _cache_name(cachedir, data, extMacros):
+        h = hashlib.sha256()
+        h.update(str(SEQUENCE_CACHE_VERSION).encode('utf-8'))
+        h.update(data.encode('utf-8'))
+        if extMacros:
+            for name in sorted(extMacros.keys()):
+                h.update(repr((name, extMacros[name])).encode('utf-8'))
+        return os.path.join(cachedir, "{}.crustycache".format(h.hexdigest()))
+
+    def _read_cache(self, cachename, buffer):
+        try:
+            with open(cachename, 'rb') as cachefile:
+                cache = pickle.load(cachefile)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print("WARNING: Couldn't read sequence cache {}: {}".format(cachename, e))
+            return False
+        if cache['version'] != SEQUENCE_CACHE_VERSION:
+            return False
+        # included files aren't part of the hash so make sure they're the
+        # same as when the cache was written
+        for name, filehash in cache['include']:
+            try:
+                if _hash_file(name) != filehash:
+                    return False
+            except OSError:
+                return False
+
+        self._version = 2
+        self._seqChannels = cache['seqChannels']
+        self._tag = cache['tag']
+        self._channel = cache['channel']
+        self._include = [item[0] for item in cache['include']]
+        self._buffer = list()
+        for external, desc in cache['buffer']:
+            if external:
+                if not isinstance(buffer[desc], cg.Buffer):
+                    raise Exception("Buffers must be external Buffers.")
+                self._buffer.append(BufferDesc(buffer[desc]))
+            else:
+                self._buffer.append(BufferDesc(desc))
+        self._read_tags()
+        self._seq = seq.Sequencer(self._make_description(), None,
+                                  trace=self._trace,
+                                  compiled=cache['compiled'])
+        if self._trace:
+            print("Loaded sequence from cache {}.".format(cachename))
+        return True
+
+    def _write_cache(self, cachename):
+        buffers = list()
+        extBuf = 0
+        for buffer in self._buffer:
+            if isinstance(buffer.desc, cg.Buffer):
+                buffers.append((True, extBuf))
+                extBuf += 1
+            else:
+                buffers.append((False, buffer.desc))
+        try:
+            cache = {'version': SEQUENCE_CACHE_VERSION,
+                     'include': [(name, _hash_file(name)) for name in self._include],
+                     'seqChannels': self._seqChannels,
+                     'tag': self._tag,
+                     'buffer': buffers,
+                     'channel': self._channel,
+                     'compiled': self._seq.compiled}
+            os.makedirs(os.path.dirname(cachename), exist_ok=True)
+            # write to a temporary file then move it in to place so a
+            # partially written cache is never seen
+            tmpname = "{}.{}.tmp".format(cachename, os.getpid())
+            with open(tmpname, 'wb') as cachefile:
+                pickle.dump(cache, cachefile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, cachename)
+        except OSError as e:
+            print("WARNING: Couldn't write sequence cache {}: {}".format(cachename, e))
 
     @property
     def ended(self):
@@ -644,6 +962,7 @@ class AudioSequencer():
         except KeyError:
             tunes = [2 ** (x / 12) for x in range(12)]
             self._tunes = AudioSequencer._rearrange_tunings(tunes)
+            self._notes = get_note_table(self._tunes)
             return
 
         if len(tuning) == 1:
@@ -654,6 +973,7 @@ class AudioSequencer():
             self._tunes = [float(x) for x in tuning]
         else:
             raise ValueError("'tuning' tag must be some detune or all 12 note detunings.")
+        self._notes = get_note_table(self._tunes)
 
     def _update_silence(self, silence, status):
         if status[0] != None:
@@ -683,281 +1003,267 @@ class AudioSequencer():
             else:
                 silence.outBufEvent = self._seq.get_row(status[4])
 
-    def _update_player(self, player, status):
-        p = player.player
+    def _get_buffer(self, buf):
+        if buf >= self._seqChannels:
+            buf -= self._seqChannels
+            buf += self._channels
+        try:
+            return self._buffer[buf]
+        except IndexError:
+            raise IndexError("Invalid buffer number {}.".format(buf))
+
+    def _get_event(self, row):
+        if row < 0:
+            return None
+        return self._seq.get_row(row)
+
+    def _compile_player_row(self, status):
+        # Resolve a row in to only the changes it makes, as state attributes
+        # to set, parameters to set all at once with update(), then functions
+        # for things which depend on buffers the row doesn't set itself,
+        # applied in that order.
+        attrs = list()
+        params = list()
+        scaled = list()
+        inBuf = None
+        outBuf = None
         if status[0] != None:
-            buf = status[0]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            player.inBuf = b
-            p.input(b.buffer)
+            inBuf = self._get_buffer(status[0])
+            attrs.append(('inBuf', inBuf))
+            params.append((cg.SYNTH_PLAYER_INPUT_BUFFER, inBuf.buffer))
         if status[1] != None:
-            pos = status[1]
-            # make -1.0 be the real last sample
-            # input buffer position is natively float, so don't convert to int
-            if pos < 0.0:
-                pos = (pos * player.inBuf.samplesms) + (player.inBuf.samplesms - 1.0)
+            if inBuf != None:
+                params.append((cg.SYNTH_PLAYER_INPUT_BUFFER_POS,
+                               _scale_pos(status[1], inBuf.samplesms)))
             else:
-                pos = pos * player.inBuf.samplesms
-            p.input_pos(pos)
+                scaled.append((_player_input_pos, status[1]))
         if status[2] != None:
-            buf = status[2]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            player.outBuf = b
-            p.output(b.buffer)
+            outBuf = self._get_buffer(status[2])
+            attrs.append(('outBuf', outBuf))
+            params.append((cg.SYNTH_PLAYER_OUTPUT_BUFFER, outBuf.buffer))
         if status[3] != None:
-            pos = status[3]
-            if pos < 0:
-                pos = int((pos * player.outBuf.samplesms) + (player.outBuf.samplesms - 1))
+            if outBuf != None:
+                params.append((cg.SYNTH_PLAYER_OUTPUT_BUFFER_POS,
+                               _scale_int_pos(status[3], outBuf.samplesms)))
             else:
-                pos = int(pos * player.outBuf.samplesms)
-            p.output_pos(pos)
+                scaled.append((_player_output_pos, status[3]))
         if status[4] != None:
-            p.output_mode(status[4])
+            params.append((cg.SYNTH_PLAYER_OUTPUT_MODE, status[4]))
         if status[5] != None:
-            p.volume(status[5])
+            params.append((cg.SYNTH_PLAYER_VOLUME, status[5]))
         if status[6] != None:
-            buf = status[6]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            p.volume_source(b.buffer)
+            params.append((cg.SYNTH_PLAYER_VOLUME_SOURCE,
+                           self._get_buffer(status[6]).buffer))
         if status[7] != None:
-            p.volume_mode(status[7])
+            params.append((cg.SYNTH_PLAYER_VOLUME_MODE, status[7]))
         if status[8] != None:
-            p.speed((player.outBuf.rate / player.inBuf.rate) * get_speed(status[8], self._tunes))
+            speed = get_speed(status[8], self._tunes, self._notes)
+            if inBuf != None and outBuf != None:
+                params.append((cg.SYNTH_PLAYER_SPEED,
+                               (outBuf.rate / inBuf.rate) * speed))
+            else:
+                scaled.append((_player_speed, speed))
         if status[9] != None:
-            buf = status[9]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            p.speed_source(b.buffer)
+            params.append((cg.SYNTH_PLAYER_SPEED_SOURCE,
+                           self._get_buffer(status[9]).buffer))
         if status[10] != None:
-            p.speed_mode(status[10])
+            params.append((cg.SYNTH_PLAYER_SPEED_MODE, status[10]))
         if status[11] != None:
-            buf = status[11]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            p.phase_source(b.buffer)
+            params.append((cg.SYNTH_PLAYER_PHASE_SOURCE,
+                           self._get_buffer(status[11]).buffer))
         if status[12] != None:
             # loop pointers should be relative to the sample to be most useful
-            p.loop_length(status[12])
+            params.append((cg.SYNTH_PLAYER_LOOP_LENGTH, status[12]))
         if status[13] != None:
-            p.loop_start(status[13])
+            params.append((cg.SYNTH_PLAYER_LOOP_START, status[13]))
         if status[14] != None:
-            p.mode(status[14])
+            params.append((cg.SYNTH_PLAYER_MODE, status[14]))
         if status[15] != None:
-            buf = status[15]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            p.start_source(b.buffer)
+            params.append((cg.SYNTH_PLAYER_START_SOURCE,
+                           self._get_buffer(status[15]).buffer))
         if status[16] != None:
-            p.start_values(status[16])
+            params.append((cg.SYNTH_PLAYER_START_VALUES, status[16]))
         if status[17] != None:
-            p.start_granularity(status[17])
+            params.append((cg.SYNTH_PLAYER_START_GRANULARITY, status[17]))
         if status[18] != None:
-            p.start_mode(status[18])
+            params.append((cg.SYNTH_PLAYER_START_MODE, status[18]))
         if status[19] != None:
-            buf = status[19]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            p.length_source(b.buffer)
+            params.append((cg.SYNTH_PLAYER_LENGTH_SOURCE,
+                           self._get_buffer(status[19]).buffer))
         if status[20] != None:
-            p.length_values(status[20])
+            params.append((cg.SYNTH_PLAYER_LENGTH_VALUES, status[20]))
         if status[21] != None:
-            p.length_granularity(status[21])
+            params.append((cg.SYNTH_PLAYER_LENGTH_GRANULARITY, status[21]))
         if status[22] != None:
-            p.length_mode(status[22])
+            params.append((cg.SYNTH_PLAYER_LENGTH_MODE, status[22]))
         if status[23] != None:
-            player.reqTime = int(status[23] * player.outBuf.samplesms)
-        if status[24] != None:
-            if status[24] < 0:
-                player.reqTimeEvent = None
-            else:
-                player.reqTimeEvent = self._seq.get_row(status[24])
-        if status[25] != None:
-            if status[25] < 0:
-                player.outBufEvent = None
-            else:
-                player.outBufEvent = self._seq.get_row(status[25])
-        if status[26] != None:
-            if status[26] < 0:
-                player.inBufEvent = None
-            else:
-                player.inBufEvent = self._seq.get_row(status[26])
-        if status[27] != None:
-            if status[27] < 0:
-                player.volBufEvent = None
-            else:
-                player.volBufEvent = self._seq.get_row(status[27])
-        if status[28] != None:
-            if status[28] < 0:
-                player.speedBufEvent = None
-            else:
-                player.speedBufEvent = self._seq.get_row(status[28])
-        if status[29] != None:
-            if status[29] < 0:
-                player.phaseBufEvent = None
+            if outBuf != None:
+                attrs.append(('reqTime', int(status[23] * outBuf.samplesms)))
             else:
-                player.phaseBufEvent = self._seq.get_row(status[29])
-        if status[30] != None:
-            if status[30] < 0:
-                player.startBufEvent = None
-            else:
-                player.startBufEvent = self._seq.get_row(status[30])
-        if status[31] != None:
-            if status[31] < 0:
-                player.lengthBufEvent = None
-            else:
-                player.lengthBufEvent = self._seq.get_row(status[31])
-
-    def _update_filter(self, flt, status):
-        f = flt.flt
+                scaled.append((_req_time, status[23]))
+        for num, name in enumerate(_PLAYER_EVENTS):
+            if status[24 + num] != None:
+                attrs.append((name, self._get_event(status[24 + num])))
+        return tuple(attrs), tuple(params), tuple(scaled)
+
+    def _compile_filter_row(self, status):
+        # see _compile_player_row()
+        attrs = list()
+        params = list()
+        scaled = list()
+        inBuf = None
+        outBuf = None
         if status[0] != None:
-            buf = status[0]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            flt.inBuf = b
-            f.input(b.buffer)
+            inBuf = self._get_buffer(status[0])
+            attrs.append(('inBuf', inBuf))
+            params.append((cg.SYNTH_FILTER_INPUT_BUFFER, inBuf.buffer))
         if status[1] != None:
-            pos = status[1]
-            if pos < 0:
-                pos = int((pos * flt.inBuf.samplesms) + (flt.inBuf.samplesms - 1))
+            if inBuf != None:
+                params.append((cg.SYNTH_FILTER_INPUT_BUFFER_POS,
+                               _scale_int_pos(status[1], inBuf.samplesms)))
             else:
-                pos = int(pos * flt.inBuf.samplesms)
-            f.input_pos(pos)
+                scaled.append((_filter_input_pos, status[1]))
         if status[2] != None:
-            buf = status[2]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            flt.outBuf = b
-            f.output(b.buffer)
+            outBuf = self._get_buffer(status[2])
+            attrs.append(('outBuf', outBuf))
+            params.append((cg.SYNTH_FILTER_OUTPUT_BUFFER, outBuf.buffer))
         if status[3] != None:
-            pos = status[3]
-            if pos < 0:
-                pos = int((pos * flt.outBuf.samplesms) + (flt.outBuf.samplesms - 1))
+            if outBuf != None:
+                params.append((cg.SYNTH_FILTER_OUTPUT_BUFFER_POS,
+                               _scale_int_pos(status[3], outBuf.samplesms)))
             else:
-                pos = int(pos * flt.outBuf.samplesms)
-            f.output_pos(pos)
+                scaled.append((_filter_output_pos, status[3]))
         if status[4] != None:
-            buf = status[4]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            f.filter(b.buffer)
+            params.append((cg.SYNTH_FILTER_BUFFER,
+                           self._get_buffer(status[4]).buffer))
         if status[5] != None:
-            f.filter_start(status[5])
+            params.append((cg.SYNTH_FILTER_BUFFER_START, status[5]))
         if status[6] != None:
-            f.slices(status[6])
+            params.append((cg.SYNTH_FILTER_SLICES, status[6]))
         if status[7] != None:
-            f.slice(status[7])
+            params.append((cg.SYNTH_FILTER_SLICE, status[7]))
         if status[8] != None:
-            buf = status[8]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            f.slice_source(b.buffer)
+            params.append((cg.SYNTH_FILTER_SLICE_SOURCE,
+                           self._get_buffer(status[8]).buffer))
         if status[9] != None:
-            f.mode(status[9])
+            params.append((cg.SYNTH_FILTER_MODE, status[9]))
         if status[10] != None:
-            f.output_mode(status[10])
+            params.append((cg.SYNTH_FILTER_OUTPUT_MODE, status[10]))
         if status[11] != None:
-            f.volume(status[11])
+            params.append((cg.SYNTH_FILTER_VOLUME, status[11]))
         if status[12] != None:
-            buf = status[12]
-            if buf >= self._seqChannels:
-                buf -= self._seqChannels
-                buf += self._channels
-            try:
-                b = self._buffer[buf]
-            except IndexError:
-                raise IndexError("Invalid buffer number {}.".format(buf))
-            f.volume_source(b.buffer)
+            params.append((cg.SYNTH_FILTER_VOLUME_SOURCE,
+                           self._get_buffer(status[12]).buffer))
         if status[13] != None:
-            f.volume_mode(status[13])
+            params.append((cg.SYNTH_FILTER_VOLUME_MODE, status[13]))
         if status[14] != None:
-            flt.reqTime = int(status[14] * flt.outBuf.samplesms)
-        if status[15] != None:
-            if status[15] < 0:
-                flt.reqTimeEvent = None
-            else:
-                flt.reqTimeEvent = self._seq.get_row(status[15])
-        if status[16] != None:
-            if status[16] < 0:
-                flt.outBufEvent = None
-            else:
-                flt.outBufEvent = self._seq.get_row(status[16])
-        if status[17] != None:
-            if status[17] < 0:
-                flt.inBufEvent = None
+            if outBuf != None:
+                attrs.append(('reqTime', int(status[14] * outBuf.samplesms)))
             else:
-                flt.inBufEvent = self._seq.get_row(status[17])
-        if status[18] != None:
-            if status[18] < 0:
-                flt.volBufEvent = None
-            else:
-                flt.volBufEvent = self._seq.get_row(status[18])
-        if status[19] != None:
-            if status[19] < 0:
-                flt.sliceBufEvent = None
-            else:
-                flt.sliceBufEvent = self._seq.get_row(status[19])
+                scaled.append((_req_time, status[14]))
+        for num, name in enumerate(_FILTER_EVENTS):
+            if status[15 + num] != None:
+                attrs.append((name, self._get_event(status[15 + num])))
+        return tuple(attrs), tuple(params), tuple(scaled)
+
+    def _compile_rows(self):
+        # compile every row up front so the audio callback only has to apply
+        # them.  Rows which can't be compiled are left to raise their errors
+        # if they're ever actually applied.
+        self._rowOps = dict()
+        for desc, compile_row in ((_ROW_DESC_PLAYER, self._compile_player_row),
+                                  (_ROW_DESC_FILTER, self._compile_filter_row)):
+            for num in self._seq.get_rows(desc):
+                row = self._seq.get_row(num)
+                try:
+                    self._rowOps[id(row)] = compile_row(row)
+                except Exception:
+                    pass
+
+    def _update_player(self, player, status):
+        try:
+            attrs, params, scaled = self._rowOps[id(status)]
+        except KeyError:
+            attrs, params, scaled = self._compile_player_row(status)
+        for name, val in attrs:
+            setattr(player, name, val)
+        if len(params) > 0:
+            player.player.update(params)
+        for func, val in scaled:
+            func(player, val)
+
+    def _update_filter(self, flt, status):
+        try:
+            attrs, params, scaled = self._rowOps[id(status)]
+        except KeyError:
+            attrs, params, scaled = self._compile_filter_row(status)
+        for name, val in attrs:
+            setattr(flt, name, val)
+        if len(params) > 0:
+            flt.flt.update(params)
+        for func, val in scaled:
+            func(flt, val)
+
+    def _channel_rows(self, channel, events):
+        # every row a channel is given, along with the rows given when its
+        # events happen
+        rows = dict()
+        pending = self._seq.channel_rows(channel)
+        while len(pending) > 0:
+            row = pending.pop()
+            if id(row) in rows:
+                continue
+            rows[id(row)] = row
+            for field in events:
+                if row[field] != None and row[field] >= 0:
+                    pending.append(self._seq.get_row(row[field]))
+        return rows.values()
+
+    def _load_buffers_fully(self):
+        # Streamed buffers are loaded in full and native format buffers are
+        # converted to float the first time they're used some way which needs
+        # it, so find those uses now, rather than have it happen when a row is
+        # applied in the audio callback.  A player which ever loops or follows
+        # a phase source might do so with any input it's given.
+        needFloat = dict()
+        for num, channel in enumerate(self._channel):
+            if channel == CHANNEL_TYPE_SILENCE:
+                for row in self._channel_rows(num, (3, 4)):
+                    if row[0] != None:
+                        needFloat[row[0]] = True
+            elif channel == CHANNEL_TYPE_PLAYER:
+                rows = self._channel_rows(num, range(24, 24 + len(_PLAYER_EVENTS)))
+                once = True
+                for row in rows:
+                    if row[14] != None and row[14] != cg.SYNTH_MODE_ONCE:
+                        once = False
+                for row in rows:
+                    if row[0] != None and not once:
+                        needFloat[row[0]] = needFloat.get(row[0], False)
+                    # output, volume, speed, phase, start and length
+                    for field in (2, 6, 9, 11, 15, 19):
+                        if row[field] != None:
+                            needFloat[row[field]] = True
+            elif channel == CHANNEL_TYPE_FILTER:
+                rows = self._channel_rows(num, range(15, 15 + len(_FILTER_EVENTS)))
+                for row in rows:
+                    # input, output, filter, slice and volume
+                    for field in (0, 2, 4, 8, 12):
+                        if row[field] != None:
+                            needFloat[row[field]] = True
+        for buf, needed in needFloat.items():
+            try:
+                buffer = self._get_buffer(buf)
+            except IndexError:
+                # left to fail if the row is ever applied, like _compile_rows()
+                continue
+            buffer.buffer.load_fully(not needed)
 
-    def _load(self, s):
+    def _load(self, s, pool=None):
         if self._loaded:
             raise Exception("Already loaded")
+        self._s = s
+        self._pool = pool
         self._samplesms = s.rate() / 1000.0
         channels = s.channels()
         self._channels = len(channels)
@@ -974,10 +1280,22 @@ class AudioSequencer():
                 # silent buffer
                 length = int(buffer.desc * self._samplesms)
                 buffer.buffer = s.buffer(cg.SYNTH_TYPE_F32, None, length, "Silence {}".format(num))
-            elif isinstance(buffer.desc, str):
-                # filename
-                b = s.buffer(buffer.desc, None)
-                buffer.buffer = b
+            elif isinstance(buffer.desc, (str, StreamDesc)):
+                # filename, shared with any other sequences using the same
+                # file if there's a pool to get it from
+                filename = buffer.desc
+                stream = False
+                if isinstance(buffer.desc, StreamDesc):
+                    filename = buffer.desc.filename
+                    stream = True
+                if pool != None:
+                    try:
+                        buffer.buffer, buffer.poolKey = pool.acquire(filename, stream)
+                    except Exception as e:
+                        self._release_buffers()
+                        raise e
+                else:
+                    buffer.buffer = s.buffer(filename, None, stream)
             elif isinstance(buffer.desc, cg.Buffer):
                 # external buffer
                 buffer.buffer = buffer.desc
@@ -985,6 +1303,14 @@ class AudioSequencer():
             buffer.samplesms = buffer.rate / 1000.0
         if self._trace:
             print(self._buffer)
+        try:
+            self._load_buffers_fully()
+        except Exception as e:
+            self._release_buffers()
+            raise e
+        self._compile_rows()
+        # run the sequence in samples so lines start exactly where they should
+        self._seq.set_time_scale(s.rate(), 1000)
         initial = self._seq.advance(0)[1]
         self._localChannels = list()
         for num, channel in enumerate(self._channel):
@@ -1021,6 +1347,7 @@ class AudioSequencer():
                     self._localChannels.append(flt)
             except Exception as e:
                 print("Error when loading channel {}.".format(num + 1))
+                self._release_buffers()
                 raise e
         if self._trace:
             print(self._localChannels)
@@ -1032,12 +1359,24 @@ class AudioSequencer():
     def _unload(self):
         if not self._loaded:
             raise Exception("Already not loaded")
+        if self._reload != None:
+            self._reload._unload()
+            self._reload = None
+        self._unload_retired()
         del self._localChannels
+        del self._rowOps
         self._buffer = self._buffer[self._channels:]
+        self._release_buffers()
         for buffer in self._buffer:
             buffer.buffer = None
         self._loaded = False
 
+    def _release_buffers(self):
+        for buffer in self._buffer:
+            if buffer.poolKey != None:
+                self._pool.release(buffer.poolKey)
+                buffer.poolKey = None
+
     def internal(self, bufnum):
         """
         Get a pybuffer representation of a buffer from one of this sequence's buffers.
@@ -1050,13 +1389,46 @@ class AudioSequencer():
     def reset(self):
         """
         Reset everything, frees all buffers and reloads them fresh, so they're
-        in a known state.
+        in a known state.  See warm_reset() for restarting while playing.
         """
         self._unload()
         self._seq.reset()
-        self._load()
+        self._load(self._s, self._pool)
+        self._ended = False
+
+    def warm_reset(self):
+        """
+        Restart the sequence from the beginning without freeing or loading
+        anything.  Silence buffers are silenced in place and the initial rows
+        are applied again to the existing players and filters, which leaves
+        them as they were just after loading.  Buffers loaded from files and
+        external buffers are left alone, so like fast_reset(), anything the
+        sequence wrote in to them stays.
+        """
+        if not self._loaded:
+            raise Exception("sequence not loaded, so there's nothing to reset.")
+        self._rewind()
+        self._outpos = 0
         self._ended = False
 
+    def _rewind(self):
+        # back to as it was just after loading, apart from output positions
+        self._seq.reset()
+        for buffer in self._buffer:
+            if isinstance(buffer.desc, int):
+                buffer.buffer.silence(0, buffer.buffer.size())
+        # initial rows set every field, so nothing from before survives
+        initial = self._seq.advance(0)[1]
+        for num, channel in enumerate(self._localChannels):
+            if isinstance(channel, SilenceState):
+                self._update_silence(channel, initial[num])
+            elif isinstance(channel, PlayerState):
+                self._update_player(channel, initial[num])
+            elif isinstance(channel, FilterState):
+                channel.flt.reset()
+                self._update_filter(channel, initial[num])
+            channel.reqTime = 0
+
     def fast_reset(self):
         """
         Faster reset that just resets the sequence, and should have no
@@ -1066,6 +1438,30 @@ class AudioSequencer():
         self._outpos = 0
         self._ended = False
 
+    def _profile(self, prof):
+        """
+        Start accumulating time spent advancing the sequence, applying rows and
+        running in to a _SequenceProfile, or stop if prof is None.  Timing is
+        done by shadowing the methods on this instance so there's no cost when
+        not profiling.
+        """
+        for name in ('run', '_update_player', '_update_filter'):
+            self.__dict__.pop(name, None)
+        # a version waiting to be switched to is profiled the same
+        seqs = [self._seq]
+        if self._reload != None:
+            seqs.append(self._reload._seq)
+        for sequence in seqs:
+            sequence.__dict__.pop('advance', None)
+        self._prof = prof
+        if prof == None:
+            return
+        for sequence in seqs:
+            sequence.advance = prof.wrap_advance(sequence.advance)
+        self._update_player = prof.wrap_rows(self._update_player)
+        self._update_filter = prof.wrap_rows(self._update_filter)
+        self.run = prof.wrap_run(self.run)
+
     def _advance_player_pos(self, player, time, needed):
         if player.outBuf.desc == None and self._outpos < needed:
             player.player.output_pos(self._outpos)
@@ -1299,20 +1695,28 @@ class AudioSequencer():
         Run the sequence for needed samples.
         """
         if self._ended:
-            return
+            if self._reload == None or not self._reloadReady or \
+               self._reloadOrder != None:
+                return
+            # nowhere to keep playing from, so start the new version over
+            self._switch_reload(None)
 
         if needed <= 0:
             raise ValueError("needed must be a positive, nonzero value")
 
         origneeded = needed
-        while needed > self._samplesms:
-            get = min(needed, int(self._maxreq * self._samplesms))
+        maxreq = max(1, int(self._maxreq * self._samplesms))
+        while needed > 0:
+            if self._reload != None and self._reloadReady:
+                order = self._seq.order_start()
+                if order != None and \
+                   (order == self._reloadOrder or not self._keepPosition):
+                    self._switch_reload(order)
             try:
-                time, line = self._seq.advance(int(get / self._samplesms))
+                time, line = self._seq.advance(min(needed, maxreq))
             except seq.SequenceEnded:
                 self._ended = True
                 break
-            time = int(time * self._samplesms)
             self._run_channels(time, line, needed)
             needed -= time
 
@@ -1326,15 +1730,325 @@ class AudioSequencer():
 
     def _reset_output_positions(self):
         # reset output channel positions to 0
+        self._set_output_positions(0)
+
+    def _set_output_positions(self, pos):
         for channel in self._localChannels:
             if isinstance(channel, PlayerState):
                 if channel.outBuf.desc == None:
-                    channel.player.output_pos(0)
+                    channel.player.output_pos(pos)
             elif isinstance(channel, FilterState):
                 if channel.outBuf.desc == None:
-                    channel.player.output_pos(0)
-        self._outpos = 0
+                    channel.flt.output_pos(pos)
+        self._outpos = pos
 
+    def _reparse(self):
+        """
+        Parse the sequence's file again.
+
+        returns a new, unloaded AudioSequencer
+        """
+        filename, buffer, extMacros, cachedir = self._source
+        with open(filename, "r") as infile:
+            return AudioSequencer(infile, buffer, extMacros, trace=self._trace,
+                                  cachedir=cachedir)
+
+    def _hand_over(self, new, s, pool):
+        """
+        Load a reparsed version of the sequence and leave it for run() to
+        switch to at the start of a pattern, replacing any version already
+        waiting.  File buffers come from the pool so unchanged files aren't
+        loaded again.  If the sequence order is the same, its output goes to
+        buffers of its own until _catch_up_reload() has it where the playing
+        version will be.
+        """
+        new._load(s, pool)
+        keepPosition = new._seq.order == self._seq.order
+        outputs = None
+        if keepPosition:
+            size = s.channels()[0].size()
+            outputs = [s.buffer(cg.SYNTH_TYPE_F32, None, size,
+                                "Reload Output {}".format(num))
+                       for num in range(new._channels)]
+            try:
+                new._direct_outputs(outputs)
+            except Exception as e:
+                new._unload()
+                raise e
+        if self._reload != None:
+            self._reload._unload()
+        if self._prof != None:
+            new._seq.advance = self._prof.wrap_advance(new._seq.advance)
+        self._keepPosition = keepPosition
+        self._reloadOutputs = outputs
+        self._reloadTime = 0
+        # starting over from the beginning, it's ready as loaded
+        self._reloadReady = not keepPosition
+        self._reloadOrder = None
+        self._reload = new
+
+    def _direct_outputs(self, buffers):
+        # point everything that goes to the output channels at other buffers
+        # of the same size and rate
+        for desc, buffer in zip(self._buffer, buffers):
+            desc.buffer = buffer
+        self._compile_rows()
+        for channel in self._localChannels:
+            if isinstance(channel, PlayerState):
+                if channel.outBuf.desc == None:
+                    channel.player.update(((cg.SYNTH_PLAYER_OUTPUT_BUFFER,
+                                            channel.outBuf.buffer),))
+            elif isinstance(channel, FilterState):
+                if channel.outBuf.desc == None:
+                    channel.flt.update(((cg.SYNTH_FILTER_OUTPUT_BUFFER,
+                                         channel.outBuf.buffer),))
+
+    def _catch_up_reload(self, budget):
+        """
+        Play the version waiting to be switched to toward the start of the next
+        pattern the playing version gets to, for up to budget seconds.  It's
+        played from the beginning with its output thrown away, so when they're
+        switched, everything like envelopes, oscillators and filters is just as
+        the playing version left it.  If the playing version was restarted or
+        there's no pattern left to start, it's started over.
+        """
+        new = self._reload
+        order = self._seq.next_order_start()
+        target = 0
+        if order != None:
+            target = new._seq.order_time(order)
+        if self._reloadReady:
+            if order == self._reloadOrder:
+                return
+            new._direct_outputs(self._reloadOutputs)
+            self._reloadReady = False
+        if self._reloadTime > target:
+            new._rewind()
+            self._reloadTime = 0
+        size = self._reloadOutputs[0].size()
+        # none of this is part of an audio callback, so keep it out of the
+        # profile
+        advance = new._seq.__dict__.pop('advance', None)
+        try:
+            start = time.perf_counter()
+            while self._reloadTime < target:
+                if time.perf_counter() - start >= budget:
+                    return
+                new._reset_output_positions()
+                self._reloadTime += new.run(min(target - self._reloadTime,
+                                                size))
+        finally:
+            if advance != None:
+                new._seq.advance = advance
+        new._direct_outputs(self._s.channels())
+        self._reloadOrder = order
+        self._reloadReady = True
+
+    def _switch_reload(self, order):
+        # Called from the audio callback, so the new version's state only
+        # trades places with the current state, which is left for AudioSystem
+        # to unload.  If the sequence order is the same, the new version has
+        # already been played up to the pattern about to start, otherwise it
+        # starts from the beginning.
+        new = self._reload
+        for name in _RELOAD_ATTRS:
+            current = getattr(self, name)
+            setattr(self, name, getattr(new, name))
+            setattr(new, name, current)
+        self._set_output_positions(self._outpos)
+        self._reload = None
+        self._retired = new
+        self._ended = False
+
+    def _unload_retired(self):
+        if self._retired != None:
+            self._retired._unload()
+            self._retired = None
+        # what a reloaded version played in to while catching up isn't needed
+        # once it's been switched to
+        if self._reload == None:
+            self._reloadOutputs = None
+
+
+# longest each frame() spends playing a reloaded sequence to catch up with the
+# version playing, in seconds
+RELOAD_CATCH_UP_TIME = 0.004
+# how many audio callbacks the profiler keeps timings for
+PROFILE_WINDOW = 1024
+# how many of the most recent underrun times the profiler keeps
+PROFILE_UNDERRUNS = 64
+
+_time_ns = time.perf_counter_ns
+
+def _summarize(samples):
+    """
+    Summarize nanosecond timings as a dict of microseconds, or None if there
+    are none.
+    """
+    if len(samples) == 0:
+        return None
+    s = sorted(samples)
+    return {'mean': sum(s) / len(s) / 1000.0,
+            'p50': s[len(s) // 2] / 1000.0,
+            'p90': s[int(len(s) * 0.9)] / 1000.0,
+            'p99': s[int(len(s) * 0.99)] / 1000.0,
+            'max': s[-1] / 1000.0}
+
+class _SequenceProfile():
+    """
+    Time spent by one sequence, accumulated over an audio callback then kept
+    for the last window callbacks it ran in.
+    """
+    def __init__(self, window):
+        self.advance = 0
+        self.rows = 0
+        self.run = 0
+        self.advances = deque(maxlen=window)
+        self.rowTimes = deque(maxlen=window)
+        self.runs = deque(maxlen=window)
+
+    def wrap_advance(self, func):
+        def advance(reqtime):
+            start = _time_ns()
+            try:
+                return func(reqtime)
+            finally:
+                self.advance += _time_ns() - start
+        return advance
+
+    def wrap_rows(self, func):
+        def update(channel, row):
+            start = _time_ns()
+            try:
+                func(channel, row)
+            finally:
+                self.rows += _time_ns() - start
+        return update
+
+    def wrap_run(self, func):
+        def run(needed):
+            start = _time_ns()
+            try:
+                return func(needed)
+            finally:
+                self.run += _time_ns() - start
+        return run
+
+    def callback(self):
+        if self.run == 0:
+            # wasn't run this callback
+            return
+        self.advances.append(self.advance)
+        self.rowTimes.append(self.rows)
+        self.runs.append(self.run)
+        self.advance = 0
+        self.rows = 0
+        self.run = 0
+
+    def stats(self, seq):
+        return {'sequence': seq,
+                'advance': _summarize(self.advances),
+                'rows': _summarize(self.rowTimes),
+                'synth': _summarize([run - adv - rows for run, adv, rows in
+                                     zip(self.runs, self.advances,
+                                         self.rowTimes)]),
+                'run': _summarize(self.runs)}
+
+class _CallbackProfile():
+    """
+    Timings for the AudioSystem frame callback as a whole.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.callbacks = 0
+        self.idle = 0
+        self.totals = deque(maxlen=window)
+        self.gc = 0
+        self.gcTimes = deque(maxlen=window)
+        self._gcStart = 0
+        self.underruns = deque(maxlen=PROFILE_UNDERRUNS)
+        self.sequences = dict()
+
+    def gc_cb(self, phase, info):
+        if phase == 'start':
+            self._gcStart = _time_ns()
+        else:
+            self.gc += _time_ns() - self._gcStart
+
+    def wrap_latency(self, func):
+        def update(fragments, underrun, needed, interval, elapsed):
+            if underrun:
+                self.underruns.append(time.monotonic())
+            return func(fragments, underrun, needed, interval, elapsed)
+        return update
+
+    def callback(self, total, needed):
+        if needed <= 0:
+            # nothing was generated, so don't let these drown out the
+            # callbacks which did work
+            self.idle += 1
+        else:
+            self.callbacks += 1
+            self.totals.append(total)
+            self.gcTimes.append(self.gc)
+        self.gc = 0
+        for prof in self.sequences.values():
+            prof.callback()
+
+class _BufferPool():
+    """
+    Buffers loaded from files, shared between every sequence using the same
+    file.  Files are identified by their absolute path and modification time,
+    so a file changed on disk is loaded fresh, and buffers are dropped once
+    the last sequence using them is unloaded.  Streamed and fully loaded
+    buffers of the same file are kept apart.
+    """
+    def __init__(self, s):
+        self._s = s
+        # key: [buffer, references]
+        self._buffers = dict()
+
+    def _key(self, filename, stream):
+        filename = os.path.abspath(filename)
+        return filename, os.stat(filename).st_mtime_ns, stream
+
+    def acquire(self, filename, stream=False):
+        """
+        Get the buffer for a file, loading it if no sequence has it yet.
+
+        stream  True to stream the file instead of loading it in full
+        returns the buffer and the key to release() it with
+        """
+        key = self._key(filename, stream)
+        try:
+            entry = self._buffers[key]
+        except KeyError:
+            entry = [self._s.buffer(filename, None, stream), 0]
+            self._buffers[key] = entry
+        entry[1] += 1
+        return entry[0], key
+
+    def release(self, key):
+        entry = self._buffers[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._buffers[key]
+
+    def stats(self):
+        buffers = 0
+        references = 0
+        used = 0
+        saved = 0
+        for b, refs in self._buffers.values():
+            size = b.memory()
+            buffers += 1
+            references += refs
+            used += size
+            saved += size * (refs - 1)
+        return {'buffers': buffers,
+                'references': references,
+                'bytes': used,
+                'saved': saved}
 
 def _audio_system_frame(priv):
     return priv._frame_cb()
@@ -1343,7 +2057,9 @@ class AudioSystem():
     def __init__(self, log_cb_return, log_cb_priv, rate, channels,
                  fragsize=cg.SYNTH_DEFAULT_FRAGMENT_SIZE,
                  audformat=cg.SYNTH_TYPE_F32,
-                 filename=None, opendev=True, devname=None, trace=False):
+                 filename=None, opendev=True, devname=None, trace=False,
+                 profile=False, controller=None, lookahead=None,
+                 nativebuffers=False):
         """
         Make a new AudioSystem.
 
@@ -1357,19 +2073,52 @@ class AudioSystem():
         opendev        False to not open an audio device
         devname        The optional SDL audio device name
         trace          True to output a lot of realtime status info
+        profile        True to start profiling audio callbacks, see profile()
+        controller     The optional LatencyController deciding how many fragments
+                       to buffer, defaults to a PredictiveLatency, or a
+                       FixedLatency of 1 fragment without an audio device
+        lookahead      The optional milliseconds to render ahead on a worker
+                       thread, see render_ahead()
+        nativebuffers  True to keep 8 and 16 bit WAV files in their own format
+                       instead of converting them to float, using a half or a
+                       quarter of the memory
         """
         self._s = cg.Synth(filename, opendev, devname,
                            _audio_system_frame, self,
                            log_cb_return, log_cb_priv,
                            rate, channels, fragsize, audformat)
+        self._s.native_buffers(nativebuffers)
+        self._opendev = opendev
         self._histo = [0]
         self._sequences = list()
+        self._pool = _BufferPool(self._s)
         self._fragment_size = self._s.fragment_size()
-        self._fragments = 0
-        self._inc_fragments()
+        if controller == None:
+            if opendev:
+                controller = latency.PredictiveLatency()
+            else:
+                controller = latency.FixedLatency()
+        self._controller = controller
+        self._use_controller(controller)
+        # no interval to report until there's been a callback
+        self._laststart = None
+        self._lastelapsed = 0
         self._error = None
         self._trace = trace
-        self._lastunderrun = -1
+        # held by the render-ahead worker while it's running sequences
+        self._lock = threading.Lock()
+        self._worker = None
+        self._workerError = None
+        self._lookahead = None
+        # sequences being reloaded and how many reparses each is waiting on,
+        # and the reparsed results, appended by the reload workers
+        self._reloading = dict()
+        self._reparsed = deque()
+        self._profiler = None
+        if profile:
+            self.profile(True)
+        if lookahead != None:
+            self.render_ahead(lookahead)
 
     def print_latency(self):
         print("Latency Histogram")
@@ -1385,6 +2134,82 @@ class AudioSystem():
             else:
                 print()
 
+    def profile(self, enabled, window=PROFILE_WINDOW):
+        """
+        Start or stop profiling audio callbacks.  Starting throws away any
+        previous timings.  While stopped, the callback runs exactly as it would
+        have without profiling.
+
+        enabled  True to start profiling, False to stop
+        window   How many of the most recent callbacks to keep timings for
+        """
+        if self.profiling:
+            del self._frame_cb
+            self._latency_update = self._active.update
+            gc.callbacks.remove(self._profiler.gc_cb)
+            for seq in self._sequences:
+                seq[0]._profile(None)
+        if not enabled:
+            return
+        self._profiler = _CallbackProfile(window)
+        for seq in self._sequences:
+            self._profile_sequence(seq[0])
+        gc.callbacks.append(self._profiler.gc_cb)
+        self._latency_update = self._profiler.wrap_latency(self._active.update)
+        self._frame_cb = self._profiled_frame_cb
+
+    @property
+    def profiling(self):
+        """
+        Whether audio callbacks are being profiled.
+        """
+        return '_frame_cb' in self.__dict__
+
+    def stats(self):
+        """
+        Get audio callback timings collected by profile().  Timings are dicts
+        of 'mean', 'p50', 'p90', 'p99' and 'max' in microseconds over the
+        profiling window, or None if nothing was timed.
+
+        returns a dict of
+        'callbacks'  number of callbacks which generated audio
+        'idle'       number of callbacks which had nothing to generate
+        'fragments'  current number of fragments of latency
+        'underruns'  time.monotonic() times of the most recent underruns
+        'total'      time spent in each callback
+        'gc'         time the garbage collector ran during each callback
+        'sequences'  a list of dicts for each sequence with the 'sequence',
+                     time spent in 'advance' of the sequence, applying 'rows',
+                     the 'synth' running players and filters and the whole
+                     'run', for each callback the sequence ran in
+        or None if profiling was never started
+        """
+        prof = self._profiler
+        if prof == None:
+            return None
+        return {'callbacks': prof.callbacks,
+                'idle': prof.idle,
+                'fragments': self._fragments,
+                'underruns': list(prof.underruns),
+                'total': _summarize(prof.totals),
+                'gc': _summarize(prof.gcTimes),
+                'sequences': [p.stats(s) for s, p in prof.sequences.items()]}
+
+    def buffer_stats(self):
+        """
+        Get how much the buffers loaded from files by sequences are being
+        shared.  Sequences using the same file share one buffer, so anything
+        one writes in to it, the others will see.
+
+        returns a dict of
+        'buffers'     number of buffers loaded from files
+        'references'  number of sequence buffers using them
+        'bytes'       memory used by the buffers, not counting streamed ones
+        'saved'       memory saved compared to loading a copy for every
+                      sequence buffer
+        """
+        return self._pool.stats()
+
     def print_full_stats(self):
         """
         Print a lot of status info.
@@ -1428,36 +2253,117 @@ class AudioSystem():
         """
         return self._s.buffer(audioType, data, size, name)
 
+    def _use_controller(self, controller):
+        self._active = controller
+        self._fragments = controller.reset(self._s.rate(), self._fragment_size)
+        self._set_fragments()
+        self._latency_update = controller.update
+        if self.profiling:
+            self._latency_update = self._profiler.wrap_latency(controller.update)
+
     def _set_fragments(self):
+        while len(self._histo) < self._fragments + 1:
+            self._histo.append(0)
         self._s.enabled(False)
         self._s.fragments(self._fragments)
 
-    def _inc_fragments(self):
-        self._fragments += 1
-        if len(self._histo) < self._fragments + 1:
-            self._histo.append(0)
-        self._lastunderrun = 0
-        self._set_fragments()
+    def render_ahead(self, lookahead):
+        """
+        Start or stop rendering ahead.  While rendering ahead, a worker thread
+        runs the sequences to keep lookahead milliseconds of audio buffered, so
+        a slow frame doesn't starve the audio device, and frame() only reports
+        errors from the worker.  The buffer is a whole number of fragments, so
+        lookahead is rounded up, and the latency controller is set aside until
+        rendering ahead stops.  Either way the synth is stopped and started
+        again.  Needs an audio device.
+
+        lookahead  Milliseconds of audio to keep buffered, or None to stop
+        """
+        if self._worker != None:
+            self._stopWorker = True
+            self._worker.join()
+            self._worker = None
+            self._lookahead = None
+            self._use_controller(self._controller)
+            self._s.enabled(True)
+        if lookahead == None:
+            return
+        if not self._opendev:
+            raise Exception("Rendering ahead needs an audio device.")
+
+        fragments = -(-int(lookahead * self._s.rate()) //
+                      (self._fragment_size * 1000))
+        self._use_controller(latency.FixedLatency(max(1, fragments)))
+        self._lookahead = self._fragments * self._fragment_size / self._s.rate() * 1000.0
+        self._workerError = None
+        self._stopWorker = False
+        self._s.enabled(True)
+        self._worker = threading.Thread(target=self._render_ahead_worker,
+                                        name="AudioSystem render-ahead",
+                                        daemon=True)
+        self._worker.start()
+
+    def _render_ahead_worker(self):
+        # check back about twice a fragment
+        wait = self._fragment_size / self._s.rate() / 2
+        while not self._stopWorker:
+            got = 0
+            # after an error, wait for frame() to report it before going on
+            if self._workerError == None:
+                with self._lock:
+                    try:
+                        got = self._s.frame()
+                    except Exception as e:
+                        self._s.enabled(False)
+                        self._workerError = e
+            if got == 0:
+                time.sleep(wait)
+
+    @property
+    def lookahead(self):
+        """
+        Milliseconds of audio being rendered ahead, or None if not rendering
+        ahead.
+        """
+        return self._lookahead
+
+    @property
+    def fill(self):
+        """
+        Milliseconds of audio currently buffered for the audio device.
+        """
+        buffered = self._fragments * self._fragment_size - self._s.needed()
+        return buffered / self._s.rate() * 1000.0
+
+    def _profile_sequence(self, seq):
+        prof = _SequenceProfile(self._profiler.window)
+        self._profiler.sequences[seq] = prof
+        seq._profile(prof)
+
+    def _profiled_frame_cb(self):
+        start = _time_ns()
+        needed = AudioSystem._frame_cb(self)
+        self._profiler.callback(_time_ns() - start, needed)
+        return needed
 
     def _frame_cb(self):
         try:
-            if self._s.underrun():
-                self._inc_fragments()
-                self._s.enabled(True)
-            else:
+            start = _time_ns()
+            interval = 0
+            if self._laststart != None:
+                interval = start - self._laststart
+            underrun = self._s.underrun()
+            if not underrun:
                 self._histo[self._fragments] += 1
-                if self._lastunderrun > -1:
-                    self._lastunderrun += self._s.needed()
-                    # try to return to the most stable latency in case of
-                    # hitches
-                    if self._lastunderrun >= self._s.rate():
-                        maxval = sorted(self._histo)[-1]
-                        val = self._histo.index(maxval)
-                        if val != self._fragments:
-                            self._fragments = val
-                            self._set_fragments()
-                            self._s.enabled(True)
-                        self._lastunderrun = -1
+            fragments = self._latency_update(self._fragments, underrun,
+                                             self._s.needed(),
+                                             interval / 1000000000,
+                                             self._lastelapsed / 1000000000)
+            self._laststart = start
+            if fragments != self._fragments:
+                self._fragments = fragments
+                self._set_fragments()
+                self._s.enabled(True)
 
             needed = self._s.needed()
 
@@ -1469,16 +2375,10 @@ class AudioSystem():
                     if not seq[1]:
                         continue
                     seq[0]._reset_output_positions()
-                    got = seq[0].run(needed)
-                    # a biiiiiit hacky but now that we're dealing with floating
-                    # point stuff, but the sequencer still runs in terms of
-                    # whole milliseconds (might change later?), bits of
-                    # rounding error need to be lopped off so all sequences can
-                    # run in lockstep
-                    if not seq[0].ended:
-                        needed = got
+                    seq[0].run(needed)
                 self._error = None
 
+            self._lastelapsed = _time_ns() - start
             return needed
         except Exception as e:
             # save it, otherwise raising it now confuses it.
@@ -1492,30 +2392,110 @@ class AudioSystem():
 
         enabled  True to have the sequence enabled (playing) immediately
         """
-        seq._load(self._s)
-        self._sequences.append([seq, enabled])
+        with self._lock:
+            seq._load(self._s, self._pool)
+            self._sequences.append([seq, enabled])
+            if self.profiling:
+                self._profile_sequence(seq)
 
     def del_sequence(self, seq):
         """
         Delete a sequence.
         """
-        for item in enumerate(self._sequences):
-            if item[1][0] == seq:
-                item[1][0]._unload()
-                self._sequences.remove(item[1])
-                return
+        with self._lock:
+            for item in enumerate(self._sequences):
+                if item[1][0] == seq:
+                    if self.profiling:
+                        seq._profile(None)
+                        del self._profiler.sequences[seq]
+                    item[1][0]._unload()
+                    self._sequences.remove(item[1])
+                    self._reloading.pop(seq, None)
+                    return
         print("WARNING: Attempt to remove sequence not added.")
 
     def sequence_enabled(self, seq, enabled):
         """
         Set enabled state (start/stop playing) for a sequence.
         """
-        for item in self._sequences:
-            if item[0] == seq:
-                item[1] = not not enabled
-                return
+        with self._lock:
+            for item in self._sequences:
+                if item[0] == seq:
+                    item[1] = not not enabled
+                    return
         print("WARNING: Attempt to enable sequence not added.")
 
+    def reload_sequence(self, seq):
+        """
+        Read a sequence's file again without stopping audio, for trying out
+        changes while it plays.  The file is parsed on a worker thread, then
+        the next frame() loads it, sharing any unchanged files the sequence
+        loads buffers from, and it's switched to at the start of a pattern.
+        If the sequence order is the same, it's first played from the
+        beginning with its output thrown away, a little each frame, so it
+        carries on from that pattern just as the old version would have,
+        otherwise it starts over at the next pattern.  If reading the file
+        fails, a warning is printed and the sequence keeps playing as it was.
+        """
+        if seq._source[0] == None:
+            raise Exception("Sequence wasn't read from a file, so it can't be reloaded.")
+        with self._lock:
+            if not any(item[0] == seq for item in self._sequences):
+                print("WARNING: Attempt to reload sequence not added.")
+                return
+            self._reloading[seq] = self._reloading.get(seq, 0) + 1
+        threading.Thread(target=self._reload_worker, args=(seq,),
+                         name="AudioSystem reload", daemon=True).start()
+
+    def _reload_worker(self, seq):
+        try:
+            self._reparsed.append((seq, seq._reparse(), None))
+        except Exception as e:
+            self._reparsed.append((seq, None, e))
+
+    def _service_reloads(self):
+        # load reparsed sequences and unload whatever they replaced, outside
+        # of the audio callback
+        with self._lock:
+            while len(self._reparsed) > 0:
+                seq, new, error = self._reparsed.popleft()
+                # deleted since
+                if seq not in self._reloading:
+                    continue
+                self._reloading[seq] -= 1
+                if error != None:
+                    print("WARNING: Couldn't reload sequence: {}".format(error))
+                    continue
+                seq._unload_retired()
+                try:
+                    seq._hand_over(new, self._s, self._pool)
+                except Exception as e:
+                    print("WARNING: Couldn't load reloaded sequence: {}".format(e))
+            for seq, parsing in list(self._reloading.items()):
+                seq._unload_retired()
+                if seq._reload != None and seq._keepPosition:
+                    try:
+                        seq._catch_up_reload(RELOAD_CATCH_UP_TIME)
+                    except Exception as e:
+                        print("WARNING: Couldn't play reloaded sequence: {}".format(e))
+                        seq._reload._unload()
+                        seq._reload = None
+                        seq._unload_retired()
+                if parsing == 0 and seq._reload == None:
+                    del self._reloading[seq]
+
+    def restart_sequence(self, seq):
+        """
+        Start a sequence over from the beginning with warm_reset(), safely
+        even while rendering ahead, for looping music without a hitch.
+        """
+        with self._lock:
+            for item in self._sequences:
+                if item[0] == seq:
+                    seq.warm_reset()
+                    return
+        print("WARNING: Attempt to restart sequence not added.")
+
     def enabled(self, enabled):
         """
         Set enabled state (start/stop playing) for the whole synth.
@@ -1534,12 +2514,77 @@ class AudioSystem():
         """
         self._s.close_wav()
 
+    def tap(self, samples):
+        """
+        Start mirroring the most recently generated samples of every output
+        channel, for visualizers.  See tap_snapshot().
+
+        samples  Number of samples of each channel to keep, or 0 to stop
+        """
+        self._s.tap(samples)
+
+    def tap_snapshot(self):
+        """
+        Get the tapped samples of every output channel at once, without locking
+        the audio device or copying.  Samples keep being generated in to the
+        tap, so use it before the next frame and don't hold on to it, since the
+        tap can't be changed while snapshots are around.
+
+        returns the number of samples tapped so far and a memoryview of floats
+        shaped (channels, samples)
+        """
+        return self._s.tap_snapshot()
+
     def frame(self):
         """
-        Indicate to the synth it's OK to request to fill buffers.
+        Indicate to the synth it's OK to request to fill buffers.  While
+        rendering ahead, this just raises any exception the worker hit.
         """
+        if len(self._reloading) > 0:
+            self._service_reloads()
+        if self._worker != None:
+            if self._workerError != None:
+                e = self._workerError
+                self._workerError = None
+                raise e
+            return 0
         try:
             return(self._s.frame())
         except Exception as e:
             self._s.enabled(False)
             raise e
+
+    def render(self, filename, maxsamples=None):
+        """
+        Render all enabled sequences to a WAV file as fast as possible, until
+        they have all ended.  The AudioSystem must have been made with
+        opendev=False.
+
+        filename    The WAV file to write
+        maxsamples  Optionally stop after this many samples, for sequences
+                    which never end
+        returns the number of samples written
+        """
+        if self._opendev:
+            raise Exception("Offline rendering needs an AudioSystem without an audio device.")
+
+        sequences = [seq[0] for seq in self._sequences if seq[1]]
+        rendered = 0
+        self.open_wav(filename)
+        try:
+            while maxsamples == None or rendered < maxsamples:
+                got = self.frame()
+                if got > 0:
+                    self._s.write_wav(got)
+                    rendered += got
+                ended = True
+                for seq in sequences:
+                    if not seq.ended:
+                        ended = False
+                        break
+                if ended:
+                    break
+        finally:
+            self.close_wav()
+
+        return rendered
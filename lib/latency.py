@@ -0,0 +1,295 @@
+from collections import deque
+
+class LatencyController():
+    """
+    Decides how many fragments of audio the synth keeps buffered.  More
+    fragments survive longer stalls between frames but add latency, and every
+    change stops and restarts the synth, dropping what's buffered.
+    """
+    def reset(self, rate, fragsize):
+        """
+        Start over for a synth running at rate with fragsize sample fragments.
+
+        returns the number of fragments to start with
+        """
+        raise NotImplementedError()
+
+    def update(self, fragments, underrun, needed, interval, elapsed):
+        """
+        Called at the start of every audio callback.
+
+        fragments  The number of fragments currently in use
+        underrun   True if the synth ran out of samples since the last callback
+        needed     Samples needed this callback
+        interval   Seconds since the last callback started
+        elapsed    Seconds the last callback took
+        returns the number of fragments to use from now on
+        """
+        raise NotImplementedError()
+
+class FixedLatency(LatencyController):
+    """
+    Always use the same number of fragments, no matter what.
+    """
+    def __init__(self, fragments=1):
+        self._fragments = fragments
+
+    def reset(self, rate, fragsize):
+        return self._fragments
+
+    def update(self, fragments, underrun, needed, interval, elapsed):
+        return self._fragments
+
+class HistogramLatency(LatencyController):
+    """
+    The original policy.  Add a fragment on every underrun, then after a
+    second without underruns go back to whichever fragment count was used for
+    the most callbacks.
+    """
+    def reset(self, rate, fragsize):
+        self._rate = rate
+        self._histo = [0, 0]
+        self._lastunderrun = 0
+        return 1
+
+    def update(self, fragments, underrun, needed, interval, elapsed):
+        if underrun:
+            fragments += 1
+            if len(self._histo) < fragments + 1:
+                self._histo.append(0)
+            self._lastunderrun = 0
+            return fragments
+
+        self._histo[fragments] += 1
+        if self._lastunderrun > -1:
+            self._lastunderrun += needed
+            # try to return to the most stable latency in case of hitches
+            if self._lastunderrun >= self._rate:
+                self._lastunderrun = -1
+                return self._histo.index(max(self._histo))
+        return fragments
+
+class PredictiveLatency(LatencyController):
+    """
+    Keep enough fragments to cover a percentile of the recent gaps between
+    callbacks, growing as soon as the gaps say an underrun is likely and
+    shrinking one fragment at a time only after things have been calm for a
+    while.
+
+    percentile  Fraction of recent gaps which must fit in the buffer
+    headroom    Multiplier on each gap for safety
+    window      How many recent callbacks to consider
+    backoff     Seconds of audio the buffer must be bigger than needed for
+                before dropping a fragment
+    minimum     Fewest fragments to use
+    maximum     Most fragments to use
+    """
+    def __init__(self, percentile=0.99, headroom=1.0, window=512,
+                 backoff=5.0, minimum=1, maximum=32):
+        if minimum < 1 or maximum < minimum:
+            raise ValueError("Invalid fragment range {}-{}.".format(minimum, maximum))
+        self._percentile = percentile
+        self._headroom = headroom
+        self._window = window
+        self._backoff = backoff
+        self._minimum = minimum
+        self._maximum = maximum
+
+    def reset(self, rate, fragsize):
+        self._rate = rate
+        self._fragsize = fragsize
+        self._scale = rate * self._headroom / fragsize
+        self._needs = deque()
+        # how many callbacks in the window needed each number of fragments
+        self._counts = [0] * (self._maximum + 1)
+        self._fragments = self._minimum
+        # callbacks in the window which needed more than, or at least as many
+        # as the current fragments, kept up to date so no callback has to
+        # search the counts
+        self._above = 0
+        self._atleast = 0
+        self._calm = 0
+        return self._fragments
+
+    def _recount(self, fragments):
+        self._fragments = fragments
+        self._above = sum(self._counts[fragments + 1:])
+        self._atleast = self._above + self._counts[fragments]
+
+    def target(self):
+        """
+        Get the number of fragments the recent gaps call for.
+        """
+        want = self._percentile * len(self._needs)
+        total = 0
+        for num, count in enumerate(self._counts):
+            total += count
+            if total >= want and num >= self._minimum:
+                return num
+        return self._maximum
+
+    def update(self, fragments, underrun, needed, interval, elapsed):
+        if fragments != self._fragments:
+            self._recount(fragments)
+
+        # samples have to last from one fill until the next, which is at
+        # most a whole interval plus however long the callback takes, with
+        # a fragment on top for the device to be reading from
+        need = min(int((interval + elapsed) * self._scale) + 1,
+                   self._maximum)
+        self._needs.append(need)
+        self._counts[need] += 1
+        if need > fragments:
+            self._above += 1
+        if need >= fragments:
+            self._atleast += 1
+        if len(self._needs) > self._window:
+            old = self._needs.popleft()
+            self._counts[old] -= 1
+            if old > fragments:
+                self._above -= 1
+            if old >= fragments:
+                self._atleast -= 1
+
+        count = len(self._needs)
+        if underrun:
+            # the gaps didn't see it coming, so don't trust them to shrink
+            # for a while either
+            self._calm = 0
+            fragments = max(fragments + 1, self.target())
+        elif count - self._above < self._percentile * count:
+            self._calm = 0
+            fragments = self.target()
+        elif count - self._atleast >= self._percentile * count:
+            self._calm += needed
+            if self._calm < self._backoff * self._rate:
+                return fragments
+            self._calm = 0
+            fragments -= 1
+        else:
+            self._calm = 0
+            return fragments
+
+        fragments = min(max(fragments, self._minimum), self._maximum)
+        self._recount(fragments)
+        return fragments
+
+class RecordingLatency(LatencyController):
+    """
+    Pass everything through to another controller while recording the
+    callback timings, so they can be saved and replayed with simulate().
+    """
+    def __init__(self, controller):
+        self._controller = controller
+        self.trace = list()
+
+    def reset(self, rate, fragsize):
+        return self._controller.reset(rate, fragsize)
+
+    def update(self, fragments, underrun, needed, interval, elapsed):
+        self.trace.append((interval, elapsed))
+        return self._controller.update(fragments, underrun, needed,
+                                       interval, elapsed)
+
+    def save(self, filename):
+        """
+        Save the recorded trace to a file for load_trace().
+        """
+        save_trace(filename, self.trace)
+
+def save_trace(filename, trace):
+    """
+    Save a list of (interval, elapsed) callback timings in seconds to a text
+    file, one callback per line.
+    """
+    with open(filename, "w") as outfile:
+        for interval, elapsed in trace:
+            outfile.write("{!r} {!r}\n".format(interval, elapsed))
+
+def load_trace(filename):
+    """
+    Load callback timings saved by save_trace().
+    """
+    trace = list()
+    with open(filename, "r") as infile:
+        for num, line in enumerate(infile):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                interval, elapsed = line.split()
+                trace.append((float(interval), float(elapsed)))
+            except ValueError as e:
+                print("Syntax error in trace {} line {}.".format(filename, num + 1))
+                raise e
+    return trace
+
+def simulate(controller, trace, rate, fragsize):
+    """
+    Replay callback timings against a model of the audio device to see how a
+    controller would have done.  The device drains samples in real time, each
+    callback tops the buffer back up once it's done, and changing the number
+    of fragments drops everything buffered and pauses the device until the
+    next fill, like the real synth.
+
+    controller  A LatencyController
+    trace       A list of (interval, elapsed) callback timings in seconds, as
+                recorded by RecordingLatency
+    rate        Sample rate
+    fragsize    Samples per fragment
+    returns a dict of the number of 'underruns', fragment 'changes', the
+    'mean' latency weighted by time and 'max' latency in milliseconds
+    """
+    fragments = controller.reset(rate, fragsize)
+    playing = False
+    buffered = 0.0
+    underrun = False
+    underruns = 0
+    changes = 0
+    maxfragments = fragments
+    weighted = 0.0
+    duration = 0.0
+    lastelapsed = 0.0
+
+    for interval, elapsed in trace:
+        # played out while waiting for this callback, though the previous
+        # callback's time was already accounted for when it filled
+        if playing:
+            buffered -= max(interval - lastelapsed, 0.0) * rate
+            if buffered < 0.0:
+                buffered = 0.0
+                underrun = True
+        if underrun:
+            underruns += 1
+
+        capacity = fragments * fragsize
+        needed = int(capacity - buffered)
+        newfragments = controller.update(fragments, underrun, needed,
+                                         interval, lastelapsed)
+        underrun = False
+        if newfragments != fragments:
+            changes += 1
+            fragments = newfragments
+            maxfragments = max(maxfragments, fragments)
+            capacity = fragments * fragsize
+            playing = False
+
+        if playing:
+            # played out while this callback generated its samples
+            buffered -= elapsed * rate
+            if buffered < 0.0:
+                underrun = True
+        buffered = capacity
+        playing = True
+        lastelapsed = elapsed
+
+        weighted += interval * capacity
+        duration += interval
+
+    mean = 0.0
+    if duration > 0.0:
+        mean = weighted / duration / rate * 1000.0
+    return {'underruns': underruns,
+            'changes': changes,
+            'mean': mean,
+            'max': maxfragments * fragsize / rate * 1000.0}
@@ -1,4 +1,5 @@
 from sys import stdout
+import bisect
 import copy
 
 FIELD_TYPE_INT = object()
@@ -57,43 +58,55 @@ class SequenceDescription():
 
 
 class Sequencer():
-    def __init__(self, desc, file, trace=False):
+    def __init__(self, desc, file, trace=False, compiled=None):
         """
         Create a sequence.
 
-        desc   A sequence description built up with SequenceDescription.
-        file   The file to read the sequence from which must match the format described in desc.
-        trace  True to output a bunch of status information.
+        desc      A sequence description built up with SequenceDescription.
+        file      The file to read the sequence from which must match the format described in desc.
+        trace     True to output a bunch of status information.
+        compiled  Optional data from the compiled property of a Sequencer made
+                  with the same description, file is ignored if provided.
         """
         self._trace = trace
         self._desc = desc
-        self._read_file(file)
+        if compiled != None:
+            self._row, self._pattern, self._order, self._initial = compiled
+        else:
+            self._read_file(file)
+        self._scale = (1, 1)
+        self._compile()
         self.reset()
 
+    @property
+    def compiled(self):
+        """
+        Get the fully parsed sequence data, suitable for storing and passing
+        back in to a new Sequencer to skip reading the file.
+        """
+        return self._row, self._pattern, self._order, self._initial
+
     def reset(self):
         """
         Restart the state of the sequence to the beginning.
         """
         self._divTime = self._row[self._initial[0]][0]
-        self._curOrder = -1
-        self._curLine = 0
+        self._curEvent = -1
         self._lineTime = 0
+        self._next = None
         self._ended = False
 
     def _add_row(self, newrow, descnum):
-        desc = self._desc._rowdesc[descnum]
-        for row in range(len(self._row)):
-            if self._row[row][-1] == descnum:
-                if len(newrow) == len(desc):
-                    found = True
-                    for item in range(len(newrow)):
-                        if self._row[row][item] != newrow[item]:
-                            found = False
-                            break
-                    if found:
-                        return row
+        # rows are looked up by their description and values so identical rows
+        # are only stored once
+        key = (descnum, tuple(newrow))
+        try:
+            return self._rowIndex[key]
+        except KeyError:
+            pass
         newrow.append(descnum)
         self._row.append(newrow)
+        self._rowIndex[key] = len(self._row) - 1
         return len(self._row) - 1
 
     def _read_row(self, struct, descnum, initial=False):
@@ -238,6 +251,7 @@ class Sequencer():
 
     def _read_file(self, file):
         self._row = list()
+        self._rowIndex = {}
         self._namedRows = {}
         self._pattern = list()
         self._order = list()
@@ -334,9 +348,31 @@ class Sequencer():
 
     def get_row(self, rownum):
         """
-        Get a row of data.
+        Get a row of data.  The row is shared so it must not be modified.
         """
-        return self._row[rownum][:-1]
+        return self._rowData[rownum]
+
+    def channel_rows(self, channel):
+        """
+        Get every row a channel is given, from the initial line and every line
+        played, each only once.  The rows are shared so they must not be
+        modified.
+        """
+        rows = dict()
+        row = self._initialLine[channel]
+        if row != None:
+            rows[id(row)] = row
+        for line in self._lines:
+            row = line[channel]
+            if row != None:
+                rows[id(row)] = row
+        return list(rows.values())
+
+    def get_rows(self, desc):
+        """
+        Get the numbers of all the rows of a row description.
+        """
+        return [num for num, row in enumerate(self._row) if row[-1] == desc]
 
     def _get_line(self, line):
         newLine = list()
@@ -344,74 +380,161 @@ class Sequencer():
             if line[i] is None or line[i] == -1:
                 newLine.append(None)
             else:
-                newLine.append(self._row[line[i]][:-1])
-        return newLine
+                newLine.append(self._rowData[line[i]])
+        return tuple(newLine)
+
+    def _compile(self):
+        # resolve everything advance() would need up front so playing the
+        # sequence doesn't need to look anything up or allocate.  Rows are
+        # shared tuples and each line played is an event of the division
+        # time for that line and the data for each channel, scaled by
+        # set_time_scale().
+        self._rowData = [tuple(row[:-1]) for row in self._row]
+        lines = list()
+        for pattern in self._pattern:
+            lines.append([self._get_line(line) for line in pattern])
+        self._initialLine = self._get_line(self._initial)[1:]
+        divTime = self._row[self._initial[0]][0]
+        self._divTimes = list()
+        self._lines = list()
+        self._orderEvent = list()
+        for order in self._order:
+            self._orderEvent.append(len(self._lines))
+            for line in lines[order]:
+                if line[0] != None and line[0][0] != None:
+                    divTime = line[0][0]
+                self._divTimes.append(divTime)
+                self._lines.append(line[1:])
+        # first event of each position in the order back to the position
+        self._orderStart = {event: num for num, event in enumerate(self._orderEvent)}
+        self._scale_events()
+
+    def _scale_events(self):
+        # each line lasts from where it starts to where the next starts in the
+        # whole scaled sequence, so rounding never adds up however long it is
+        num, den = self._scale
+        self._events = list()
+        starts = list()
+        start = 0
+        for divTime, line in zip(self._divTimes, self._lines):
+            end = start + divTime
+            starts.append((start * num) // den)
+            self._events.append((((end * num) // den) - ((start * num) // den),
+                                 line))
+            start = end
+        starts.append((start * num) // den)
+        self._orderTimes = [starts[event] for event in self._orderEvent]
+
+    def set_time_scale(self, num, den=1):
+        """
+        Have advance() work in some other unit than the sequence was written
+        in, like samples at num per second for a sequence in milliseconds with
+        den 1000.  Every line starts at its time in the sequence times
+        num / den, rounded down, so however long the sequence plays, it never
+        drifts from the sequence's own timing.  Resets the sequence.
+        """
+        self._scale = (num, den)
+        self._scale_events()
+        self.reset()
+
+    def _set_event(self, event):
+        self._curEvent = event
+        self._lineTime = 0
+        self._ended = False
+        self._divTime, self._next = self._events[event]
+
+    @property
+    def order(self):
+        """
+        Get the sequence order, the patterns in the order they're played.
+        """
+        return tuple(self._order)
+
+    def order_start(self):
+        """
+        Find out if the sequence is right at the start of a pattern, before
+        any of it has been played.
+
+        returns the position in the sequence order about to be played, or None
+        if partway through a pattern
+        """
+        if self._lineTime != 0 or self._ended:
+            return None
+        return self._orderStart.get(self._curEvent)
+
+    def next_order_start(self):
+        """
+        Find where in the sequence order the next pattern starts, which is the
+        one about to be played if order_start() would return it.
+
+        returns the position in the sequence order, or None if the sequence
+        ends first
+        """
+        if self._ended:
+            return None
+        if self._curEvent == -1:
+            return 0
+        if self._lineTime == 0 and self._curEvent in self._orderStart:
+            return self._orderStart[self._curEvent]
+        order = bisect.bisect_right(self._orderEvent, self._curEvent)
+        if order == len(self._orderEvent):
+            return None
+        return order
+
+    def order_time(self, order):
+        """
+        Get how long after the beginning a position in the sequence order
+        starts, in the same time advance() works in.
+        """
+        return self._orderTimes[order]
 
     def set_pattern(self, pattern):
         """
-        Set the current sequence pattern to start playing from.
+        Set the current sequence pattern to start playing from, at the first
+        place it appears in the sequence order.
         """
-        if pattern < 0 or pattern > len(self._pattern):
+        if pattern < 0 or pattern > len(self._pattern) - 1:
             raise IndexError("pattern out of range")
-        self._curPattern = pattern
-        self._curLine = 0
+        try:
+            self.set_order(self._order.index(pattern))
+        except ValueError:
+            raise IndexError("pattern not in sequence order")
 
     def set_order(self, order):
         """
         Set the current sequence pattern indicated by a specific sequence order to start playing from.
         """
-        if pattern < 0 or pattern > len(self._order):
+        if order < 0 or order > len(self._order) - 1:
             raise IndexError("order out of range")
-        self._curOrder = 0
-        self._curPattern = self._order[self._curOrder]
-        self._curLine = 0
+        self._set_event(self._orderEvent[order])
 
     def advance(self, time):
         """
         Advance the sequence by a certain amount of time.
 
         Will return without advancing the full amount of time requested if it would get to the next line.
+        Time is in milliseconds unless set_time_scale() says otherwise.
         returns the amount of time advanced, and the data of the line it fell on.
         """
-        line = None
-
-        if self._curOrder == -1 and self._curLine == 0 and self._lineTime == 0:
+        if self._curEvent == -1:
             time = 0
-            self._curOrder = 0
-            self._curPattern = self._order[0]
-            line = self._get_line(self._initial)[1:]
-
-            nextline = self._get_line(self._pattern[0][0])
-            if nextline[0] != None and nextline[0][0] != None:
-                self._divTime = nextline[0][0]
-            self._next = nextline[1:]
+            self._set_event(0)
+            return time, self._initialLine
         elif self._ended:
             raise SequenceEnded()
-        else:
-            if self._next != None:
-                line = self._next
-                self._next = None
-            else:
-                line = None
-
-            if time >= self._divTime - self._lineTime:
-                time = self._divTime - self._lineTime
-                self._lineTime = 0
-                self._curLine += 1
-                if self._curLine == len(self._pattern[self._curPattern]):
-                    self._curOrder += 1
-                    if self._curOrder < len(self._order):
-                        self._curLine = 0
-                        self._curPattern = self._order[self._curOrder]
-                    else:
-                        self._ended = True
-
-                if not self._ended:
-                    nextline = self._get_line(self._pattern[self._curPattern][self._curLine])
-                    if nextline[0] != None and nextline[0][0] != None:
-                        self._divTime = nextline[0][0]
-                    self._next = nextline[1:]
+
+        line = self._next
+        self._next = None
+
+        if time >= self._divTime - self._lineTime:
+            time = self._divTime - self._lineTime
+            self._lineTime = 0
+            self._curEvent += 1
+            if self._curEvent < len(self._events):
+                self._divTime, self._next = self._events[self._curEvent]
             else:
-                self._lineTime += time
+                self._ended = True
+        else:
+            self._lineTime += time
 
         return time, line
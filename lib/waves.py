@@ -1,5 +1,9 @@
 import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
 import numpy
+import scipy
 from scipy import signal
 import random
 
@@ -10,6 +14,9 @@ DECADES = 3
 SLICES = FILTERS_PER_DECADE * DECADES
 MIN_TRANS_WIDTH = BASE_FREQ * 2
 TRANS_WIDTH_DIV = 10
+# bump this whenever the way filters are designed changes so stale cache files
+# are ignored
+FILTER_CACHE_VERSION = 1
 
 class LogSlope():
     def __init__(self, start, end, num):
@@ -59,109 +66,300 @@ def create_random_noise(low, high, num):
     noise = array.array('f', RandomNoise(low, high, num))
     return(noise)
 
-def make_filter(rate, lowpass):
-    filt = None
-#    fileexists = False
+def _filter_cache_name(cachedir, rate, lowpass):
+    kind = "hp"
+    if lowpass:
+        kind = "lp"
+    # scipy's version too, in case firwin's output changes
+    return os.path.join(cachedir,
+                        "{}v{}t{}b{}fd{}d{}mtw{}twd{}r{}-scipy{}.npy".format(
+                        FILTER_CACHE_VERSION, FILTER_TAPS, BASE_FREQ,
+                        FILTERS_PER_DECADE, DECADES, MIN_TRANS_WIDTH,
+                        TRANS_WIDTH_DIV, rate, kind, scipy.__version__))
+
+def _read_filter_cache(filename):
+    try:
+        filt = numpy.load(filename, mmap_mode='r', allow_pickle=False)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print("WARNING: Couldn't read filter cache {}: {}".format(filename, e))
+        return None
+    if filt.dtype != numpy.float32 or filt.shape != (SLICES * FILTER_TAPS,):
+        print("WARNING: Filter cache {} is the wrong size, ignoring.".format(filename))
+        return None
+    return filt
+
+def _write_filter_cache(filename, filt):
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # write to a temporary file then move it in to place so a partially
+        # written cache is never seen
+        tmpname = "{}.{}.tmp".format(filename, os.getpid())
+        with open(tmpname, 'wb') as cachefile:
+            numpy.save(cachefile, filt, allow_pickle=False)
+        os.replace(tmpname, filename)
+    except OSError as e:
+        print("WARNING: Couldn't write filter cache {}: {}".format(filename, e))
+
+def _filter_params(dec, i):
+    mul = (10 ** dec) + (((10 ** (dec + 1)) - (10 ** dec)) ** (i / FILTERS_PER_DECADE)) - 1.0
+    freq = BASE_FREQ * mul
+    transwidth = (((mul - 1) / TRANS_WIDTH_DIV) + 1) * MIN_TRANS_WIDTH
+    return mul, freq, transwidth
 
-#    filename = "{}t{}b{}fd{}d{}mtw{}twd{}r.npy".format(FILTER_TAPS, BASE_FREQ, FILTERS_PER_DECADE, DECADES, MIN_TRANS_WIDTH, TRANS_WIDTH_DIV, rate)
+def _design_filter(rate, lowpass, freq, transwidth):
+#    return signal.remez(FILTER_TAPS,
+#                        [0, freq, freq + transwidth, rate / 2],
+#                        [1, 0], fs=rate)
+    if lowpass:
+        return signal.firwin(FILTER_TAPS, freq,
+                             width=transwidth,
+                             pass_zero=lowpass, fs=rate)
+    return signal.firwin(FILTER_TAPS, (freq, rate/2-1),
+                         width=transwidth,
+                         pass_zero=lowpass, fs=rate)
 
-#    try:
-#        filt = numpy.load(filename, allow_pickle=False)
-#        fileexists = True
-#        print("Filters loaded from file.")
-#    except IOError as e:
-#        pass
+def _design_filters(rate, lowpass, start, end):
+    """
+    Design slices start to end of a filter bank, in a worker process.
+    """
+    filt = numpy.zeros((end - start) * FILTER_TAPS, numpy.float32)
+    for num in range(start, end):
+        _, freq, transwidth = _filter_params(num // FILTERS_PER_DECADE,
+                                             num % FILTERS_PER_DECADE)
+        pos = (num - start) * FILTER_TAPS
+        filt[pos:pos + FILTER_TAPS] = _design_filter(rate, lowpass,
+                                                     freq, transwidth)
+    return start, filt
 
-    if filt is None:
+def _make_filter_parallel(rate, lowpass, workers):
+    filt = numpy.zeros(SLICES * FILTER_TAPS, numpy.float32)
+    # a few chunks per worker so they all stay busy to the end
+    chunks = min(workers * 4, SLICES)
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = list()
+        for chunk in range(chunks):
+            futures.append(pool.submit(_design_filters, rate, lowpass,
+                                       chunk * SLICES // chunks,
+                                       (chunk + 1) * SLICES // chunks))
+        try:
+            for future in as_completed(futures):
+                start, part = future.result()
+                filt[start * FILTER_TAPS:start * FILTER_TAPS + len(part)] = part
+                done += len(part) // FILTER_TAPS
+                print("{} / {}".format(done, SLICES), end='\r')
+        finally:
+            print()
+    return filt
+
+def make_filter(rate, lowpass, cachedir=None, workers=1):
+    """
+    Design a bank of SLICES lowpass or highpass filters of FILTER_TAPS taps
+    each, with cutoffs spread logarithmically from BASE_FREQ over DECADES.
+
+    rate      Sample rate the filters are for
+    lowpass   True for lowpass filters, False for highpass
+    cachedir  Optional directory to keep designed filter banks in, so they
+              only have to be designed once.  Cached banks are memory mapped
+              read only.
+    workers   Number of processes to design filters in when they aren't
+              cached, None for one per CPU, or 1 to design them in this
+              process.  The result is the same either way.
+    """
+    filt = None
+    cachename = None
+    if cachedir != None:
+        cachename = _filter_cache_name(cachedir, rate, lowpass)
+        filt = _read_filter_cache(cachename)
+
+    if workers == None:
+        workers = os.cpu_count()
+        if workers == None:
+            workers = 1
+    if filt is None and workers > 1:
+        filt = _make_filter_parallel(rate, lowpass, workers)
+    elif filt is None:
         try:
             filt = numpy.zeros(SLICES * FILTER_TAPS, numpy.float32)
             maxval = DECADES * FILTERS_PER_DECADE
             for dec in range(DECADES):
                 for i in range(FILTERS_PER_DECADE):
-                    mul = (10 ** dec) + (((10 ** (dec + 1)) - (10 ** dec)) ** (i / FILTERS_PER_DECADE)) - 1.0
-                    freq = BASE_FREQ * mul
-                    transwidth = (((mul - 1) / TRANS_WIDTH_DIV) + 1) * MIN_TRANS_WIDTH
+                    mul, freq, transwidth = _filter_params(dec, i)
                     print("{} {}".format(mul, transwidth))
                     pos = (dec * FILTERS_PER_DECADE * FILTER_TAPS) + (i * FILTER_TAPS)
-#                    filt[pos:pos + FILTER_TAPS] = \
-#                        signal.remez(FILTER_TAPS,
-#                                     [0, freq, freq + transwidth, rate / 2],
-#                                     [1, 0], fs=rate)
-                    if lowpass:
-                        filt[pos:pos + FILTER_TAPS] = \
-                             signal.firwin(FILTER_TAPS, freq,
-                                           width=transwidth,
-                                           pass_zero=lowpass, fs=rate)
-                    else:
-                        filt[pos:pos + FILTER_TAPS] = \
-                             signal.firwin(FILTER_TAPS, (freq, rate/2-1),
-                                           width=transwidth,
-                                           pass_zero=lowpass, fs=rate)
+                    filt[pos:pos + FILTER_TAPS] = \
+                        _design_filter(rate, lowpass, freq, transwidth)
                     print("{} / {}".format(dec * FILTERS_PER_DECADE + i + 1, maxval), end='\r')
         except Exception as e:
             raise e
         finally:
             print()
 
-#    if not fileexists:
-#        print("Saving filter to file...")
-#        try:
-#            numpy.save(filename, filt, allow_pickle=False)
-#        except IOError:
-#            print("Saving failed.")
+    if cachename != None and not isinstance(filt, numpy.memmap):
+        print("Saving filter to file...")
+        _write_filter_cache(cachename, filt)
 
     return(filt)
 
+# samples in a single cycle wavetable
+WAVETABLE_SIZE = 2048
+# how many wavetables a WaveGen keeps before throwing out the least recently
+# used ones
+WAVETABLE_CACHE = 64
+
+# harmonic series for each waveform, given how many harmonics to make, as
+# harmonic numbers, amplitudes and phases in fractions of a cycle
+# information for these was found at:
+# <https://pages.uoregon.edu/emi/9.php>
+# but it's well-known stuff.
+def _sine_series(harmonics):
+    return [1], [1.0], [0.0]
+
+def _square_series(harmonics):
+    # odd harmonics
+    # each 1/harmonic in amplitude
+    # all in phase
+    return ([x for x in range(1, harmonics * 2 + 1, 2)],
+            [1 / x for x in range(1, harmonics * 2 + 1, 2)],
+            [0 for x in range(harmonics)])
+
+def _triangle_series(harmonics):
+    # odd harmonics
+    # each 1/(harmonic ** 2) in amplitude
+    # every other harmonic is out of phase
+    return ([x for x in range(1, harmonics * 2 + 1, 2)],
+            [1 / (x ** 2) for x in range(1, harmonics * 2 + 1, 2)],
+            [(x % 2) * 0.5 for x in range(harmonics)])
+
+def _sawtooth_series(harmonics):
+    # all harmonics
+    # each 1/harmonic in amplitude
+    # odd harmonics are 180 deg out of phase
+    return ([x for x in range(1, harmonics + 1)],
+            [1 / x for x in range(1, harmonics + 1)],
+            [(x % 2) * 0.5 for x in range(harmonics)])
+
+SHAPES = {'sine': _sine_series,
+          'square': _square_series,
+          'triangle': _triangle_series,
+          'sawtooth': _sawtooth_series}
+
 class WaveGen():
-    def __init__(self, rate):
+    """
+    Generate waveforms by additive synthesis, either as a second of audio with
+    a given number of harmonics, or band-limited for any pitch from single
+    cycle wavetables with as many harmonics as fit under the nyquist
+    frequency, one per octave.
+
+    rate       Sample rate
+    tablesize  Samples in a single cycle wavetable
+    cachesize  Number of wavetables to keep around
+    """
+    def __init__(self, rate, tablesize=WAVETABLE_SIZE, cachesize=WAVETABLE_CACHE):
         self._rate = rate
-        self._harmonics = {}
+        self._tablesize = tablesize
+        self._cachesize = cachesize
+        self._tables = OrderedDict()
 
     def gen(self, harmonics):
-        wave = numpy.zeros(self._rate, dtype=numpy.float32)
+        """
+        Make a second of audio from harmonics.
 
-        for h in harmonics:
-            # try to cache results for reuse
-            if h[0] not in self._harmonics:
-                maxpt = numpy.pi * 2 * h[0]
-                points = numpy.arange(0, maxpt, maxpt / self._rate)
-                self._harmonics[h[0]] = numpy.sin(points, dtype=numpy.float32)
+        harmonics  Iterable of (frequency, amplitude, phase) where phase is a
+                   fraction of the second to delay the harmonic by
+        """
+        wave = numpy.zeros(self._rate, dtype=numpy.float32)
+        counts = numpy.arange(self._rate, dtype=numpy.float64)
+        # reused for each harmonic so only a few rows are ever allocated
+        angles = numpy.empty(self._rate, dtype=numpy.float64)
+        sines = numpy.empty(self._rate, dtype=numpy.float32)
 
-            split = int(self._rate * h[2])
+        for freq, amp, phase in harmonics:
+            numpy.multiply(counts, numpy.pi * 2 * freq / self._rate, out=angles)
+            numpy.sin(angles, out=sines, dtype=numpy.float32)
+            sines *= numpy.float32(amp)
+            # delay by the phase, wrapping the end around to the start
+            split = int(self._rate * phase) % self._rate
             remain = self._rate - split
-            wave[:split] += self._harmonics[h[0]][remain:] * h[1]
-            wave[split:] += self._harmonics[h[0]][:remain] * h[1]
+            wave[:split] += sines[remain:]
+            wave[split:] += sines[:remain]
 
         return wave
 
     def sine(self, freq):
-        return(self.gen(((freq, 1.0, 0.0),)))
+        return self._gen_series(_sine_series, 1, freq)
 
-    # information for these was found at:
-    # <https://pages.uoregon.edu/emi/9.php>
-    # but it's well-known stuff.
     def square(self, harmonics, freq):
-        # odd harmonics
-        # each 1/harmonic in amplitude
-        # all in phase
-        return self.gen(zip([x * freq for x in range(1, harmonics * 2 + 1, 2)],
-                            [1 / x for x in range(1, harmonics * 2 + 1, 2)],
-                            [0 for x in range(harmonics)]))
+        return self._gen_series(_square_series, harmonics, freq)
 
     def triangle(self, harmonics, freq):
-        # odd harmonics
-        # each 1/(harmonic ** 2) in amplitude
-        # every other harmonic is out of phase
-        return self.gen(zip([x * freq for x in range(1, harmonics * 2 + 1, 2)],
-                            [1 / (x ** 2) for x in range(1, harmonics * 2 + 1, 2)],
-                            [(x % 2) * 0.5 for x in range(harmonics)]))
+        return self._gen_series(_triangle_series, harmonics, freq)
 
     def sawtooth(self, harmonics, freq):
-        # all harmonics
-        # each 1/harmonic in amplitude
-        # odd harmonics are 180 deg out of phase
-        return self.gen(zip([x * freq for x in range(1, harmonics + 1)],
-                            [1 / x for x in range(1, harmonics + 1)],
-                            [(x % 2) * 0.5 for x in range(harmonics)]))
+        return self._gen_series(_sawtooth_series, harmonics, freq)
+
+    def _gen_series(self, series, harmonics, freq):
+        nums, amps, phases = series(harmonics)
+        return self.gen(zip([x * freq for x in nums], amps, phases))
+
+    def table(self, shape, freq):
+        """
+        Get a band-limited single cycle wavetable for playing a waveform at
+        freq.  Each octave gets its own table, with as many harmonics as fit
+        under the nyquist frequency at the top of the octave.  The returned
+        array is shared, so don't modify it.
+
+        shape  One of the names in SHAPES
+        freq   Frequency the table will be played at
+        """
+        if freq <= 0:
+            raise ValueError("Frequency must be positive, not {}.".format(freq))
+        octave = int(numpy.ceil(numpy.log2(freq)))
+        key = (shape, octave)
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key]
+
+        series = SHAPES[shape]
+        # harmonics which stay under nyquist at the top of the octave, and
+        # which the table has enough samples for
+        limit = min(int((self._rate / 2) // (2 ** octave)), self._tablesize // 2 - 1)
+        nums, amps, phases = series(max(limit, 1))
+        nums = numpy.array(nums)
+        keep = nums <= max(limit, 1)
+        nums = nums[keep]
+        # the whole table in one go as the inverse FFT of its spectrum
+        spectrum = numpy.zeros(self._tablesize // 2 + 1, dtype=numpy.complex128)
+        spectrum[nums] = (self._tablesize / 2) * -1j * \
+                         numpy.array(amps)[keep] * \
+                         numpy.exp(-2j * numpy.pi * numpy.array(phases)[keep])
+        wave = numpy.fft.irfft(spectrum, n=self._tablesize).astype(numpy.float32)
+        wave.flags.writeable = False
+
+        self._tables[key] = wave
+        if len(self._tables) > self._cachesize:
+            self._tables.popitem(last=False)
+        return wave
 
+    def wave(self, shape, freq, samples=None):
+        """
+        Make audio of a band-limited waveform at any frequency from its
+        wavetable.
 
+        shape    One of the names in SHAPES
+        freq     Frequency in Hz
+        samples  Number of samples to make, defaults to a second
+        """
+        if samples == None:
+            samples = self._rate
+        table = self.table(shape, freq)
+        size = len(table)
+        pos = numpy.arange(samples, dtype=numpy.float64) * (freq * size / self._rate)
+        pos %= size
+        index = pos.astype(int)
+        frac = (pos - index).astype(numpy.float32)
+        nextindex = index + 1
+        nextindex[nextindex == size] = 0
+        return table[index] + ((table[nextindex] - table[index]) * frac)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import lib.audio as audio
+import lib.waves as waves
+from test2 import load_audio, log_cb_return, DEFAULT_SEQ, SEQ_CACHE_DIR, \
+                  FILTER_CACHE_DIR, FILTER_WORKERS, WAVEFORM_HARMONICS
+
+DEFAULT_RATE = 48000
+# larger fragments mean fewer trips through the python frame callback
+DEFAULT_FRAGSIZE = 4096
+
+def make_renderer(rate=DEFAULT_RATE, fragsize=DEFAULT_FRAGSIZE,
+                  workers=FILTER_WORKERS):
+    """
+    Make an AudioSystem with no audio device and the buffers sequences expect,
+    ready to be passed to render().
+
+    workers  Processes to design uncached filter banks in
+    """
+    aud = audio.AudioSystem(log_cb_return, None, rate, 2,
+                            fragsize=fragsize, opendev=False)
+    return aud, load_audio(aud, WAVEFORM_HARMONICS, workers)
+
+def render(aud, buffers, seqname, wavname, maxsamples=None):
+    """
+    Render a sequence file to a WAV file.
+
+    returns the number of samples written, the time taken to load the sequence
+    and the time taken to render it in seconds.
+    """
+    macros = {"FILTER_SIZE": ((), str(waves.FILTER_TAPS)),
+              "FILTER_SLICES": ((), str(waves.SLICES))}
+
+    start = time.perf_counter()
+    with open(seqname, "r") as seqfile:
+        s = audio.AudioSequencer(seqfile, buffers, macros,
+                                 cachedir=SEQ_CACHE_DIR)
+    aud.add_sequence(s, enabled=True)
+    loaded = time.perf_counter()
+    try:
+        rendered = aud.render(wavname, maxsamples)
+    finally:
+        aud.del_sequence(s)
+
+    return rendered, loaded - start, time.perf_counter() - loaded
+
+def wav_name(seqname, outdir=None):
+    """
+    Get the WAV file name for a sequence file, optionally in another directory.
+    """
+    wavname = os.path.splitext(seqname)[0] + ".wav"
+    if outdir != None:
+        wavname = os.path.join(outdir, os.path.basename(wavname))
+    return wavname
+
+def print_result(wavname, seconds, loadtime, rendertime):
+    print("{}: {:.2f}s of audio, loaded in {:.3f}s, rendered in {:.3f}s, "
+          "{:.1f}x realtime".format(wavname, seconds, loadtime, rendertime,
+                                    seconds / rendertime))
+
+# renderer belonging to this process when it's a batch worker
+_worker = None
+
+def _init_worker(rate, fragsize):
+    global _worker
+    # the filter banks were cached before the workers started, but if that
+    # couldn't be done, don't have every worker start its own pool as well
+    _worker = make_renderer(rate, fragsize, workers=1)
+
+def _render_worker(seqname, wavname, maxseconds):
+    aud, buffers = _worker
+    maxsamples = None
+    if maxseconds != None:
+        maxsamples = int(maxseconds * aud.rate)
+    rendered, loadtime, rendertime = render(aud, buffers, seqname, wavname,
+                                            maxsamples)
+    return rendered / aud.rate, loadtime, rendertime
+
+def render_batch(seqnames, outdir=None, jobs=None,
+                 rate=DEFAULT_RATE, fragsize=DEFAULT_FRAGSIZE,
+                 maxseconds=None):
+    """
+    Render many sequence files to WAV files across a pool of worker processes,
+    each with its own headless synth.  Results are printed as they finish.
+
+    returns the total seconds of audio rendered, the wall time taken including
+    starting the workers, and the number of files which failed
+    """
+    total = 0.0
+    failed = 0
+    start = time.perf_counter()
+    # design any uncached filter banks once up front, instead of every worker
+    # designing them and racing to write the same cache files
+    for lowpass in (True, False):
+        waves.make_filter(rate, lowpass, cachedir=FILTER_CACHE_DIR,
+                          workers=FILTER_WORKERS)
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=_init_worker,
+                             initargs=(rate, fragsize)) as pool:
+        futures = dict()
+        for seqname in seqnames:
+            wavname = wav_name(seqname, outdir)
+            future = pool.submit(_render_worker, seqname, wavname, maxseconds)
+            futures[future] = wavname
+        for future in as_completed(futures):
+            wavname = futures[future]
+            try:
+                seconds, loadtime, rendertime = future.result()
+            except Exception as e:
+                print("{}: failed: {}".format(wavname, e))
+                failed += 1
+                continue
+            print_result(wavname, seconds, loadtime, rendertime)
+            total += seconds
+
+    return total, time.perf_counter() - start, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Render sequences to WAV files faster than realtime.")
+    parser.add_argument('seqnames', nargs='*', default=[DEFAULT_SEQ],
+                        help="sequence files to render")
+    parser.add_argument('-o', '--output',
+                        help="WAV file to write for a single sequence, defaults to the sequence name with .wav")
+    parser.add_argument('-d', '--outdir',
+                        help="directory to write WAV files to, defaults to next to each sequence")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="render in a pool of this many worker processes, defaults to one per CPU when given more than one sequence")
+    parser.add_argument('-r', '--rate', type=int, default=DEFAULT_RATE,
+                        help="sample rate")
+    parser.add_argument('-f', '--fragsize', type=int, default=DEFAULT_FRAGSIZE,
+                        help="samples generated per frame")
+    parser.add_argument('-m', '--max-seconds', type=float, default=None,
+                        help="stop after this many seconds of audio")
+    args = parser.parse_args()
+
+    if len(args.seqnames) > 1 or args.jobs != None:
+        if args.output != None:
+            parser.error("-o can only be used when rendering a single sequence")
+        total, wall, failed = render_batch(args.seqnames, args.outdir,
+                                           args.jobs, args.rate,
+                                           args.fragsize, args.max_seconds)
+        print("Rendered {} of {} files, {:.2f}s of audio in {:.2f}s, {:.2f} "
+              "audio seconds per wall second".format(len(args.seqnames) - failed,
+                                                     len(args.seqnames),
+                                                     total, wall,
+                                                     total / wall))
+        if failed > 0:
+            sys.exit(1)
+        return
+
+    seqname = args.seqnames[0]
+    wavname = args.output
+    if wavname == None:
+        wavname = wav_name(seqname, args.outdir)
+
+    aud, buffers = make_renderer(args.rate, args.fragsize)
+    maxsamples = None
+    if args.max_seconds != None:
+        maxsamples = int(args.max_seconds * aud.rate)
+
+    rendered, loadtime, rendertime = render(aud, buffers, seqname, wavname,
+                                            maxsamples)
+    print_result(wavname, rendered / aud.rate, loadtime, rendertime)
+
+if __name__ == "__main__":
+    main()
@@ -19,9 +19,21 @@
 
 #include <stdlib.h>
 #include <string.h>
+#include <limits.h>
 #include <math.h>
 #include <SDL.h>
 
+/* streamed buffers need to be able to map the file and read it as it's
+ * stored, otherwise they're just loaded in full */
+#if (defined(__unix__) || defined(__APPLE__)) && \
+    SDL_BYTEORDER == SDL_LIL_ENDIAN
+#define SYNTH_STREAM_MMAP
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#endif
+
 #include "synth.h"
 
 #define DEFAULT_RATE (48000)
@@ -33,9 +45,39 @@
 
 #define MIN(X, Y) (((X) < (Y)) ? (X) : (Y))
 
+/* filters with fewer taps than this are always convolved directly */
+#define FILTER_FFT_MIN_SIZE (32)
+/* or more, so the cached kernel spectra don't get too big */
+#define FILTER_FFT_MAX_SIZE (8192)
+/* smallest FFT block, in samples */
+#define FILTER_FFT_MIN_PART (16)
+/* number of kernel spectra each filter keeps around */
+#define FILTER_FFT_SPECTRA (4)
+/* roughly how many direct convolution multiply-adds one FFT butterfly costs,
+ * for deciding whether a block is long enough to be worth transforming */
+#define FILTER_FFT_COST (5)
+
+/* samples of a streamed buffer each player converts at a time */
+#define STREAM_WINDOW (16384)
+/* most samples a player reads from its input at a time, the size of the
+ * scratch buffer they're read in to */
+#define PLAYER_CHUNK (16384)
+/* samples kept behind the read position when moving the window along */
+#define STREAM_BEHIND (256)
+
+#define WAVE_FORMAT_PCM (0x0001)
+#define WAVE_FORMAT_IEEE_FLOAT (0x0003)
+#define WAVE_FORMAT_EXTENSIBLE (0xFFFE)
+
 typedef struct {
-    float *idxbuf;
+    Uint8 *map;
+    size_t mapLen;
+    /* start of the WAV data chunk in the map */
+    const Uint8 *samples;
+    SynthImportType type;
+} SynthBufferStream;
 
+typedef struct {
     float *data;
     unsigned int size;
     unsigned int ref;
@@ -43,9 +85,20 @@ typedef struct {
     /* for getting both parts of an output channel buffer */
     int getPart;
 
+    /* set for buffers streamed from a file, which have no data until
+     * they're used some way other than played through once */
+    SynthBufferStream *stream;
+    /* set for U8 and S16 buffers kept in their own format, which have no
+     * data until they're used some way other than as a player's input */
+    void *native;
+    SynthImportType nativeType;
+
     char *name;
 } SynthBuffer;
 
+#define BUFFER_IN_USE(BUF) \
+    ((BUF).data != NULL || (BUF).stream != NULL || (BUF).native != NULL)
+
 typedef struct {
     unsigned int inUse;
 
@@ -83,9 +136,52 @@ typedef struct {
     unsigned int speedBuffer;
     unsigned int speedPos;
 
+    /* window of a streamed input buffer converted ahead of inPos */
+    float *stream;
+    unsigned int streamStart;
+    unsigned int streamLen;
+
     char *name;
 } SynthPlayer;
 
+typedef struct {
+    unsigned int buffer;
+    unsigned int offset;
+    unsigned int lastUse;
+    int valid;
+    /* copy of the kernel, to notice if the buffer was written to */
+    float *kernel;
+    /* parts * (part + 1) complex values */
+    float *spectra;
+} SynthFilterSpectrum;
+
+/* State for convolving blocks of samples which all use the same kernel with
+ * uniformly partitioned FFT convolution.  The kernel is split in to parts
+ * of part samples, and each block of up to part input samples is convolved
+ * with each of them using real FFTs of twice the part size.  The results are
+ * overlap-added in to the filter's accumulation buffer, the same as the
+ * direct convolution does, so the two can take turns at any sample. */
+typedef struct {
+    unsigned int part;
+    unsigned int parts;
+    /* fewest samples worth doing a block for */
+    unsigned int min;
+    unsigned int use;
+    /* complex FFT of part points, twiddles and bit reversal table */
+    float *twiddle;
+    unsigned int *bitrev;
+    /* twiddles for getting a real FFT of part * 2 points out of it */
+    float *split;
+    /* part * 2 samples */
+    float *time;
+    /* part + 1 complex values each */
+    float *inSpec;
+    float *work;
+    /* part + filter size samples of output being accumulated */
+    float *out;
+    SynthFilterSpectrum spectra[FILTER_FFT_SPECTRA];
+} SynthFilterFFT;
+
 typedef struct {
     unsigned int size;
     float *accum;
@@ -111,6 +207,9 @@ typedef struct {
     unsigned int volBuffer;
     unsigned int volPos;
 
+    int useFFT;
+    SynthFilterFFT *fft;
+
     char *name;
 } SynthFilter;
 
@@ -136,6 +235,10 @@ struct Synth_s {
 
     SDL_AudioCVT U8toF32;
     SDL_AudioCVT S16toF32;
+    /* keep U8 and S16 buffers in their own format */
+    int nativeBuffers;
+    /* samples read by players before volume is applied */
+    float *playerScratch;
 
     SynthBuffer *buffer;
     unsigned int buffersmem;
@@ -151,6 +254,13 @@ struct Synth_s {
     unsigned int written;
     Uint8 *outbuf;
 
+    /* mirror of the most recently generated samples, each channel is tapsize
+     * samples written twice over so any tapsamples long window is contiguous */
+    float *tap;
+    unsigned int tapsize;
+    unsigned int tapsamples;
+    SDL_atomic_t tapcount;
+
     log_cb_return_t log_cb;
     void *log_priv;
 };
@@ -238,10 +348,17 @@ int synth_buffer_from_wav(Synth *s,
 }
 
 #define PRINT_BUFFER_STATS(BUF) \
-    if((BUF).data != NULL) { \
+    if(BUFFER_IN_USE(BUF)) { \
         LOG_PRINTF(s, " Name: %s\n", (BUF).name); \
     } \
     LOG_PRINTF(s, " Size: %u\n", (BUF).size); \
+    if((BUF).stream != NULL) { \
+        LOG_PRINTF(s, " Streamed\n"); \
+    } \
+    if((BUF).native != NULL) { \
+        LOG_PRINTF(s, " Native Format: %s\n", \
+                   (BUF).nativeType == SYNTH_TYPE_U8 ? "U8" : "S16"); \
+    } \
     LOG_PRINTF(s, " Refcount: %u\n", (BUF).ref);
 
 #define PRINT_OUTPUT_OPERATION(OUTOP) \
@@ -340,6 +457,14 @@ int synth_buffer_from_wav(Synth *s,
     LOG_PRINTF(s, " Output Buffer: %u\n", (FLT).outBuffer); \
     LOG_PRINTF(s, " Output Buffer Position: %u\n", (FLT).outPos); \
     PRINT_OUTPUT_OPERATION((FLT).outOp) \
+    if((FLT).fft != NULL) { \
+        LOG_PRINTF(s, " FFT: %s\n", (FLT).useFFT ? "Enabled" : "Disabled"); \
+        LOG_PRINTF(s, " FFT Part Size: %u\n", (FLT).fft->part); \
+        LOG_PRINTF(s, " FFT Parts: %u\n", (FLT).fft->parts); \
+        LOG_PRINTF(s, " FFT Minimum Block: %u\n", (FLT).fft->min); \
+    } else { \
+        LOG_PRINTF(s, " FFT: Unavailable\n"); \
+    } \
     LOG_PRINTF(s, " Volume Mode: "); \
     PRINT_AUTO_MODE((FLT).volMode) \
     LOG_PRINTF(s, " Volume: %f\n", (FLT).vol); \
@@ -385,7 +510,7 @@ void synth_print_full_stats(Synth *s) {
     }
     LOG_PRINTF(s, "Buffers Memory: %u\n", s->buffersmem);
     for(i = 0; i < s->buffersmem; i++) {
-        if(s->buffer[i].data != NULL) {
+        if(BUFFER_IN_USE(s->buffer[i])) {
             LOG_PRINTF(s, "Buffer %u (%u):\n", i, i + s->channels);
             PRINT_BUFFER_STATS(s->buffer[i]);
         }
@@ -426,7 +551,46 @@ unsigned int synth_get_samples_needed(Synth *s) {
     }
 }
 
+static void tap_samples(Synth *s, unsigned int added) {
+    unsigned int skip = 0;
+    unsigned int count = (unsigned int)SDL_AtomicGet(&(s->tapcount));
+    unsigned int src, dst, todo, part, i;
+    float *tap;
+
+    /* only the last tapsize samples of a big chunk would survive anyway */
+    if(added > s->tapsize) {
+        skip = added - s->tapsize;
+    }
+
+    for(i = 0; i < s->channels; i++) {
+        tap = &(s->tap[i * s->tapsize * 2]);
+        src = (s->writecursor + skip) % s->buffersize;
+        dst = (count + skip) & (s->tapsize - 1);
+        todo = added - skip;
+        while(todo > 0) {
+            part = MIN(todo, MIN(s->buffersize - src, s->tapsize - dst));
+            memcpy(&(tap[dst]), &(s->channelbuffer[i].data[src]),
+                   part * sizeof(float));
+            memcpy(&(tap[dst + s->tapsize]), &(s->channelbuffer[i].data[src]),
+                   part * sizeof(float));
+            todo -= part;
+            src += part;
+            if(src == s->buffersize) {
+                src = 0;
+            }
+            dst = (dst + part) & (s->tapsize - 1);
+        }
+    }
+
+    /* make the samples visible before the count which says they're there */
+    SDL_MemoryBarrierRelease();
+    SDL_AtomicAdd(&(s->tapcount), (int)added);
+}
+
 static void add_samples(Synth *s, unsigned int added) {
+    if(s->tap != NULL && added > 0) {
+        tap_samples(s, added);
+    }
     s->writecursor += added;
     if(s->writecursor >= s->buffersize) {
         s->writecursor -= s->buffersize;
@@ -437,7 +601,8 @@ static void add_samples(Synth *s, unsigned int added) {
 unsigned int synth_samples_available(Synth *s) {
     if(s->readcursor == s->writecursor) {
         if(s->bufferfilled == s->buffersize) {
-            return(s->buffersize);
+            /* only up to the end of the buffer is contiguous */
+            return(s->buffersize - s->readcursor);
         } else {
             return(0);
         }
@@ -652,6 +817,12 @@ Synth *synth_new(const char *filename,
     s->log_priv = log_priv;
     s->audiodev = 0;
 
+    s->playerScratch = malloc(PLAYER_CHUNK * sizeof(float));
+    if(s->playerScratch == NULL) {
+        LOG_PRINTF(s, "Failed to allocate player scratch buffer.\n");
+        goto error;
+    }
+
     desired.format = synth_audioformat_from_type(format);
     if(desired.format == 0) {
         LOG_PRINTF(s, "Invalid SynthImportType.\n");
@@ -731,14 +902,12 @@ Synth *synth_new(const char *filename,
         goto error;
     }
 
-    if(filename != NULL) {
-        if(synth_open_wav(s, filename) < 0) {
-            goto error;
-        }
-    }
-
     s->out = NULL;
     s->outbuf = NULL;
+    s->tap = NULL;
+    s->tapsize = 0;
+    s->tapsamples = 0;
+    SDL_AtomicSet(&(s->tapcount), 0);
     s->rate = obtained.freq;
     s->fragmentsize = obtained.samples;
     s->fragments = 0;
@@ -749,6 +918,7 @@ Synth *synth_new(const char *filename,
     s->reffedchannels = 0;
     s->buffer = NULL;
     s->buffersmem = 0;
+    s->nativeBuffers = 0;
     s->player = NULL;
     s->playersmem = 0;
     s->filter = NULL;
@@ -758,12 +928,20 @@ Synth *synth_new(const char *filename,
     s->synth_frame_cb = synth_frame_cb;
     s->synth_frame_priv = synth_frame_priv;
 
+    /* open the file once everything it depends on has been initialized */
+    if(filename != NULL) {
+        if(synth_open_wav(s, filename) < 0) {
+            goto error;
+        }
+    }
+
     return(s);
 error:
     if(audiodev_is_open(s)) {
         SDL_CloseAudioDevice(s->audiodev);
     }
 
+    free(s->playerScratch);
     free(s);
 
     return(NULL);
@@ -809,6 +987,11 @@ void synth_free(Synth *s) {
         free(s->outbuf);
     }
 
+    if(s->tap != NULL) {
+        free(s->tap);
+    }
+
+    free(s->playerScratch);
     free(s);
 }
 
@@ -817,8 +1000,10 @@ static int allocate_outbuf(Synth *s) {
 
     if(s->fragments == 0) {
         LOG_PRINTF(s, "Fragments must be set first.\n");
-        fclose(s->out);
-        s->out = NULL;
+        if(s->out != NULL) {
+            fclose(s->out);
+            s->out = NULL;
+        }
         return(-1);
     }
 
@@ -840,8 +1025,10 @@ static int allocate_outbuf(Synth *s) {
     s->outbuf = malloc(s->channels * formatbytes * s->fragments * s->fragmentsize);
     if(s->outbuf == NULL) {
         LOG_PRINTF(s, "Failed to allocate file output buffer.\n");
-        fclose(s->out);
-        s->out = NULL;
+        if(s->out != NULL) {
+            fclose(s->out);
+            s->out = NULL;
+        }
         return(-1);
     }
 
@@ -942,15 +1129,16 @@ int synth_open_wav(Synth *s, const char *filename) {
     WAVE_WRITE_FIELD(WAVE_data);
     WAVE_WRITE_FIELD_PTR(RIFF_INIT_SIZE);
 
-    if(!audiodev_is_open(s)) {
+    s->written = 0;
+    s->out = out;
+
+    /* the buffer may still be around from setting fragments */
+    if(!audiodev_is_open(s) && s->outbuf == NULL) {
         if(allocate_outbuf(s) < 0) {
             return(-1);
         }
     }
 
-    s->written = 0;
-    s->out = out;
-
     return(0);
 
 error:
@@ -1022,12 +1210,30 @@ error:
 #undef WAVE_WRITE_FIELD
 
 int synth_write_wav(Synth *s, unsigned int samples) {
-    do_synth_audio_cb(s, s->outbuf, samples);
-    /* file will be closed on error */
+    unsigned int todo;
+
     if(s->out == NULL) {
+        LOG_PRINTF(s, "No WAV file open.\n");
         return(-1);
     }
 
+    /* the samples may wrap around the end of the buffer, so write them out
+     * in contiguous pieces */
+    while(samples > 0) {
+        todo = MIN(samples, synth_samples_available(s));
+        if(todo == 0) {
+            LOG_PRINTF(s, "Not enough samples buffered to write.\n");
+            return(-1);
+        }
+
+        do_synth_audio_cb(s, s->outbuf, todo);
+        /* file will be closed on error */
+        if(s->out == NULL) {
+            return(-1);
+        }
+        samples -= todo;
+    }
+
     return(0);
 }
 
@@ -1113,6 +1319,69 @@ int synth_frame(Synth *s) {
     return(got);
 }
 
+int synth_set_tap(Synth *s, unsigned int samples) {
+    unsigned int size;
+    float *tap = NULL;
+
+    if(samples > 0) {
+        if(samples > (UINT_MAX / 8) / s->channels) {
+            LOG_PRINTF(s, "Tap size too large.\n");
+            return(-1);
+        }
+        /* at least twice as big as a snapshot so a reader has a whole
+         * snapshot's worth of generated samples before it's overwritten, and
+         * a power of 2 so the wrapping count can find the position */
+        for(size = 1; size < samples * 2; size *= 2);
+        tap = calloc(size * 2 * s->channels, sizeof(float));
+        if(tap == NULL) {
+            LOG_PRINTF(s, "Failed to allocate tap.\n");
+            return(-1);
+        }
+    } else {
+        size = 0;
+    }
+
+    lock_audiodev(s);
+
+    if(s->tap != NULL) {
+        free(s->tap);
+    }
+    s->tap = tap;
+    s->tapsize = size;
+    s->tapsamples = samples;
+    SDL_AtomicSet(&(s->tapcount), 0);
+
+    unlock_audiodev(s);
+
+    return(0);
+}
+
+unsigned int synth_get_tap(Synth *s,
+                           float **buf,
+                           unsigned int *stride,
+                           unsigned int *count) {
+    unsigned int c;
+
+    if(s->tap == NULL) {
+        *buf = NULL;
+        *stride = 0;
+        *count = 0;
+        return(0);
+    }
+
+    c = (unsigned int)SDL_AtomicGet(&(s->tapcount));
+    SDL_MemoryBarrierAcquire();
+    *buf = &(s->tap[(c - s->tapsamples) & (s->tapsize - 1)]);
+    *stride = s->tapsize * 2;
+    *count = c;
+
+    return(s->tapsamples);
+}
+
+unsigned int synth_get_tap_count(Synth *s) {
+    return((unsigned int)SDL_AtomicGet(&(s->tapcount)));
+}
+
 void synth_invalidate_buffers(Synth *s) {
     lock_audiodev(s);
 
@@ -1216,42 +1485,78 @@ error:
     return(-1);
 }
 
+static unsigned int sample_bytes(SynthImportType type) {
+    switch(type) {
+        case SYNTH_TYPE_U8:
+            return(sizeof(Uint8));
+        case SYNTH_TYPE_S16:
+            return(sizeof(Sint16));
+        case SYNTH_TYPE_F32:
+            return(sizeof(float));
+        default: /* F64 */
+            return(sizeof(double));
+    }
+}
+
+static void convert_samples(Synth *s,
+                            float *out,
+                            SynthImportType type,
+                            const void *data,
+                            unsigned int size) {
+    unsigned int i;
+
+    if(type == SYNTH_TYPE_U8) {
+        memcpy(out, data, size * sizeof(Uint8));
+        s->U8toF32.buf = (Uint8 *)out;
+        s->U8toF32.len = size;
+        SDL_ConvertAudio(&(s->U8toF32));
+    } else if(type == SYNTH_TYPE_S16) {
+        memcpy(out, data, size * sizeof(Sint16));
+        s->S16toF32.buf = (Uint8 *)out;
+        s->S16toF32.len = size * sizeof(Sint16);
+        SDL_ConvertAudio(&(s->S16toF32));
+    } else if(type == SYNTH_TYPE_F32) {
+        memcpy(out, data, size * sizeof(float));
+    } else { /* F64 */
+        /* SDL has no conversion facilities to accept F64, so just do
+         * a cast of each value in a loop and hope it goes OK. */
+        for(i = 0; i < size; i++) {
+            out[i] = (float)(((double *)data)[i]);
+        }
+    }
+}
+
 static int init_buffer(Synth *s,
                        SynthBuffer *b,
                        SynthImportType type,
                        void *data,
                        unsigned int size,
                        const char *name) {
-    unsigned int i;
-
     b->size = size;
-    b->data = malloc(size * sizeof(float));
-    if(b->data == NULL) {
-        LOG_PRINTF(s, "%s: Failed to allocate buffer data memory.\n", name);
-        return(-1);
-    }
-    if(data != NULL) {
-        if(type == SYNTH_TYPE_U8) {
-            memcpy(b->data, data, size * sizeof(Uint8));
-            s->U8toF32.buf = (Uint8 *)b->data;
-            s->U8toF32.len = size;
-            SDL_ConvertAudio(&(s->U8toF32));
-        } else if(type == SYNTH_TYPE_S16) {
-            memcpy(b->data, data, size * sizeof(Sint16));
-            s->S16toF32.buf = (Uint8 *)b->data;
-            s->S16toF32.len = size * sizeof(Sint16);
-            SDL_ConvertAudio(&(s->S16toF32));
-        } else if(type == SYNTH_TYPE_F32) {
-            memcpy(b->data, data, size * sizeof(float));
-        } else { /* F64 */
-            /* SDL has no conversion facilities to accept F64, so just do
-             * a cast of each value in a loop and hope it goes OK. */
-            for(i = 0; i < size; i++) {
-                b->data[i] = (float)(((double *)data)[i]);
-            }
+    b->stream = NULL;
+    b->native = NULL;
+    if(data != NULL && s->nativeBuffers &&
+       (type == SYNTH_TYPE_U8 || type == SYNTH_TYPE_S16)) {
+        /* converted by players as they read it */
+        b->data = NULL;
+        b->native = malloc(size * sample_bytes(type));
+        if(b->native == NULL) {
+            LOG_PRINTF(s, "%s: Failed to allocate buffer data memory.\n", name);
+            return(-1);
         }
+        memcpy(b->native, data, size * sample_bytes(type));
+        b->nativeType = type;
     } else {
-        memset(b->data, 0, size * sizeof(float));
+        b->data = malloc(size * sizeof(float));
+        if(b->data == NULL) {
+            LOG_PRINTF(s, "%s: Failed to allocate buffer data memory.\n", name);
+            return(-1);
+        }
+        if(data != NULL) {
+            convert_samples(s, b->data, type, data, size);
+        } else {
+            memset(b->data, 0, size * sizeof(float));
+        }
     }
     b->ref = 0;
     b->getPart = 0;
@@ -1263,13 +1568,6 @@ static int init_buffer(Synth *s,
     }
     strncpy(b->name, name, namelen);
 
-    b->idxbuf = malloc(size * sizeof(float));
-    if(b->idxbuf == NULL) {
-        LOG_PRINTF(s, "%s: Couldn't allocate index buffer.\n", name);
-        free(b->data);
-        return(-1);
-    }
-
     return(0);
 }
 
@@ -1285,8 +1583,8 @@ static int is_valid_buffer(Synth *s, unsigned int index, int input) {
     }
 
     index -= s->channels;
-    if(index > s->buffersmem ||
-       s->buffer[index].data == NULL) {
+    if(index >= s->buffersmem ||
+       !BUFFER_IN_USE(s->buffer[index])) {
         LOG_PRINTF(s, "Invalid buffer index.\n");
         return(0);
     }
@@ -1318,14 +1616,6 @@ static const char *get_buffer_name(Synth *s, unsigned int index) {
     return(s->buffer[index - s->channels].name);
 }
 
-static float *get_buffer_idxbuf(Synth *s, unsigned int index) {
-    if(index < s->channels) {
-        return(NULL);
-    }
-
-    return(s->buffer[index - s->channels].idxbuf);
-}
-
 static void add_buffer_ref(Synth *s, unsigned int index) {
     if(index >= s->channels) {
         s->buffer[index - s->channels].ref++;
@@ -1350,35 +1640,18 @@ static unsigned int get_buffer_ref(Synth *s, unsigned int index) {
     return(s->buffer[index - s->channels].ref);
 }
 
-int synth_add_buffer(Synth *s,
-                     SynthImportType type,
-                     void *data,
-                     unsigned int size,
-                     const char *name) {
+static void free_buffer_stream(SynthBufferStream *stream) {
+#ifdef SYNTH_STREAM_MMAP
+    munmap(stream->map, stream->mapLen);
+#endif
+    free(stream);
+}
+
+/* find a free buffer slot, making more if there's none */
+static int new_buffer_slot(Synth *s, const char *name) {
     unsigned int i, j;
     SynthBuffer *temp;
 
-    if(name == NULL) {
-        name = NONAME;
-    }
-
-    switch(type) {
-        case SYNTH_TYPE_U8:
-        case SYNTH_TYPE_S16:
-        case SYNTH_TYPE_F32:
-        case SYNTH_TYPE_F64:
-            break;
-        default:
-            LOG_PRINTF(s, "%s: Invalid buffer type.\n", name);
-            return(-1);
-    }
-
-    /* so loop start and loop end can have valid values. */
-    if(size < 2) {
-        LOG_PRINTF(s, "%s: Buffer size too small, must be at least 2 samples long.\n", name);
-        return(-1);
-    }
-
     /* first loaded buffer, so do some initial setup */
     if(s->buffersmem == 0) {
         s->buffer = malloc(sizeof(SynthBuffer));
@@ -1387,22 +1660,17 @@ int synth_add_buffer(Synth *s,
             return(-1);
         }
         s->buffersmem = 1;
+        s->buffer[0].data = NULL;
+        s->buffer[0].stream = NULL;
+        s->buffer[0].native = NULL;
 
-        if(init_buffer(s, &(s->buffer[0]), type, data, size, name) < 0) {
-            return(-1);
-        }
-
-        return(s->channels);
+        return(0);
     }
 
     /* find first NULL buffer and assign it */
     for(i = 0; i < s->buffersmem; i++) {
-        if(s->buffer[i].data == NULL) {
-            if(init_buffer(s, &(s->buffer[i]), type, data, size, name) < 0) {
-                return(-1);
-            }
-
-            return(s->channels + i);
+        if(BUFFER_IN_USE(s->buffer[i]) == 0) {
+            return(i);
         }
     }
 
@@ -1419,13 +1687,51 @@ int synth_add_buffer(Synth *s,
     /* initialize empty excess buffers as empty */
     for(j = item; j < s->buffersmem; j++) {
         s->buffer[j].data = NULL;
+        s->buffer[j].stream = NULL;
+        s->buffer[j].native = NULL;
+    }
+
+    return(item);
+}
+
+int synth_add_buffer(Synth *s,
+                     SynthImportType type,
+                     void *data,
+                     unsigned int size,
+                     const char *name) {
+    int slot;
+
+    if(name == NULL) {
+        name = NONAME;
+    }
+
+    switch(type) {
+        case SYNTH_TYPE_U8:
+        case SYNTH_TYPE_S16:
+        case SYNTH_TYPE_F32:
+        case SYNTH_TYPE_F64:
+            break;
+        default:
+            LOG_PRINTF(s, "%s: Invalid buffer type.\n", name);
+            return(-1);
+    }
+
+    /* so loop start and loop end can have valid values. */
+    if(size < 2) {
+        LOG_PRINTF(s, "%s: Buffer size too small, must be at least 2 samples long.\n", name);
+        return(-1);
+    }
+
+    slot = new_buffer_slot(s, name);
+    if(slot < 0) {
+        return(-1);
     }
 
-    if(init_buffer(s, &(s->buffer[item]), type, data, size, name) < 0) {
+    if(init_buffer(s, &(s->buffer[slot]), type, data, size, name) < 0) {
         return(-1);
     }
 
-    return(s->channels + item);
+    return(s->channels + slot);
 }
 
 int synth_free_buffer(Synth *s, unsigned int index) {
@@ -1437,71 +1743,401 @@ int synth_free_buffer(Synth *s, unsigned int index) {
         return(-1);
     }
     free(s->buffer[index - s->channels].data);
-    free(s->buffer[index - s->channels].idxbuf);
     free(s->buffer[index - s->channels].name);
     s->buffer[index - s->channels].data = NULL;
+    if(s->buffer[index - s->channels].stream != NULL) {
+        free_buffer_stream(s->buffer[index - s->channels].stream);
+        s->buffer[index - s->channels].stream = NULL;
+    }
+    free(s->buffer[index - s->channels].native);
+    s->buffer[index - s->channels].native = NULL;
 
     return(0);
 }
 
-int synth_buffer_get_size(Synth *s, unsigned int index) {
-    if(!is_valid_buffer(s, index, 0)) {
-        return(-1);
-    }
-
-    return(get_buffer_size(s, index));
+#ifdef SYNTH_STREAM_MMAP
+static Uint16 read_le16(const Uint8 *p) {
+    return(p[0] | (p[1] << 8));
 }
 
-int synth_get_internal_buffer(Synth *s, unsigned int index, float **buf) {
-    SynthBuffer *b;
+static Uint32 read_le32(const Uint8 *p) {
+    return(p[0] | (p[1] << 8) | (p[2] << 16) | ((Uint32)p[3] << 24));
+}
 
-    if(index < s->channels) {
-        if(!(s->reffedchannels) && audiodev_is_open(s)) {
-            SDL_LockAudioDevice(s->audiodev);
-        }
-        s->reffedchannels &= 1 << index;
-        b = &(s->channelbuffer[index]);
-        if(b->getPart == 0) {
-            b->getPart = 1;
-            if(s->readcursor == s->writecursor) {
-                if(s->bufferfilled == s->buffersize) {
-                    *buf = &(b->data[s->readcursor]);
-                    return(s->buffersize - s->readcursor);
-                } else {
-                    *buf = NULL;
-                    return(0);
-                }
-            } else if(s->readcursor < s->writecursor) {
-                *buf = &(b->data[s->readcursor]);
-                return(s->writecursor - s->readcursor);
-            } /* s->readcursor > s->writecursor */
-            *buf = &(b->data[s->readcursor]);
-            return(s->buffersize - s->readcursor);
-        }
+/* map a WAV file and find its samples, if they're stored in a way which can
+ * be converted straight from the file */
+static SynthBufferStream *map_wav(Synth *s,
+                                  const char *filename,
+                                  unsigned int *size,
+                                  unsigned int *rate,
+                                  const char *name) {
+    int fd;
+    struct stat st;
+    Uint8 *map;
+    size_t pos;
+    size_t datalen;
+    Uint32 chunklen = 0;
+    int havefmt = 0;
+    Uint16 format = 0;
+    Uint16 channels = 0;
+    Uint16 bits = 0;
+    Uint32 freq = 0;
+    SynthImportType type;
+    SynthBufferStream *stream;
 
-        b->getPart = 0;
-        if(s->readcursor == s->writecursor) {
-            if(s->bufferfilled == s->buffersize) {
-                *buf = b->data;
-                return(s->writecursor);
-            } else {
-                *buf = NULL;
-                return(0);
-            }
-        } else if(s->readcursor < s->writecursor) {
-            *buf = NULL;
-            return(0);
-        } /* s->readcursor > s->writecursor */
-        *buf = b->data;
-        return(s->writecursor);
+    fd = open(filename, O_RDONLY);
+    if(fd < 0) {
+        return(NULL);
     }
-
-    index -= s->channels;
-    if(index > s->buffersmem ||
-       s->buffer[index].data == NULL) {
-        LOG_PRINTF(s, "Invalid buffer index.\n");
-        *buf = NULL;
-        return(-1);
+    if(fstat(fd, &st) < 0 || st.st_size < 12) {
+        close(fd);
+        return(NULL);
+    }
+    map = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if(map == MAP_FAILED) {
+        return(NULL);
+    }
+
+    if(memcmp(map, "RIFF", 4) != 0 ||
+       memcmp(&(map[8]), "WAVE", 4) != 0) {
+        goto error;
+    }
+
+    for(pos = 12;
+        pos + 8 <= (size_t)st.st_size;
+        pos += 8 + chunklen + (chunklen & 1)) {
+        chunklen = read_le32(&(map[pos + 4]));
+        if(memcmp(&(map[pos]), "fmt ", 4) == 0) {
+            if(chunklen < 16 ||
+               pos + 8 + chunklen > (size_t)st.st_size) {
+                goto error;
+            }
+            format = read_le16(&(map[pos + 8]));
+            channels = read_le16(&(map[pos + 10]));
+            freq = read_le32(&(map[pos + 12]));
+            bits = read_le16(&(map[pos + 22]));
+            if(format == WAVE_FORMAT_EXTENSIBLE) {
+                if(chunklen < 40) {
+                    goto error;
+                }
+                /* the format is the start of the subformat GUID */
+                format = read_le16(&(map[pos + 32]));
+            }
+            havefmt = 1;
+        } else if(memcmp(&(map[pos]), "data", 4) == 0) {
+            break;
+        }
+    }
+    if(!havefmt || pos + 8 > (size_t)st.st_size) {
+        goto error;
+    }
+
+    /* leave anything else for the full loader to complain about */
+    if(channels != 1) {
+        goto error;
+    }
+    if(format == WAVE_FORMAT_PCM && bits == 8) {
+        type = SYNTH_TYPE_U8;
+    } else if(format == WAVE_FORMAT_PCM && bits == 16) {
+        type = SYNTH_TYPE_S16;
+    } else if(format == WAVE_FORMAT_IEEE_FLOAT && bits == 32) {
+        type = SYNTH_TYPE_F32;
+    } else {
+        goto error;
+    }
+
+    /* a truncated file just has fewer samples */
+    datalen = MIN((size_t)chunklen, (size_t)st.st_size - pos - 8);
+    datalen /= bits / 8;
+    if(datalen < 2 || datalen > UINT_MAX) {
+        goto error;
+    }
+
+    stream = malloc(sizeof(SynthBufferStream));
+    if(stream == NULL) {
+        LOG_PRINTF(s, "%s: Failed to allocate stream memory.\n", name);
+        goto error;
+    }
+    stream->map = map;
+    stream->mapLen = st.st_size;
+    stream->samples = &(map[pos + 8]);
+    stream->type = type;
+    madvise(map, st.st_size, MADV_SEQUENTIAL);
+
+    *size = datalen;
+    *rate = freq;
+    return(stream);
+
+error:
+    munmap(map, st.st_size);
+    return(NULL);
+}
+#endif
+
+int synth_buffer_stream_wav(Synth *s,
+                            const char *filename,
+                            unsigned int *rate,
+                            const char *name) {
+#ifdef SYNTH_STREAM_MMAP
+    SynthBufferStream *stream;
+    SynthBuffer *b;
+    unsigned int size;
+    unsigned int freq;
+    int slot;
+
+    if(name == NULL) {
+        name = filename;
+    }
+
+    stream = map_wav(s, filename, &size, &freq, name);
+    if(stream == NULL) {
+        LOG_PRINTF(s, "%s: Can't stream WAV file, loading it in full.\n", name);
+        return(synth_buffer_from_wav(s, filename, rate, name));
+    }
+
+    slot = new_buffer_slot(s, name);
+    if(slot < 0) {
+        free_buffer_stream(stream);
+        return(-1);
+    }
+    b = &(s->buffer[slot]);
+
+    unsigned int namelen = strlen(name) + 1;
+    b->name = malloc(namelen);
+    if(b->name == NULL) {
+        LOG_PRINTF(s, "Failed to allocate memory for name for buffer %s.\n", name);
+        free_buffer_stream(stream);
+        return(-1);
+    }
+    strncpy(b->name, name, namelen);
+
+    b->data = NULL;
+    b->size = size;
+    b->ref = 0;
+    b->getPart = 0;
+    b->stream = stream;
+
+    if(rate != NULL) {
+        *rate = freq;
+    }
+
+    return(s->channels + slot);
+#else
+    return(synth_buffer_from_wav(s, filename, rate, name));
+#endif
+}
+
+/* load all of a streamed buffer, for when it's used some way which needs
+ * more than a window of it at a time, after which it's like any other buffer,
+ * and convert a native format buffer to float if needFloat is set.  If it's
+ * only going to be read by players and native buffers are enabled, a streamed
+ * buffer can stay in its own format.  The new samples are made first and only
+ * swapped in, with the audio device locked if lock is set, so the conversion
+ * itself never holds up the audio callback. */
+static int make_full_buffer(Synth *s,
+                            unsigned int index,
+                            int needFloat,
+                            int lock) {
+    SynthBuffer *b;
+    SynthBufferStream *stream;
+    float *data = NULL;
+    void *native = NULL;
+
+    if(index < s->channels) {
+        return(0);
+    }
+    b = &(s->buffer[index - s->channels]);
+    stream = b->stream;
+
+    if(stream != NULL) {
+        LOG_PRINTF(s, "%s: Loading streamed buffer in full for random access.\n", b->name);
+        if(!needFloat && s->nativeBuffers &&
+           (stream->type == SYNTH_TYPE_U8 || stream->type == SYNTH_TYPE_S16)) {
+            native = malloc(b->size * sample_bytes(stream->type));
+            if(native == NULL) {
+                LOG_PRINTF(s, "%s: Failed to allocate buffer data memory.\n", b->name);
+                return(-1);
+            }
+            memcpy(native, stream->samples, b->size * sample_bytes(stream->type));
+        } else {
+            data = malloc(b->size * sizeof(float));
+            if(data == NULL) {
+                LOG_PRINTF(s, "%s: Failed to allocate buffer data memory.\n", b->name);
+                return(-1);
+            }
+            convert_samples(s, data, stream->type, stream->samples, b->size);
+        }
+    } else if(needFloat && b->native != NULL) {
+        LOG_PRINTF(s, "%s: Converting native format buffer to float.\n", b->name);
+        data = malloc(b->size * sizeof(float));
+        if(data == NULL) {
+            LOG_PRINTF(s, "%s: Failed to allocate buffer data memory.\n", b->name);
+            return(-1);
+        }
+        convert_samples(s, data, b->nativeType, b->native, b->size);
+    } else {
+        return(0);
+    }
+
+    if(lock) {
+        lock_audiodev(s);
+    }
+    if(stream != NULL) {
+        b->stream = NULL;
+        if(native != NULL) {
+            b->native = native;
+            b->nativeType = stream->type;
+        }
+    } else {
+        free(b->native);
+        b->native = NULL;
+    }
+    if(data != NULL) {
+        b->data = data;
+    }
+    if(lock) {
+        unlock_audiodev(s);
+    }
+    if(stream != NULL) {
+        free_buffer_stream(stream);
+    }
+
+    return(0);
+}
+
+static int load_stream_fully(Synth *s, unsigned int index, int needFloat) {
+    return(make_full_buffer(s, index, needFloat, 0));
+}
+
+/* make sure a buffer has float data, for anything besides players reading
+ * their input */
+static int use_float_buffer(Synth *s, unsigned int index) {
+    return(make_full_buffer(s, index, 1, 0));
+}
+
+int synth_buffer_load_fully(Synth *s, unsigned int index, int playerOnly) {
+    if(!is_valid_buffer(s, index, 0)) {
+        return(-1);
+    }
+
+    return(make_full_buffer(s, index, !playerOnly, 1));
+}
+
+/* get a buffer's samples however they're stored, float unless it's a buffer
+ * kept in its own format */
+static const void *get_buffer_samples(Synth *s,
+                                      unsigned int index,
+                                      SynthImportType *type) {
+    if(index >= s->channels &&
+       s->buffer[index - s->channels].native != NULL) {
+        *type = s->buffer[index - s->channels].nativeType;
+        return(s->buffer[index - s->channels].native);
+    }
+
+    *type = SYNTH_TYPE_F32;
+    return(get_buffer_data(s, index));
+}
+
+int synth_set_native_buffers(Synth *s, int enabled) {
+    s->nativeBuffers = !!enabled;
+
+    return(0);
+}
+
+int synth_buffer_get_memory(Synth *s, unsigned int index) {
+    SynthBuffer *b;
+
+    if(!is_valid_buffer(s, index, 0)) {
+        return(-1);
+    }
+    /* output buffers belong to the synth */
+    if(index < s->channels) {
+        return(0);
+    }
+    b = &(s->buffer[index - s->channels]);
+
+    if(b->stream != NULL) {
+        /* the file's mapped and the window belongs to each player */
+        return(0);
+    } else if(b->native != NULL) {
+        return(b->size * sample_bytes(b->nativeType));
+    }
+    return(b->size * sizeof(float));
+}
+
+int synth_buffer_is_streamed(Synth *s, unsigned int index) {
+    if(!is_valid_buffer(s, index, 0)) {
+        return(-1);
+    }
+    if(index < s->channels) {
+        return(0);
+    }
+
+    return(s->buffer[index - s->channels].stream != NULL);
+}
+
+int synth_buffer_get_size(Synth *s, unsigned int index) {
+    if(!is_valid_buffer(s, index, 0)) {
+        return(-1);
+    }
+
+    return(get_buffer_size(s, index));
+}
+
+int synth_get_internal_buffer(Synth *s, unsigned int index, float **buf) {
+    SynthBuffer *b;
+
+    if(index < s->channels) {
+        if(!(s->reffedchannels) && audiodev_is_open(s)) {
+            SDL_LockAudioDevice(s->audiodev);
+        }
+        s->reffedchannels &= 1 << index;
+        b = &(s->channelbuffer[index]);
+        if(b->getPart == 0) {
+            b->getPart = 1;
+            if(s->readcursor == s->writecursor) {
+                if(s->bufferfilled == s->buffersize) {
+                    *buf = &(b->data[s->readcursor]);
+                    return(s->buffersize - s->readcursor);
+                } else {
+                    *buf = NULL;
+                    return(0);
+                }
+            } else if(s->readcursor < s->writecursor) {
+                *buf = &(b->data[s->readcursor]);
+                return(s->writecursor - s->readcursor);
+            } /* s->readcursor > s->writecursor */
+            *buf = &(b->data[s->readcursor]);
+            return(s->buffersize - s->readcursor);
+        }
+
+        b->getPart = 0;
+        if(s->readcursor == s->writecursor) {
+            if(s->bufferfilled == s->buffersize) {
+                *buf = b->data;
+                return(s->writecursor);
+            } else {
+                *buf = NULL;
+                return(0);
+            }
+        } else if(s->readcursor < s->writecursor) {
+            *buf = NULL;
+            return(0);
+        } /* s->readcursor > s->writecursor */
+        *buf = b->data;
+        return(s->writecursor);
+    }
+
+    if(index - s->channels >= s->buffersmem ||
+       !BUFFER_IN_USE(s->buffer[index - s->channels])) {
+        LOG_PRINTF(s, "Invalid buffer index.\n");
+        *buf = NULL;
+        return(-1);
+    }
+    if(use_float_buffer(s, index) < 0) {
+        *buf = NULL;
+        return(-1);
     }
 
     add_buffer_ref(s, index);
@@ -1518,9 +2154,8 @@ int synth_release_buffer(Synth *s, unsigned int index) {
         return(0);
     }
 
-    index -= s->channels;
-    if(index > s->buffersmem ||
-       s->buffer[index].data == NULL) {
+    if(index - s->channels >= s->buffersmem ||
+       !BUFFER_IN_USE(s->buffer[index - s->channels])) {
         LOG_PRINTF(s, "Invalid buffer index.\n");
         return(-1);
     }
@@ -1539,6 +2174,9 @@ int synth_silence_buffer(Synth *s,
     if(!is_valid_buffer(s, index, 0)) {
         return(-1);
     }
+    if(use_float_buffer(s, index) < 0) {
+        return(-1);
+    }
     o = get_buffer_data(s, index);
     os = get_buffer_size(s, index);
 
@@ -1554,6 +2192,24 @@ int synth_silence_buffer(Synth *s,
     return(0);
 }
 
+/* players of streamed buffers need their own window of converted samples */
+static int init_player_stream(Synth *s, SynthPlayer *p) {
+    p->streamLen = 0;
+    if(p->inBuffer < s->channels ||
+       s->buffer[p->inBuffer - s->channels].stream == NULL ||
+       p->stream != NULL) {
+        return(0);
+    }
+
+    p->stream = malloc(STREAM_WINDOW * sizeof(float));
+    if(p->stream == NULL) {
+        LOG_PRINTF(s, "%s: Failed to allocate stream window memory.\n", p->name);
+        return(-1);
+    }
+
+    return(0);
+}
+
 static int init_player(Synth *s,
                         SynthPlayer *p,
                         unsigned int inBuffer,
@@ -1596,6 +2252,7 @@ static int init_player(Synth *s,
     p->speedBuffer = inBuffer; /* same */
     add_buffer_ref(s, inBuffer);
     p->speedPos = 0;
+    p->stream = NULL;
 
     unsigned int namelen = strlen(name) + 1;
     p->name = malloc(namelen);
@@ -1605,6 +2262,10 @@ static int init_player(Synth *s,
     }
     strncpy(p->name, name, namelen);
 
+    if(init_player_stream(s, p) < 0) {
+        return(-1);
+    }
+
     return(0);
 }
 
@@ -1690,6 +2351,8 @@ int synth_free_player(Synth *s, unsigned int index) {
     free_buffer_ref(s, p->startBuffer);
     free_buffer_ref(s, p->lengthBuffer);
     free_buffer_ref(s, p->speedBuffer);
+    free(p->stream);
+    p->stream = NULL;
     free(p->name);
     p->inUse = 0;
 
@@ -1711,6 +2374,9 @@ int synth_set_player_input_buffer(Synth *s,
         p->inBuffer = inBuffer;
         add_buffer_ref(s, inBuffer);
     }
+    if(init_player_stream(s, p) < 0) {
+        return(-1);
+    }
     p->inPos = 0.0;
     p->loopStart = 0;
     p->loopLength = get_buffer_size(s, inBuffer);
@@ -2156,23 +2822,174 @@ int synth_set_player_speed_source(Synth *s,
     return(0);
 }
 
-static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
-                                        float *o, int outPos,
-                                        unsigned int todo) {
+int synth_set_player_params(Synth *s,
+                            unsigned int index,
+                            const SynthParam *params,
+                            unsigned int count) {
+    unsigned int i;
+    int ret = 0;
+
+    lock_audiodev(s);
+
+    for(i = 0; i < count; i++) {
+        switch(params[i].param) {
+            case SYNTH_PLAYER_INPUT_BUFFER:
+                ret = synth_set_player_input_buffer(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_INPUT_BUFFER_POS:
+                ret = synth_set_player_input_buffer_pos(s, index, params[i].val.f);
+                break;
+            case SYNTH_PLAYER_OUTPUT_BUFFER:
+                ret = synth_set_player_output_buffer(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_OUTPUT_BUFFER_POS:
+                ret = synth_set_player_output_buffer_pos(s, index, params[i].val.i);
+                break;
+            case SYNTH_PLAYER_OUTPUT_MODE:
+                ret = synth_set_player_output_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_PLAYER_VOLUME_MODE:
+                ret = synth_set_player_volume_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_PLAYER_VOLUME:
+                ret = synth_set_player_volume(s, index, params[i].val.f);
+                break;
+            case SYNTH_PLAYER_VOLUME_SOURCE:
+                ret = synth_set_player_volume_source(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_MODE:
+                ret = synth_set_player_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_PLAYER_LOOP_START:
+                ret = synth_set_player_loop_start(s, index, params[i].val.i);
+                break;
+            case SYNTH_PLAYER_LOOP_LENGTH:
+                ret = synth_set_player_loop_length(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_START_SOURCE:
+                ret = synth_set_player_start_source(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_START_VALUES:
+                ret = synth_set_player_start_values(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_START_GRANULARITY:
+                ret = synth_set_player_start_granularity(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_START_MODE:
+                ret = synth_set_player_start_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_PLAYER_LENGTH_SOURCE:
+                ret = synth_set_player_length_source(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_LENGTH_VALUES:
+                ret = synth_set_player_length_values(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_LENGTH_GRANULARITY:
+                ret = synth_set_player_length_granularity(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_LENGTH_MODE:
+                ret = synth_set_player_length_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_PLAYER_PHASE_SOURCE:
+                ret = synth_set_player_phase_source(s, index, params[i].val.u);
+                break;
+            case SYNTH_PLAYER_SPEED_MODE:
+                ret = synth_set_player_speed_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_PLAYER_SPEED:
+                ret = synth_set_player_speed(s, index, params[i].val.f);
+                break;
+            case SYNTH_PLAYER_SPEED_SOURCE:
+                ret = synth_set_player_speed_source(s, index, params[i].val.u);
+                break;
+            default:
+                LOG_PRINTF(s, "Invalid player parameter %d.\n", params[i].param);
+                ret = -1;
+        }
+        if(ret < 0) {
+            break;
+        }
+    }
+
+    unlock_audiodev(s);
+
+    return(i);
+}
+
+static int player_streams_input(Synth *s, SynthPlayer *pl) {
+    return(pl->inBuffer >= s->channels &&
+           s->buffer[pl->inBuffer - s->channels].stream != NULL);
+}
+
+/* make sure the window of a streamed input buffer covers inPos, keeping most
+ * of it ahead in the direction the player is going.
+ * returns 0 if inPos is outside of the buffer */
+static int fill_player_stream(Synth *s, SynthPlayer *pl) {
+    SynthBuffer *b = &(s->buffer[pl->inBuffer - s->channels]);
+    int pos = (int)pl->inPos;
+    unsigned int start;
+
+    if(pos < 0 || (unsigned int)pos >= b->size) {
+        return(0);
+    }
+    if(pl->streamLen > 0 &&
+       (unsigned int)pos >= pl->streamStart &&
+       (unsigned int)pos < pl->streamStart + pl->streamLen) {
+        return(1);
+    }
+
+    if(pl->speed < 0.0) {
+        start = pos + STREAM_BEHIND + 1;
+        start = start > STREAM_WINDOW ? start - STREAM_WINDOW : 0;
+    } else {
+        start = pos > STREAM_BEHIND ? pos - STREAM_BEHIND : 0;
+    }
+    if(start + STREAM_WINDOW > b->size) {
+        start = b->size > STREAM_WINDOW ? b->size - STREAM_WINDOW : 0;
+    }
+    pl->streamStart = start;
+    pl->streamLen = MIN(STREAM_WINDOW, b->size - start);
+
+    convert_samples(s, pl->stream, b->stream->type,
+                    &(b->stream->samples[start * sample_bytes(b->stream->type)]),
+                    pl->streamLen);
+
+    return(1);
+}
+
+/* convert a sample from how an input buffer stores it, the same way SDL
+ * converts whole buffers to float */
+SDL_FORCE_INLINE float read_sample(const void *i,
+                                   SynthImportType type,
+                                   int pos) {
+    if(type == SYNTH_TYPE_S16) {
+        return(((const Sint16 *)i)[pos] * (1.0f / 32768.0f));
+    } else if(type == SYNTH_TYPE_U8) {
+        return((((const Uint8 *)i)[pos] * (1.0f / 128.0f)) - 1.0f);
+    }
+    return(((const float *)i)[pos]);
+}
+
+/* fill idx with samples from the player's input buffer, returning how many.
+ * Always inlined so each type of input gets its own copy which doesn't have
+ * to check the type for every sample. */
+SDL_FORCE_INLINE unsigned int gather_player_input(Synth *syn,
+                                                  SynthPlayer *pl,
+                                                  const void *i,
+                                                  SynthImportType type,
+                                                  int inStart, int inEnd,
+                                                  float *idx,
+                                                  unsigned int todo) {
     unsigned int samples;
     unsigned int t;
-    float vol = pl->volume;
-    float *i = get_buffer_data(syn, pl->inBuffer);
-    float *idx = get_buffer_idxbuf(syn, pl->inBuffer);
 
     /* TODO actual player logic */
     if(pl->mode == SYNTH_MODE_ONCE &&
        pl->speedMode == SYNTH_AUTO_CONSTANT) {
         float inPos = pl->inPos;
         float speed = pl->speed;
-        int inSize = get_buffer_size(syn, pl->inBuffer);
-        for(t = 0; t < todo && (int)inPos >= 0 && (int)inPos < inSize; t++) {
-            idx[t] = i[(int)inPos];
+        for(t = 0; t < todo && (int)inPos >= inStart && (int)inPos < inEnd; t++) {
+            idx[t] = read_sample(i, type, (int)inPos - inStart);
             inPos += speed;
         }
         todo = t;
@@ -2184,18 +3001,17 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
         int speedPos = pl->speedPos;
         float speed = pl->speed;
         todo = MIN(todo, get_buffer_size(syn, pl->speedBuffer) - speedPos);
-        int inSize = get_buffer_size(syn, pl->inBuffer);
-        for(t = 0; t < todo && (int)inPos >= 0 && (int)inPos < inSize; t++) {
-            idx[t] = i[(int)inPos];
+        for(t = 0; t < todo && (int)inPos >= inStart && (int)inPos < inEnd; t++) {
+            idx[t] = read_sample(i, type, (int)inPos - inStart);
             inPos += speed * powf(2, s[speedPos + t]);
         }
         todo = t;
         pl->inPos = inPos;
-        speedPos += t;
+        pl->speedPos = speedPos + t;
     } else if(pl->mode == SYNTH_MODE_LOOP &&
               pl->speedMode == SYNTH_AUTO_CONSTANT) {
         float inPos = pl->inPos - pl->loopStart;
-        i = &(i[pl->loopStart]);
+        int base = pl->loopStart;
         unsigned int max = get_buffer_size(syn, pl->inBuffer) - pl->loopStart;
         float speed = pl->speed;
         if(pl->startMode == SYNTH_AUTO_CONSTANT) {
@@ -2203,7 +3019,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                 float loopLen = pl->loopLength;
                 for(samples = 0; samples < todo; samples++) {
                     inPos = fabsf(fmodf(inPos, loopLen));
-                    idx[samples] = i[(int)inPos];
+                    idx[samples] = read_sample(i, type, base + (int)inPos);
                     inPos += speed;
                 }
             } else {
@@ -2214,7 +3030,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                 for(samples = 0; samples < todo; samples++) {
                     len = pl->loopLength + (ll[lengthPos] * pl->lengthValues * pl->lengthGranularity);
                     inPos = fabsf(fmodf(inPos, len));
-                    idx[samples] = i[(int)inPos % max];
+                    idx[samples] = read_sample(i, type, base + (int)inPos % max);
                     inPos += speed;
                     lengthPos++;
                 }
@@ -2230,7 +3046,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                 for(samples = 0; samples < todo; samples++) {
                     loopStart = ls[startPos] * pl->startValues * pl->startGranularity;
                     inPos = fabsf(fmodf(inPos, loopLen));
-                    idx[samples] = i[((int)inPos + loopStart) % max];
+                    idx[samples] = read_sample(i, type, base + ((int)inPos + loopStart) % max);
                     inPos += speed;
                     startPos++;
                 }
@@ -2243,7 +3059,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                     len = pl->loopLength + (ll[lengthPos] * pl->lengthValues * pl->lengthGranularity);
                     loopStart = fabsf(ls[startPos]) * pl->startValues * pl->startGranularity;
                     inPos = fabsf(fmodf(inPos, len));
-                    idx[samples] = i[((int)inPos + loopStart) % max];
+                    idx[samples] = read_sample(i, type, base + ((int)inPos + loopStart) % max);
                     inPos += speed;
                     startPos++;
                     lengthPos++;
@@ -2257,7 +3073,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
               pl->speedMode == SYNTH_AUTO_SOURCE) {
         float *s = get_buffer_data(syn, pl->speedBuffer);
         float inPos = pl->inPos - pl->loopStart;
-        i = &(i[pl->loopStart]);
+        int base = pl->loopStart;
         unsigned int max = get_buffer_size(syn, pl->inBuffer) - pl->loopStart;
         int speedPos = pl->speedPos;
         float speed = pl->speed;
@@ -2267,7 +3083,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                 float loopLen = pl->loopLength;
                 for(samples = 0; samples < todo; samples++) {
                     inPos = fabsf(fmodf(inPos, loopLen));
-                    idx[samples] = i[(int)inPos];
+                    idx[samples] = read_sample(i, type, base + (int)inPos);
                     inPos += speed * powf(2, s[speedPos]);
                     speedPos++;
                 }
@@ -2279,7 +3095,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                 for(samples = 0; samples < todo; samples++) {
                     len = pl->loopLength + (ll[lengthPos] * pl->lengthValues * pl->lengthGranularity);
                     inPos = fabsf(fmodf(inPos, len));
-                    idx[samples] = i[(int)inPos % max];
+                    idx[samples] = read_sample(i, type, base + (int)inPos % max);
                     inPos += speed * powf(2, s[speedPos]);
                     speedPos++;
                     lengthPos++;
@@ -2296,7 +3112,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                 for(samples = 0; samples < todo; samples++) {
                     loopStart = pl->loopStart + (ls[startPos] * pl->startValues * pl->startGranularity);
                     inPos = fabsf(fmodf(inPos, loopLen));
-                    idx[samples] = i[((int)inPos + loopStart) % max];
+                    idx[samples] = read_sample(i, type, base + ((int)inPos + loopStart) % max);
                     inPos += speed * powf(2, s[speedPos]);
                     speedPos++;
                     startPos++;
@@ -2310,7 +3126,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                     loopStart = pl->loopStart + (fabsf(ls[startPos]) * pl->startValues * pl->startGranularity);
                     len = pl->loopLength + (fabsf(ll[lengthPos]) * pl->lengthValues * pl->lengthGranularity);
                     inPos = fabsf(fmodf(inPos, len));
-                    idx[samples] = i[((int)inPos + loopStart) % max];
+                    idx[samples] = read_sample(i, type, base + ((int)inPos + loopStart) % max);
                     inPos += speed * powf(2, s[speedPos]);
                     speedPos++;
                     lengthPos++;
@@ -2331,7 +3147,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
             if(pl->lengthMode == SYNTH_AUTO_CONSTANT) {
                 for(samples = 0; samples < todo; samples++) {
                     idx[samples] =
-                        i[abs((int)(p[phasePos] * pl->loopLength) + (int)(pl->loopStart)) % max];
+                        read_sample(i, type, abs((int)(p[phasePos] * pl->loopLength) + (int)(pl->loopStart)) % max);
                     phasePos++;
                 }
             } else {
@@ -2342,7 +3158,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                 for(samples = 0; samples < todo; samples++) {
                     len = pl->loopLength + (fabsf(ll[lengthPos]) * pl->lengthValues * pl->lengthGranularity);
                     idx[samples] =
-                        i[abs((int)(p[phasePos] * len) + (int)(pl->loopStart)) % max];
+                        read_sample(i, type, abs((int)(p[phasePos] * len) + (int)(pl->loopStart)) % max);
                     phasePos++;
                     lengthPos++;
                 }
@@ -2357,7 +3173,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                 for(samples = 0; samples < todo; samples++) {
                     loopStart = pl->loopStart + (fabsf(ls[startPos]) * pl->startValues * pl->startGranularity);
                     idx[samples] =
-                        i[abs((int)(p[phasePos] * pl->loopLength) + loopStart) % max];
+                        read_sample(i, type, abs((int)(p[phasePos] * pl->loopLength) + loopStart) % max);
                     phasePos++;
                     startPos++;
                 }
@@ -2370,7 +3186,7 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
                     loopStart = pl->loopStart + (fabsf(ls[startPos]) * pl->startValues * pl->startGranularity);
                     len = pl->loopLength + (fabsf(ll[lengthPos]) * pl->lengthValues * pl->lengthGranularity);
                     idx[samples] =
-                        i[abs((int)(p[phasePos] * len) + loopStart) % max];
+                        read_sample(i, type, abs((int)(p[phasePos] * len) + loopStart) % max);
                     phasePos++;
                     startPos++;
                     lengthPos++;
@@ -2382,6 +3198,41 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
         pl->phasePos = phasePos;
     }
 
+
+    return(todo);
+}
+
+static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
+                                        float *o, int outPos,
+                                        unsigned int todo) {
+    unsigned int samples;
+    float vol = pl->volume;
+    SynthImportType type;
+    const void *i = get_buffer_samples(syn, pl->inBuffer, &type);
+    float *idx = syn->playerScratch;
+    /* the part of the input buffer in i, only a window of it if it's
+     * streamed */
+    int inStart = 0;
+    int inEnd = get_buffer_size(syn, pl->inBuffer);
+
+    if(player_streams_input(syn, pl)) {
+        i = pl->stream;
+        type = SYNTH_TYPE_F32;
+        inStart = pl->streamStart;
+        inEnd = pl->streamStart + pl->streamLen;
+    }
+
+    if(type == SYNTH_TYPE_S16) {
+        todo = gather_player_input(syn, pl, i, SYNTH_TYPE_S16,
+                                   inStart, inEnd, idx, todo);
+    } else if(type == SYNTH_TYPE_U8) {
+        todo = gather_player_input(syn, pl, i, SYNTH_TYPE_U8,
+                                   inStart, inEnd, idx, todo);
+    } else {
+        todo = gather_player_input(syn, pl, i, SYNTH_TYPE_F32,
+                                   inStart, inEnd, idx, todo);
+    }
+
     if(pl->volMode == SYNTH_AUTO_CONSTANT &&
        pl->outOp == SYNTH_OUTPUT_REPLACE) {
         for(samples = 0; samples < todo; samples++) {
@@ -2417,6 +3268,74 @@ static unsigned int do_synth_run_player(Synth *syn, SynthPlayer *pl,
     return(todo);
 }
 
+/* run a player at most PLAYER_CHUNK samples at a time so its input fits in
+ * the scratch buffer, moving the window of a streamed input buffer along as
+ * it goes */
+static unsigned int run_player_chunks(Synth *syn, SynthPlayer *pl,
+                                      float *o, int outPos,
+                                      unsigned int todo) {
+    unsigned int done = 0;
+    unsigned int want, got;
+    unsigned int pos;
+    int streamed = player_streams_input(syn, pl);
+
+    while(done < todo) {
+        if(streamed && !fill_player_stream(syn, pl)) {
+            break;
+        }
+        want = MIN(todo - done, PLAYER_CHUNK);
+        got = do_synth_run_player(syn, pl, o, outPos + done, want);
+        done += got;
+        if(got < want) {
+            if(!streamed) {
+                break;
+            }
+            pos = (unsigned int)pl->inPos;
+            /* stopped for some reason other than reaching the end of the
+             * window */
+            if(pl->inPos >= 0.0 &&
+               pos >= pl->streamStart &&
+               pos < pl->streamStart + pl->streamLen) {
+                break;
+            }
+        }
+    }
+
+    return(done);
+}
+
+/* streamed buffers can only be played through once, anything else needs
+ * the whole buffer */
+static int load_player_buffers(Synth *s, SynthPlayer *p) {
+    if(p->mode != SYNTH_MODE_ONCE) {
+        if(load_stream_fully(s, p->inBuffer, 0) < 0) {
+            return(-1);
+        }
+        if(p->startMode == SYNTH_AUTO_SOURCE &&
+           use_float_buffer(s, p->startBuffer) < 0) {
+            return(-1);
+        }
+        if(p->lengthMode == SYNTH_AUTO_SOURCE &&
+           use_float_buffer(s, p->lengthBuffer) < 0) {
+            return(-1);
+        }
+        if(p->mode == SYNTH_MODE_PHASE_SOURCE &&
+           use_float_buffer(s, p->phaseBuffer) < 0) {
+            return(-1);
+        }
+    }
+    if(p->speedMode == SYNTH_AUTO_SOURCE &&
+       use_float_buffer(s, p->speedBuffer) < 0) {
+        return(-1);
+    }
+    if(p->volMode == SYNTH_AUTO_SOURCE &&
+       use_float_buffer(s, p->volBuffer) < 0) {
+        return(-1);
+    }
+
+    return(use_float_buffer(s, p->outBuffer));
+}
+
 int synth_run_player(Synth *s,
                      unsigned int index,
                      unsigned int reqSamples) {
@@ -2427,6 +3346,9 @@ int synth_run_player(Synth *s,
     if(p == NULL) {
         return(-1);
     }
+    if(load_player_buffers(s, p) < 0) {
+        return(-1);
+    }
 
     float *o = get_buffer_data(s, p->outBuffer);
 
@@ -2441,21 +3363,22 @@ int synth_run_player(Synth *s,
 
         if(outPos + todo >= s->buffersize) {
             /* if it would go past the end, split it in to 2 calls */
-            samples = do_synth_run_player(s, p, o, outPos,
+            samples = run_player_chunks(s, p, o, outPos,
                                           s->buffersize - outPos);
             todo -= samples;
             /* if there's more to do, try updating the pointer and trying
              * again. */
             if(todo > 0) {
-                samples += do_synth_run_player(s, p, o, 0, todo);
+                samples += run_player_chunks(s, p, o, 0, todo);
             }
         } else {
-            samples = do_synth_run_player(s, p, o, outPos, todo);
+            samples = run_player_chunks(s, p, o, outPos, todo);
         }
     } else {
-        samples = do_synth_run_player(s, p, o, outPos, todo);
+        samples = run_player_chunks(s, p, o, outPos, todo);
     }
-    p->outPos = outPos + samples;
+    /* keep the position relative to the write cursor for output buffers */
+    p->outPos += samples;
 
     return(samples);
 }
@@ -2558,6 +3481,273 @@ int synth_player_stopped_reason(Synth *syn,
     return(reason);
 }
 
+/* FFT Convolution */
+
+/* in place complex FFT of n interleaved complex values, n being a power of 2,
+ * inverse isn't scaled */
+static void fft_complex(float *data,
+                        unsigned int n,
+                        const float *twiddle,
+                        const unsigned int *bitrev,
+                        int inverse) {
+    unsigned int i, j, k, len, half, step;
+    float tr, ti, wr, wi;
+    float *a, *b;
+
+    for(i = 0; i < n; i++) {
+        j = bitrev[i];
+        if(j > i) {
+            tr = data[i * 2];
+            ti = data[i * 2 + 1];
+            data[i * 2] = data[j * 2];
+            data[i * 2 + 1] = data[j * 2 + 1];
+            data[j * 2] = tr;
+            data[j * 2 + 1] = ti;
+        }
+    }
+
+    for(len = 2; len <= n; len *= 2) {
+        half = len / 2;
+        step = n / len;
+        for(k = 0; k < half; k++) {
+            wr = twiddle[k * step * 2];
+            wi = twiddle[k * step * 2 + 1];
+            if(inverse) {
+                wi = -wi;
+            }
+            for(i = k; i < n; i += len) {
+                a = &(data[i * 2]);
+                b = &(data[(i + half) * 2]);
+                tr = b[0] * wr - b[1] * wi;
+                ti = b[0] * wi + b[1] * wr;
+                b[0] = a[0] - tr;
+                b[1] = a[1] - ti;
+                a[0] += tr;
+                a[1] += ti;
+            }
+        }
+    }
+}
+
+/* FFT of part * 2 real samples in time, which get clobbered, to part + 1
+ * complex values in spec, using a complex FFT of half the size */
+static void fft_real_forward(SynthFilterFFT *fft, float *time, float *spec) {
+    unsigned int n = fft->part;
+    unsigned int k;
+    float zr, zi, cr, ci, er, ei, orr, oi, wr, wi;
+
+    fft_complex(time, n, fft->twiddle, fft->bitrev, 0);
+
+    spec[0] = time[0] + time[1];
+    spec[1] = 0.0;
+    spec[n * 2] = time[0] - time[1];
+    spec[n * 2 + 1] = 0.0;
+    for(k = 1; k < n; k++) {
+        zr = time[k * 2];
+        zi = time[k * 2 + 1];
+        cr = time[(n - k) * 2];
+        ci = -time[(n - k) * 2 + 1];
+        /* even and odd sample spectra */
+        er = (zr + cr) * 0.5;
+        ei = (zi + ci) * 0.5;
+        orr = (zi - ci) * 0.5;
+        oi = (cr - zr) * 0.5;
+        wr = fft->split[k * 2];
+        wi = fft->split[k * 2 + 1];
+        spec[k * 2] = er + orr * wr - oi * wi;
+        spec[k * 2 + 1] = ei + orr * wi + oi * wr;
+    }
+}
+
+/* the inverse of fft_real_forward, scaled up by part * 2 */
+static void fft_real_inverse(SynthFilterFFT *fft, const float *spec, float *time) {
+    unsigned int n = fft->part;
+    unsigned int k;
+    float xr, xi, cr, ci, er, ei, dr, di, orr, oi, wr, wi;
+
+    for(k = 0; k < n; k++) {
+        xr = spec[k * 2];
+        xi = spec[k * 2 + 1];
+        cr = spec[(n - k) * 2];
+        ci = -spec[(n - k) * 2 + 1];
+        er = xr + cr;
+        ei = xi + ci;
+        dr = xr - cr;
+        di = xi - ci;
+        wr = fft->split[k * 2];
+        wi = -fft->split[k * 2 + 1];
+        orr = dr * wr - di * wi;
+        oi = dr * wi + di * wr;
+        time[k * 2] = er - oi;
+        time[k * 2 + 1] = ei + orr;
+    }
+
+    fft_complex(time, n, fft->twiddle, fft->bitrev, 1);
+}
+
+static void free_filter_fft(SynthFilterFFT *fft) {
+    unsigned int i;
+
+    if(fft == NULL) {
+        return;
+    }
+
+    for(i = 0; i < FILTER_FFT_SPECTRA; i++) {
+        free(fft->spectra[i].kernel);
+        free(fft->spectra[i].spectra);
+    }
+    free(fft->out);
+    free(fft->work);
+    free(fft->inSpec);
+    free(fft->time);
+    free(fft->split);
+    free(fft->bitrev);
+    free(fft->twiddle);
+    free(fft);
+}
+
+/* returns NULL if the filter isn't worth convolving with FFTs or there's no
+ * memory for it, in which case it'll just always be convolved directly */
+static SynthFilterFFT *new_filter_fft(Synth *s,
+                                      unsigned int size,
+                                      const char *name) {
+    SynthFilterFFT *fft;
+    unsigned int part, bits, i, j;
+    unsigned int butterflies, cost;
+
+    if(size < FILTER_FFT_MIN_SIZE || size > FILTER_FFT_MAX_SIZE) {
+        return(NULL);
+    }
+
+    /* blocks can't be any longer than a part, and usually no more than a
+     * fragment is asked for at a time */
+    part = FILTER_FFT_MIN_PART;
+    while(part < size && part * 2 <= s->fragmentsize) {
+        part *= 2;
+    }
+    for(bits = 0; (1u << bits) < part; bits++);
+
+    fft = malloc(sizeof(SynthFilterFFT));
+    if(fft == NULL) {
+        LOG_PRINTF(s, "%s: Failed to allocate FFT state, filter will be convolved directly.\n", name);
+        return(NULL);
+    }
+    memset(fft, 0, sizeof(SynthFilterFFT));
+    fft->part = part;
+    fft->parts = (size + part - 1) / part;
+
+    /* a block costs a forward and an inverse per part, plus the spectrum
+     * multiplies, and direct convolution costs a multiply-add per tap */
+    butterflies = (part / 2 * bits) + part;
+    cost = (FILTER_FFT_COST * (butterflies * (fft->parts + 1) +
+                               (part + 1) * 2 * fft->parts)) +
+           size + part;
+    fft->min = (cost + size - 1) / size;
+    if(fft->min > part) {
+        free(fft);
+        return(NULL);
+    }
+
+    fft->twiddle = malloc(sizeof(float) * part);
+    fft->bitrev = malloc(sizeof(unsigned int) * part);
+    fft->split = malloc(sizeof(float) * part * 2);
+    fft->time = malloc(sizeof(float) * part * 2);
+    fft->inSpec = malloc(sizeof(float) * (part + 1) * 2);
+    fft->work = malloc(sizeof(float) * (part + 1) * 2);
+    fft->out = malloc(sizeof(float) * (size + part));
+    if(fft->twiddle == NULL ||
+       fft->bitrev == NULL ||
+       fft->split == NULL ||
+       fft->time == NULL ||
+       fft->inSpec == NULL ||
+       fft->work == NULL ||
+       fft->out == NULL) {
+        LOG_PRINTF(s, "%s: Failed to allocate FFT buffers, filter will be convolved directly.\n", name);
+        free_filter_fft(fft);
+        return(NULL);
+    }
+    for(i = 0; i < FILTER_FFT_SPECTRA; i++) {
+        fft->spectra[i].kernel = malloc(sizeof(float) * size);
+        fft->spectra[i].spectra = malloc(sizeof(float) * (part + 1) * 2 * fft->parts);
+        if(fft->spectra[i].kernel == NULL ||
+           fft->spectra[i].spectra == NULL) {
+            LOG_PRINTF(s, "%s: Failed to allocate FFT spectra, filter will be convolved directly.\n", name);
+            free_filter_fft(fft);
+            return(NULL);
+        }
+    }
+
+    for(i = 0; i < part / 2; i++) {
+        fft->twiddle[i * 2] = cos(-2.0 * M_PI * i / part);
+        fft->twiddle[i * 2 + 1] = sin(-2.0 * M_PI * i / part);
+    }
+    for(i = 0; i < part; i++) {
+        fft->split[i * 2] = cos(-M_PI * i / part);
+        fft->split[i * 2 + 1] = sin(-M_PI * i / part);
+        fft->bitrev[i] = 0;
+        for(j = 0; j < bits; j++) {
+            if(i & (1u << j)) {
+                fft->bitrev[i] |= 1u << (bits - j - 1);
+            }
+        }
+    }
+
+    return(fft);
+}
+
+/* get the spectra of the parts of a kernel, transforming it if it's not one
+ * of the recently used ones */
+static const float *get_filter_spectra(SynthFilter *flt,
+                                       unsigned int offset,
+                                       const float *kernel) {
+    SynthFilterFFT *fft = flt->fft;
+    SynthFilterSpectrum *spec = NULL;
+    unsigned int i, j, p, len;
+    float scale;
+
+    fft->use++;
+    for(i = 0; i < FILTER_FFT_SPECTRA; i++) {
+        if(fft->spectra[i].valid &&
+           fft->spectra[i].buffer == flt->filterBuffer &&
+           fft->spectra[i].offset == offset &&
+           memcmp(fft->spectra[i].kernel, kernel,
+                  sizeof(float) * flt->size) == 0) {
+            fft->spectra[i].lastUse = fft->use;
+            return(fft->spectra[i].spectra);
+        }
+    }
+
+    /* replace whichever was used longest ago */
+    for(i = 0; i < FILTER_FFT_SPECTRA; i++) {
+        if(!fft->spectra[i].valid) {
+            spec = &(fft->spectra[i]);
+            break;
+        }
+        if(spec == NULL || fft->spectra[i].lastUse < spec->lastUse) {
+            spec = &(fft->spectra[i]);
+        }
+    }
+
+    memcpy(spec->kernel, kernel, sizeof(float) * flt->size);
+    /* fold in the scaling of the inverse transform */
+    scale = 1.0 / (fft->part * 2);
+    for(p = 0; p < fft->parts; p++) {
+        len = MIN(fft->part, flt->size - (p * fft->part));
+        for(j = 0; j < len; j++) {
+            fft->time[j] = kernel[(p * fft->part) + j] * scale;
+        }
+        memset(&(fft->time[len]), 0, sizeof(float) * ((fft->part * 2) - len));
+        fft_real_forward(fft, fft->time,
+                         &(spec->spectra[p * (fft->part + 1) * 2]));
+    }
+    spec->buffer = flt->filterBuffer;
+    spec->offset = offset;
+    spec->lastUse = fft->use;
+    spec->valid = 1;
+
+    return(spec->spectra);
+}
+
 static int init_filter(Synth *s,
                        SynthFilter *f,
                        unsigned int filterBuffer,
@@ -2568,6 +3758,7 @@ static int init_filter(Synth *s,
         LOG_PRINTF(s, "%s: Failed to allocate filter accumulation buffer.\n", name);
         return(-1);
     }
+    memset(f->accum, 0, sizeof(float) * size);
     f->size = size;
     f->accumPos = 0;
     f->inBuffer = filterBuffer;
@@ -2590,6 +3781,8 @@ static int init_filter(Synth *s,
     f->volBuffer = filterBuffer;
     add_buffer_ref(s, filterBuffer);
     f->volPos = 0;
+    f->useFFT = 1;
+    f->fft = new_filter_fft(s, size, name);
 
     unsigned int namelen = strlen(name) + 1;
     f->name = malloc(namelen);
@@ -2697,6 +3890,8 @@ int synth_free_filter(Synth *s, unsigned int index) {
     free_buffer_ref(s, f->outBuffer);
     free_buffer_ref(s, f->volBuffer);
     free(f->name);
+    free_filter_fft(f->fft);
+    f->fft = NULL;
     free(f->accum);
     f->accum = NULL;
 
@@ -2992,9 +4187,89 @@ int synth_set_filter_volume_source(Synth *s,
     return(0);
 }
 
-static unsigned int do_synth_run_filter(Synth *syn, SynthFilter *flt,
-                                        float *o, int outPos,
-                                        int todo) {
+int synth_set_filter_fft(Synth *s,
+                         unsigned int index,
+                         int enabled) {
+    SynthFilter *f = get_filter(s, index);
+    if(f == NULL) {
+        return(-1);
+    }
+
+    f->useFFT = enabled;
+
+    return(0);
+}
+
+int synth_set_filter_params(Synth *s,
+                            unsigned int index,
+                            const SynthParam *params,
+                            unsigned int count) {
+    unsigned int i;
+    int ret = 0;
+
+    lock_audiodev(s);
+
+    for(i = 0; i < count; i++) {
+        switch(params[i].param) {
+            case SYNTH_FILTER_INPUT_BUFFER:
+                ret = synth_set_filter_input_buffer(s, index, params[i].val.u);
+                break;
+            case SYNTH_FILTER_INPUT_BUFFER_POS:
+                ret = synth_set_filter_input_buffer_pos(s, index, params[i].val.i);
+                break;
+            case SYNTH_FILTER_BUFFER:
+                ret = synth_set_filter_buffer(s, index, params[i].val.u);
+                break;
+            case SYNTH_FILTER_BUFFER_START:
+                ret = synth_set_filter_buffer_start(s, index, params[i].val.i);
+                break;
+            case SYNTH_FILTER_SLICES:
+                ret = synth_set_filter_slices(s, index, params[i].val.u);
+                break;
+            case SYNTH_FILTER_MODE:
+                ret = synth_set_filter_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_FILTER_SLICE:
+                ret = synth_set_filter_slice(s, index, params[i].val.i);
+                break;
+            case SYNTH_FILTER_SLICE_SOURCE:
+                ret = synth_set_filter_slice_source(s, index, params[i].val.u);
+                break;
+            case SYNTH_FILTER_OUTPUT_BUFFER:
+                ret = synth_set_filter_output_buffer(s, index, params[i].val.u);
+                break;
+            case SYNTH_FILTER_OUTPUT_BUFFER_POS:
+                ret = synth_set_filter_output_buffer_pos(s, index, params[i].val.i);
+                break;
+            case SYNTH_FILTER_OUTPUT_MODE:
+                ret = synth_set_filter_output_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_FILTER_VOLUME_MODE:
+                ret = synth_set_filter_volume_mode(s, index, params[i].val.i);
+                break;
+            case SYNTH_FILTER_VOLUME:
+                ret = synth_set_filter_volume(s, index, params[i].val.f);
+                break;
+            case SYNTH_FILTER_VOLUME_SOURCE:
+                ret = synth_set_filter_volume_source(s, index, params[i].val.u);
+                break;
+            default:
+                LOG_PRINTF(s, "Invalid filter parameter %d.\n", params[i].param);
+                ret = -1;
+        }
+        if(ret < 0) {
+            break;
+        }
+    }
+
+    unlock_audiodev(s);
+
+    return(i);
+}
+
+static unsigned int do_synth_run_filter_direct(Synth *syn, SynthFilter *flt,
+                                               float *o, int outPos,
+                                               int todo) {
     unsigned int j;
     /* silence a warning */
     int samples = 0;
@@ -3179,6 +4454,198 @@ static unsigned int do_synth_run_filter(Synth *syn, SynthFilter *flt,
     return(samples);
 }
 
+/* convolve a block of at most part samples which all use the same kernel */
+static void do_synth_run_filter_fft(Synth *syn, SynthFilter *flt,
+                                    float *o, const float *spectra,
+                                    unsigned int todo) {
+    SynthFilterFFT *fft = flt->fft;
+    unsigned int part = fft->part;
+    unsigned int size = flt->size;
+    unsigned int j, p, len;
+    float *out = fft->out;
+    const float *h;
+    float *w;
+    unsigned int samples;
+
+    float *i = get_buffer_data(syn, flt->inBuffer);
+    i = &(i[flt->inPos]);
+
+    memcpy(fft->time, i, sizeof(float) * todo);
+    memset(&(fft->time[todo]), 0, sizeof(float) * ((part * 2) - todo));
+    fft_real_forward(fft, fft->time, fft->inSpec);
+
+    /* unwrap what's been accumulated so far, then add each part's
+     * convolution on top of it at its place in the kernel */
+    memcpy(out, &(flt->accum[flt->accumPos]),
+           sizeof(float) * (size - flt->accumPos));
+    memcpy(&(out[size - flt->accumPos]), flt->accum,
+           sizeof(float) * flt->accumPos);
+    memset(&(out[size]), 0, sizeof(float) * todo);
+    for(p = 0; p < fft->parts; p++) {
+        h = &(spectra[p * (part + 1) * 2]);
+        w = fft->work;
+        for(j = 0; j <= part; j++) {
+            w[j * 2] = fft->inSpec[j * 2] * h[j * 2] -
+                       fft->inSpec[j * 2 + 1] * h[j * 2 + 1];
+            w[j * 2 + 1] = fft->inSpec[j * 2] * h[j * 2 + 1] +
+                           fft->inSpec[j * 2 + 1] * h[j * 2];
+        }
+        fft_real_inverse(fft, w, fft->time);
+        /* the last part may be mostly padding */
+        len = MIN(todo + part - 1, size + todo - 1 - (p * part));
+        w = &(out[p * part]);
+        for(j = 0; j < len; j++) {
+            w[j] += fft->time[j];
+        }
+    }
+
+    if(flt->volMode == SYNTH_AUTO_CONSTANT) {
+        if(flt->outOp == SYNTH_OUTPUT_REPLACE) {
+            for(samples = 0; samples < todo; samples++) {
+                o[samples] = out[samples] * flt->vol;
+            }
+        } else if(flt->outOp == SYNTH_OUTPUT_ADD) {
+            for(samples = 0; samples < todo; samples++) {
+                o[samples] += out[samples] * flt->vol;
+            }
+        }
+    } else if(flt->volMode == SYNTH_AUTO_SOURCE) {
+        float *v = get_buffer_data(syn, flt->volBuffer);
+        v = &(v[flt->volPos]);
+        if(flt->outOp == SYNTH_OUTPUT_REPLACE) {
+            for(samples = 0; samples < todo; samples++) {
+                o[samples] = out[samples] * v[samples] * flt->vol;
+            }
+        } else if(flt->outOp == SYNTH_OUTPUT_ADD) {
+            for(samples = 0; samples < todo; samples++) {
+                o[samples] += out[samples] * v[samples] * flt->vol;
+            }
+        }
+        flt->volPos += todo;
+    }
+
+    /* put the rest back to keep accumulating */
+    flt->accumPos = (flt->accumPos + todo) % size;
+    memcpy(&(flt->accum[flt->accumPos]), &(out[todo]),
+           sizeof(float) * (size - flt->accumPos));
+    memcpy(flt->accum, &(out[todo + size - flt->accumPos]),
+           sizeof(float) * flt->accumPos);
+
+    if(flt->mode == SYNTH_AUTO_SOURCE) {
+        flt->slicePos += todo;
+    }
+    flt->inPos += todo;
+}
+
+/* the same slice the direct convolution picks, but avoiding the divide in the
+ * usual case that the value is already in range */
+#define FILTER_SLICE(VAL, SLICES) \
+    ((unsigned int)(int)((VAL) * (SLICES)) < (SLICES) ? \
+     (unsigned int)(int)((VAL) * (SLICES)) : \
+     (unsigned int)(int)((VAL) * (SLICES)) % (SLICES))
+
+/* convolve runs of samples long enough to be worth it which use the same
+ * kernel with FFTs, and everything else directly */
+static unsigned int do_synth_run_filter(Synth *syn, SynthFilter *flt,
+                                        float *o, int outPos,
+                                        int todo) {
+    SynthFilterFFT *fft = flt->fft;
+    unsigned int done, pos, run, offset;
+    unsigned int slices, startPos, slice, next, j;
+    float *s = NULL;
+
+    if(fft == NULL || !flt->useFFT || (unsigned int)todo < fft->min) {
+        return(do_synth_run_filter_direct(syn, flt, o, outPos, todo));
+    }
+
+    /* same limits as the direct convolution */
+    todo = MIN((unsigned int)todo, get_buffer_size(syn, flt->inBuffer) - flt->inPos);
+    if(flt->mode == SYNTH_AUTO_SOURCE) {
+        s = get_buffer_data(syn, flt->sliceBuffer);
+        s = &(s[flt->slicePos]);
+        todo = MIN((unsigned int)todo, get_buffer_size(syn, flt->sliceBuffer) - flt->slicePos);
+    }
+    if(flt->volMode == SYNTH_AUTO_SOURCE) {
+        todo = MIN((unsigned int)todo, get_buffer_size(syn, flt->volBuffer) - flt->volPos);
+    }
+
+    float *f = get_buffer_data(syn, flt->filterBuffer);
+    slices = flt->slices - flt->slice;
+    startPos = flt->startPos + (flt->slice * flt->size);
+    done = 0;
+    pos = 0;
+    while(pos < (unsigned int)todo) {
+        if(flt->mode == SYNTH_AUTO_CONSTANT) {
+            run = MIN((unsigned int)todo - pos, fft->part);
+            if(run < fft->min) {
+                break;
+            }
+            offset = startPos;
+        } else {
+            /* find the next run of samples using the same slice which is
+             * long enough, leaving everything before it to be done
+             * directly */
+            slice = FILTER_SLICE(s[pos], slices);
+            run = 1;
+            for(j = pos + 1; j < (unsigned int)todo && run < fft->min; j++) {
+                next = FILTER_SLICE(s[j], slices);
+                if(next == slice) {
+                    run++;
+                } else {
+                    slice = next;
+                    pos = j;
+                    run = 1;
+                }
+            }
+            if(run < fft->min) {
+                break;
+            }
+            /* then see how much further it goes */
+            while(run < fft->part &&
+                  pos + run < (unsigned int)todo &&
+                  FILTER_SLICE(s[pos + run], slices) == slice) {
+                run++;
+            }
+            offset = startPos + (slice * flt->size);
+        }
+
+        if(pos > done) {
+            done += do_synth_run_filter_direct(syn, flt, o, outPos + done,
+                                               pos - done);
+        }
+        do_synth_run_filter_fft(syn, flt, &(o[outPos + done]),
+                                get_filter_spectra(flt, offset, &(f[offset])),
+                                run);
+        done += run;
+        pos = done;
+    }
+    if((unsigned int)todo > done) {
+        done += do_synth_run_filter_direct(syn, flt, o, outPos + done,
+                                           todo - done);
+    }
+
+    return(done);
+}
+
+/* filters need the whole of any streamed buffers they use */
+static int load_filter_buffers(Synth *s, SynthFilter *f) {
+    if(use_float_buffer(s, f->inBuffer) < 0 ||
+       use_float_buffer(s, f->filterBuffer) < 0 ||
+       use_float_buffer(s, f->outBuffer) < 0) {
+        return(-1);
+    }
+    if(f->mode == SYNTH_AUTO_SOURCE &&
+       use_float_buffer(s, f->sliceBuffer) < 0) {
+        return(-1);
+    }
+    if(f->volMode == SYNTH_AUTO_SOURCE &&
+       use_float_buffer(s, f->volBuffer) < 0) {
+        return(-1);
+    }
+
+    return(0);
+}
+
 int synth_run_filter(Synth *s,
                      unsigned int index,
                      unsigned int reqSamples) {
@@ -3189,6 +4656,9 @@ int synth_run_filter(Synth *s,
     if(f == NULL) {
         return(-1);
     }
+    if(load_filter_buffers(s, f) < 0) {
+        return(-1);
+    }
 
     float *o = get_buffer_data(s, f->outBuffer);
 
@@ -3217,7 +4687,8 @@ int synth_run_filter(Synth *s,
     } else {
         samples = do_synth_run_filter(s, f, o, outPos, todo);
     }
-    f->outPos = outPos + samples;
+    /* keep the position relative to the write cursor for output buffers */
+    f->outPos += samples;
 
     return(samples);
 }
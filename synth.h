@@ -111,6 +111,65 @@ typedef enum {
     SYNTH_MODE_PHASE_SOURCE = 2
 } SynthPlayerMode;
 
+/* Player parameters which can be set together with synth_set_player_params.
+ * Each corresponds to the synth_set_player_* function of the same name. */
+typedef enum {
+    SYNTH_PLAYER_INPUT_BUFFER = 0,
+    SYNTH_PLAYER_INPUT_BUFFER_POS,
+    SYNTH_PLAYER_OUTPUT_BUFFER,
+    SYNTH_PLAYER_OUTPUT_BUFFER_POS,
+    SYNTH_PLAYER_OUTPUT_MODE,
+    SYNTH_PLAYER_VOLUME_MODE,
+    SYNTH_PLAYER_VOLUME,
+    SYNTH_PLAYER_VOLUME_SOURCE,
+    SYNTH_PLAYER_MODE,
+    SYNTH_PLAYER_LOOP_START,
+    SYNTH_PLAYER_LOOP_LENGTH,
+    SYNTH_PLAYER_START_SOURCE,
+    SYNTH_PLAYER_START_VALUES,
+    SYNTH_PLAYER_START_GRANULARITY,
+    SYNTH_PLAYER_START_MODE,
+    SYNTH_PLAYER_LENGTH_SOURCE,
+    SYNTH_PLAYER_LENGTH_VALUES,
+    SYNTH_PLAYER_LENGTH_GRANULARITY,
+    SYNTH_PLAYER_LENGTH_MODE,
+    SYNTH_PLAYER_PHASE_SOURCE,
+    SYNTH_PLAYER_SPEED_MODE,
+    SYNTH_PLAYER_SPEED,
+    SYNTH_PLAYER_SPEED_SOURCE
+} SynthPlayerParam;
+
+/* Filter parameters which can be set together with synth_set_filter_params.
+ * Each corresponds to the synth_set_filter_* function of the same name. */
+typedef enum {
+    SYNTH_FILTER_INPUT_BUFFER = 0,
+    SYNTH_FILTER_INPUT_BUFFER_POS,
+    SYNTH_FILTER_BUFFER,
+    SYNTH_FILTER_BUFFER_START,
+    SYNTH_FILTER_SLICES,
+    SYNTH_FILTER_MODE,
+    SYNTH_FILTER_SLICE,
+    SYNTH_FILTER_SLICE_SOURCE,
+    SYNTH_FILTER_OUTPUT_BUFFER,
+    SYNTH_FILTER_OUTPUT_BUFFER_POS,
+    SYNTH_FILTER_OUTPUT_MODE,
+    SYNTH_FILTER_VOLUME_MODE,
+    SYNTH_FILTER_VOLUME,
+    SYNTH_FILTER_VOLUME_SOURCE
+} SynthFilterParam;
+
+/* A parameter and the value to set it to.  Buffers and unsigned values use u,
+ * modes and signed values use i and floating point values use f, matching
+ * the argument of the function the parameter corresponds to. */
+typedef struct {
+    int param;
+    union {
+        int i;
+        unsigned int u;
+        float f;
+    } val;
+} SynthParam;
+
 /* the synth */
 typedef struct Synth_s Synth;
 
@@ -165,6 +224,44 @@ int synth_buffer_from_wav(Synth *s,
                           const char *filename,
                           unsigned int *rate,
                           const char *name);
+/*
+ * Like synth_buffer_from_wav, but the file is mapped in to memory and
+ * converted a window at a time ahead of each player reading it, instead of
+ * all up front, so very long files cost little memory or loading time.  Only
+ * mono 8 and 16 bit PCM and 32 bit float files can be streamed, anything
+ * else, or on platforms which can't map files, is loaded in full.  A
+ * streamed buffer used any way other than as the input of a player in
+ * SYNTH_MODE_ONCE, like for SYNTH_MODE_PHASE_SOURCE or as a filter input,
+ * or by getting its internal buffer, is loaded in full the first time it's
+ * used that way, unless synth_buffer_load_fully() does it ahead of time.
+ *
+ * s        The Synth structure
+ * filename A path to a WAV file to stream.
+ * rate     A pointer to an unsigned int that will be populated with the sample
+ *          rate of the WAV file.
+ * name     optional name or NULL to use the filename
+ * return   the buffer handle on success, -1 on failure
+ */
+int synth_buffer_stream_wav(Synth *s,
+                            const char *filename,
+                            unsigned int *rate,
+                            const char *name);
+
+/*
+ * Choose whether buffers made from now on from 8 or 16 bit data, including
+ * WAV files, keep their samples in that format, converting them as players
+ * read them, instead of converting them all to float up front.  They take up
+ * a quarter or half as much memory.  A native format buffer used any way
+ * other than as the input of a player, like as a filter input, slices or a
+ * speed or phase source, or by getting its internal buffer, is converted to
+ * float the first time it's used that way, unless synth_buffer_load_fully()
+ * does it ahead of time.  Off by default.
+ *
+ * s        The Synth structure
+ * enabled  1 to keep buffers in their native format, 0 to convert to float
+ * return   0 on success, -1 on failure
+ */
+int synth_set_native_buffers(Synth *s, int enabled);
 
 /*
  * Output information about the provided Synth structure, all loaded buffers
@@ -253,7 +350,8 @@ int synth_close_wav(Synth *s);
 /*
  * Write data to a wav file.  This is used when there is no SDL audio output.
  * synth_frame should be called first and its return value should be passed to
- * this function's samples argumet.
+ * this function's samples argumet.  The samples may wrap around the end of the
+ * internal buffer.
  *
  * d        the Synth structure
  * samples  the number of samples to write
@@ -323,6 +421,41 @@ int synth_set_enabled(Synth *s, int enabled);
  *          >=0 to indicate amount of samples output
  */
 int synth_frame(Synth *s);
+/*
+ * Start mirroring the most recently generated samples of every output channel
+ * in to a tap which can be read at any time without locking, for visualizing
+ * output.  Starting over resets the tap to silence.
+ *
+ * s        the Synth structure
+ * samples  the number of samples of each channel to keep, or 0 to stop
+ * return   0 on success, -1 on failure
+ */
+int synth_set_tap(Synth *s, unsigned int samples);
+/*
+ * Get the most recent samples mirrored by the tap, without locking or
+ * copying.  Each channel's samples are contiguous, and channels follow each
+ * other stride samples apart.  Samples keep being generated in to the tap, but
+ * the returned samples won't be overwritten until synth_get_tap_count() has
+ * advanced from the returned count by more than the number of samples
+ * returned.
+ *
+ * s        the Synth structure
+ * buf      gets a pointer to the oldest sample of the first channel
+ * stride   gets the distance in samples from one channel to the next
+ * count    gets the number of samples tapped so far, wrapping around
+ * return   the number of samples of each channel, 0 if there's no tap
+ */
+unsigned int synth_get_tap(Synth *s,
+                           float **buf,
+                           unsigned int *stride,
+                           unsigned int *count);
+/*
+ * Get the number of samples tapped so far, wrapping around.
+ *
+ * s        the Synth structure
+ * return   the number of samples
+ */
+unsigned int synth_get_tap_count(Synth *s);
 /*
  * Invalidate the output buffers.  Data in them already will not be played.
  * Probably best to do this when it's not enabled.  It will lock the audio
@@ -402,6 +535,39 @@ int synth_free_buffer(Synth *s, unsigned int index);
  * return   size in samples or -1 on failure
  */
 int synth_buffer_get_size(Synth *s, unsigned int index);
+/*
+ * Find out whether a buffer is still being streamed from its file, rather
+ * than being loaded in full.
+ *
+ * s        the Synth structure
+ * index    the buffer handle index
+ * return   1 if streamed, 0 if not, -1 on failure
+ */
+int synth_buffer_is_streamed(Synth *s, unsigned int index);
+/*
+ * Load a streamed buffer in full, and convert a native format buffer to
+ * float, ahead of it being used some way which needs that, so it isn't done
+ * the first time a player or filter runs with it, which is likely in the
+ * audio callback.  A buffer which will only ever be the input of players can
+ * stay in its native format.  Buffers which already have what's needed are
+ * left alone.
+ *
+ * s          the Synth structure
+ * index      the buffer handle index
+ * playerOnly 1 if the buffer will only be the input of players, 0 otherwise
+ * return     0 on success, -1 on failure
+ */
+int synth_buffer_load_fully(Synth *s, unsigned int index, int playerOnly);
+/*
+ * Get how much memory a buffer's samples take up.  Streamed buffers count as
+ * nothing, because the file is only mapped and each player converts its own
+ * window of it.
+ *
+ * s        the Synth structure
+ * index    the buffer handle index
+ * return   size in bytes or -1 on failure
+ */
+int synth_buffer_get_memory(Synth *s, unsigned int index);
 /*
  * Get the pointer to the internal buffer data.  This can either be a normal
  * buffer or an output buffer.  Behavior differs a fair bit between the two:
@@ -790,6 +956,20 @@ int synth_set_player_speed(Synth *s,
 int synth_set_player_speed_source(Synth *s,
                                   unsigned int index,
                                   unsigned int speedBuffer);
+/*
+ * Set many player parameters at once, with the audio device only locked once.
+ * Parameters are set in order, stopping at the first one which fails.
+ *
+ * s            the Synth structure
+ * index        the player index to update
+ * params       the parameters and values to set
+ * count        the number of parameters
+ * return       the number of parameters set, less than count on failure
+ */
+int synth_set_player_params(Synth *s,
+                            unsigned int index,
+                            const SynthParam *params,
+                            unsigned int count);
 /*
  * Actually run the player, given all the criteria given for some number of
  * samples or until some source is depleted.
@@ -1015,6 +1195,37 @@ int synth_set_filter_volume(Synth *s,
 int synth_set_filter_volume_source(Synth *s,
                                    unsigned int index,
                                    unsigned int volBuffer);
+/*
+ * Set whether runs of samples which all use the same filter slice may be
+ * convolved with FFTs instead of directly, which is much faster for longer
+ * filters.  It's enabled by default, but only used for runs long enough for
+ * it to be worth it, so filters with quickly changing slices still mostly
+ * get convolved directly.  Results differ from direct convolution only by
+ * floating point rounding.  Filters too short to benefit or longer than 8192
+ * samples are always convolved directly.
+ *
+ * s            the Synth structure
+ * index        the filter to update
+ * enabled      0 to always convolve directly, nonzero to allow FFTs
+ * return       0 on success, -1 on failure
+ */
+int synth_set_filter_fft(Synth *s,
+                         unsigned int index,
+                         int enabled);
+/*
+ * Set many filter parameters at once, with the audio device only locked once.
+ * Parameters are set in order, stopping at the first one which fails.
+ *
+ * s            the Synth structure
+ * index        the filter index to update
+ * params       the parameters and values to set
+ * count        the number of parameters
+ * return       the number of parameters set, less than count on failure
+ */
+int synth_set_filter_params(Synth *s,
+                            unsigned int index,
+                            const SynthParam *params,
+                            unsigned int count);
 /*
  * Run the filter for a certain number of samples.
  *
@@ -22,12 +22,22 @@ RENDERBATCHING=True
 TRACEVIDEO=False
 # enable tracing of audio sequencer processing
 TRACEAUDIO=True
+# milliseconds of audio to render ahead on a worker thread, None to render in
+# the main loop
+AUDIO_LOOKAHEAD=None
+# samples shown by the scopes, one per pixel
+SCOPE_WIDTH=320
 
 RES_WIDTH=1920
 RES_HEIGHT=1080
 
 DEFAULT_SEQ = "seq/test3.crustysequence"
 DEFAULT_WAV = "output.wav"
+# directory parsed sequences are cached in, None to always parse
+SEQ_CACHE_DIR = "seqcache"
+FILTER_CACHE_DIR = "filtercache"
+# processes to design uncached filters in, None for one per CPU
+FILTER_WORKERS = None
 
 WAVEFORM_HARMONICS = 8
 
@@ -35,7 +45,7 @@ WAVEFORM_HARMONICS = 8
 def string_to_ints(string):
     return array.array('u', string)
 
-def load_audio(aud, harmonics):
+def load_audio(aud, harmonics, workers=FILTER_WORKERS):
     rate = aud.rate
     envslope = aud.buffer(cg.SYNTH_TYPE_F32,
                           waves.create_sqrt_slope(0.0, 1.0, rate),
@@ -51,9 +61,11 @@ def load_audio(aud, harmonics):
                        rate, "Noise")
 
     print("Generating filters...")
-    filt = waves.make_filter(rate, lowpass=True)
+    filt = waves.make_filter(rate, lowpass=True, cachedir=FILTER_CACHE_DIR,
+                             workers=workers)
     lpfilt = aud.buffer(cg.SYNTH_TYPE_F32, filt, len(filt), "Lowpass Filters")
-    filt = waves.make_filter(rate, lowpass=False)
+    filt = waves.make_filter(rate, lowpass=False, cachedir=FILTER_CACHE_DIR,
+                             workers=workers)
     hpfilt = aud.buffer(cg.SYNTH_TYPE_F32, filt, len(filt), "Highpass Filters")
 
     wave = waves.WaveGen(rate)
@@ -65,10 +77,8 @@ def load_audio(aud, harmonics):
     return envslope, benddownslope, bendupslope, noise, lpfilt, hpfilt, sine, square, triangle, saw
 
 class Scope():
-    def __init__(self, renderer, seq, num, pixfmt, w, h):
+    def __init__(self, renderer, pixfmt, w, h):
         self._renderer = renderer
-        self._seq = seq
-        self._num = num
         self._w = w
         self._h = h
         self._array = numpy.zeros(shape=w * 2, dtype=numpy.float32)
@@ -81,38 +91,19 @@ class Scope():
     def texture(self):
         return self._tex
 
-    def _get_buffers(self):
-        # keep this as short as possible so the audio device is unlocked as
-        # soon as possible
-        first = numpy.copy(self._seq.internal(self._num))
-        second = numpy.copy(self._seq.internal(self._num))
-
-        return first, second
-
-    def update(self):
-        first, second = self._get_buffers()
+    def update(self, samples):
+        """
+        Draw the most recent samples of a channel, from a tap snapshot.
+        """
+        points = self._array[1::2]
+        points[:] = samples[-self._w:]
         # can't reproduce the hang/memory leak but it seems to happen within
         # SDL_RenderDrawLinesF (within libSDL itself), and it seems to be
         # related to broken values/uninitialized memory so just clip it.
-        first.clip(-1.0, 1.0)
-        second.clip(-1.0, 1.0)
-
-        if len(first) < self._w and len(first) != 0:
-            pos = len(first) * 2 + 1
-            self._array[1:pos:2] = first
-            if len(second) != 0:
-                if len(first) + len(second) < self._w:
-                    pos2 = pos + len(first) * 2
-                    self._array[pos:pos2:2] = second
-                    self._array[pos2::2].fill(0)
-                else:
-                    self._array[pos::2] = second[:self._w - len(first)]
-        else:
-            if len(first) != 0:
-                self._array[1:self._w*2:2] = first[:self._w]
-
-        self._array[1::2] *= self._h / 2
-        self._array[1::2] += self._h / 2
+        points.clip(-1.0, 1.0, out=points)
+
+        points *= self._h / 2
+        points += self._h / 2
 
         origtarget = SDL_GetRenderTarget(self._renderer)
         if SDL_SetRenderTarget(self._renderer, self._tex) < 0:
@@ -268,8 +259,10 @@ def do_main(window, renderer, pixfmt):
     scene.append(l1dl)
     scene.append(l2)
 
-    aud = audio.AudioSystem(log_cb_return, None, 48000, 2, trace=TRACEAUDIO)
+    aud = audio.AudioSystem(log_cb_return, None, 48000, 2, trace=TRACEAUDIO,
+                            lookahead=AUDIO_LOOKAHEAD)
     audbuffers = load_audio(aud, WAVEFORM_HARMONICS)
+    aud.tap(SCOPE_WIDTH)
     aud.enabled(True)
 
     wavout = False
@@ -308,10 +301,14 @@ def do_main(window, renderer, pixfmt):
             aud.enabled(True)
 
         if scopel != None:
-            # possible race condition between this and aud.frame() but it'll
-            # just result in missed samples, no big deal
-            scopel.update()
-            scoper.update()
+            # one snapshot for all the scopes, so they all show the same
+            # moment.  it's read straight out of the tap, so it must be done
+            # with before the next frame could overwrite it.
+            _, snapshot = aud.tap_snapshot()
+            snapshot = numpy.asarray(snapshot)
+            scopel.update(snapshot[0])
+            scoper.update(snapshot[1])
+            del snapshot
 
         if seq != None:
             for s in seq:
@@ -354,7 +351,8 @@ def do_main(window, renderer, pixfmt):
                     try:
                         with open(seqname, "r") as seqfile:
                             seq.append(audio.AudioSequencer(seqfile,
-                                       audbuffers, macros, trace=TRACEAUDIO))
+                                       audbuffers, macros, trace=TRACEAUDIO,
+                                       cachedir=SEQ_CACHE_DIR))
                     except Exception as e:
                         aud.print_full_stats()
                         print_tb(e.__traceback__)
@@ -374,7 +372,8 @@ def do_main(window, renderer, pixfmt):
                                     with open(part, "r") as seqfile:
                                         seq.append(audio.AudioSequencer(seqfile,
                                                    [envslope, benddownslope, bendupslope, noise, filt],
-                                                   macros, trace=TRACEAUDIO))
+                                                   macros, trace=TRACEAUDIO,
+                                                   cachedir=SEQ_CACHE_DIR))
                                 except Exception as e:
                                     aud.print_full_stats()
                                     print_tb(e.__traceback__)
@@ -397,11 +396,11 @@ def do_main(window, renderer, pixfmt):
                                 seq = None
                                 break
                     if seq != None:
-                        scopel = Scope(renderer, seq[0], 0, pixfmt, 320, 120)
+                        scopel = Scope(renderer, pixfmt, SCOPE_WIDTH, 120)
                         scopell = cg.Layer(ll, scopel.texture, "Scope L Layer")
                         scopell.pos(0, 30)
                         osc2dl.replace(scopelid, scopell)
-                        scoper = Scope(renderer, seq[0], 1, pixfmt, 320, 120)
+                        scoper = Scope(renderer, pixfmt, SCOPE_WIDTH, 120)
                         scoperl = cg.Layer(ll, scoper.texture, "Scope R Layer")
                         scoperl.pos(0, 90)
                         osc2dl.replace(scoperid, scoperl)